@@ -1,192 +1,177 @@
 #!/usr/bin/env python3.8
 """
 Script chia text thành chunks cho RAG Pipeline
-Đọc file JSON đã xử lý, chia thành chunks 500-1000 tokens
+Đọc file đã xử lý (*_processed.jsonl), chia thành chunks 500-1000 tokens
 """
 
 import os
 import sys
-import json
 import re
 from datetime import datetime
 from typing import List, Dict
 
+from text_segmenter import normalize_unicode
+from sliding_window import (sliding_window_chunks, chunking_params, estimate_token_counts,
+                            DEFAULT_WINDOW_TOKENS, DEFAULT_OVERLAP_TOKENS, DEFAULT_MIN_TOKENS)
+from stage_io import read_stage, write_stage, stage_path, STAGE_EXTENSIONS
+
 def estimate_tokens(text: str) -> int:
     """Ước tính số tokens (xấp xỉ 1 token = 4 chars cho tiếng Việt)"""
     return len(text) // 4
 
+# Ký tự bị loại khỏi chunk: emoji, ký hiệu trang trí, box drawing...
+# Giữ ký tự của URL, đường dẫn, biểu thức (/ % + = @ # & * < > ~ |) và dấu nháy/gạch tiếng Việt
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s.,!?;:()\[\]{}"\'“”‘’/\\%+=@#&*<>~|$€°…–—-]+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
 def clean_text_advanced(text: str) -> str:
     """Làm sạch text nâng cao"""
-    # Loại bỏ multiple spaces
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Loại bỏ empty lines
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    text = '\n'.join(lines)
+    text = normalize_unicode(text)
     
-    # Loại bỏ ký tự đặc biệt không cần thiết
-    text = re.sub(r'[^\w\s\.,!?;:()\[\]"\'-]', ' ', text)
+    # Loại bỏ ký tự đặc biệt không cần thiết (trước khi gộp khoảng trắng để không để lại dấu cách kép)
+    text = SPECIAL_CHARS_PATTERN.sub(' ', text)
     
-    return text.strip()
+    # Loại bỏ multiple spaces và empty lines
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
 
-def chunk_by_sentences(text: str, max_tokens: int = 800, min_tokens: int = 400) -> List[str]:
-    """Chia text theo câu, đảm bảo chunks có kích thước phù hợp"""
-    # Tách câu
-    sentences = re.split(r'[.!?]+\s+', text)
-    
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-            
-        sentence_tokens = estimate_tokens(sentence)
-        
-        # Nếu câu quá dài, chia nhỏ hơn
-        if sentence_tokens > max_tokens:
-            # Lưu chunk hiện tại nếu có
-            if current_chunk:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = []
-                current_tokens = 0
-            
-            # Chia câu dài thành từng phần
-            words = sentence.split()
-            temp_chunk = []
-            temp_tokens = 0
-            
-            for word in words:
-                word_tokens = estimate_tokens(word)
-                if temp_tokens + word_tokens > max_tokens and temp_chunk:
-                    chunks.append(' '.join(temp_chunk))
-                    temp_chunk = [word]
-                    temp_tokens = word_tokens
-                else:
-                    temp_chunk.append(word)
-                    temp_tokens += word_tokens
-            
-            if temp_chunk:
-                chunks.append(' '.join(temp_chunk))
-                
-        # Nếu thêm câu này vượt quá max_tokens
-        elif current_tokens + sentence_tokens > max_tokens:
-            if current_chunk:
-                chunks.append(' '.join(current_chunk))
-            current_chunk = [sentence]
-            current_tokens = sentence_tokens
-        else:
-            current_chunk.append(sentence)
-            current_tokens += sentence_tokens
-    
-    # Thêm chunk cuối cùng
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    # Gộp chunks quá nhỏ
-    final_chunks = []
-    i = 0
-    while i < len(chunks):
-        chunk = chunks[i]
-        chunk_tokens = estimate_tokens(chunk)
-        
-        # Nếu chunk nhỏ hơn min_tokens, thử gộp với chunk tiếp theo
-        if chunk_tokens < min_tokens and i + 1 < len(chunks):
-            next_chunk = chunks[i + 1]
-            combined_tokens = chunk_tokens + estimate_tokens(next_chunk)
-            
-            if combined_tokens <= max_tokens:
-                final_chunks.append(chunk + ' ' + next_chunk)
-                i += 2  # Skip next chunk
-            else:
-                final_chunks.append(chunk)
-                i += 1
-        else:
-            final_chunks.append(chunk)
-            i += 1
-    
-    return final_chunks
+def chunk_by_sentences(text: str, max_tokens: int = 800, min_tokens: int = 400,
+                       overlap_tokens: int = DEFAULT_OVERLAP_TOKENS, token_counter=None) -> List[str]:
+    """Chia text theo câu thành các cửa sổ chồng lấn (xem sliding_window), phần cuối nhỏ được gộp vào chunk cuối"""
+    windows = sliding_window_chunks(text, window_tokens=max_tokens, overlap_tokens=overlap_tokens,
+                                    min_tokens=min_tokens, token_counter=token_counter)
+    return [window['content'] for window in windows]
 
-def chunk_by_headings(text: str, headings: List, max_tokens: int = 800) -> List[Dict]:
-    """Chia text theo headings, giữ nguyên cấu trúc"""
-    chunks_with_context = []
-    
-    if not headings:
-        # Nếu không có headings, chia theo câu thông thường
-        chunks = chunk_by_sentences(text, max_tokens)
-        for i, chunk in enumerate(chunks):
-            chunks_with_context.append({
-                'chunk_id': i + 1,
-                'content': chunk,
-                'tokens': estimate_tokens(chunk),
-                'context': 'general_content',
-                'heading_level': 0,
-                'heading_title': None
-            })
-        return chunks_with_context
-    
-    # Tìm vị trí của các headings trong text
-    heading_positions = []
+def locate_headings(text: str, headings: List) -> List[Dict]:
+    """
+    Tìm vị trí headings (level, title) trong text cho dữ liệu cũ không có offset
+    Tìm tuần tự từ sau heading trước, nên tuyến tính và headings trùng tên không bị lẫn.
+    """
+    located = []
+    position = 0
     for level, title in headings:
-        # Tìm heading trong text
-        pattern = re.escape(title)
-        match = re.search(pattern, text)
-        if match:
-            heading_positions.append((match.start(), level, title))
-    
-    # Sắp xếp theo vị trí
-    heading_positions.sort()
-    
-    # Chia text theo sections
+        pos = text.find(title, position)
+        if pos == -1:
+            continue
+        located.append({'level': level, 'text': title, 'offset': pos})
+        position = pos + len(title)
+    return located
+
+def build_section_tree(text: str, headings: List[Dict]) -> List[Dict]:
+    """
+    Dựng cây sections từ headings có offset (theo thứ tự xuất hiện) trong một lượt
+    Mỗi section: id, level, title, path (tiêu đề từ gốc tới section), parent, children,
+    start (vị trí heading), body_start (sau dòng heading), end (heading kế tiếp).
+    Phần text trước heading đầu tiên là section 0 (level 0, không có tiêu đề).
+    """
     sections = []
-    for i, (pos, level, title) in enumerate(heading_positions):
-        start_pos = pos
-        end_pos = heading_positions[i + 1][0] if i + 1 < len(heading_positions) else len(text)
-        
-        section_text = text[start_pos:end_pos].strip()
-        if section_text:
-            sections.append((level, title, section_text))
-    
-    # Tạo chunks từ các sections
-    chunk_id = 1
-    for level, title, section_text in sections:
-        section_chunks = chunk_by_sentences(section_text, max_tokens)
-        
-        for chunk in section_chunks:
-            chunks_with_context.append({
-                'chunk_id': chunk_id,
-                'content': chunk,
-                'tokens': estimate_tokens(chunk),
-                'context': f'section_{level}',
-                'heading_level': level,
-                'heading_title': title
+    stack = []
+
+    first_offset = headings[0]['offset'] if headings else len(text)
+    if text[:first_offset].strip():
+        sections.append({'id': 0, 'level': 0, 'title': None, 'path': [], 'parent': None, 'children': [],
+                         'start': 0, 'body_start': 0, 'end': first_offset})
+
+    for i, heading in enumerate(headings):
+        level = heading['level']
+        while stack and sections[stack[-1]]['level'] >= level:
+            stack.pop()
+        parent = stack[-1] if stack else None
+
+        start = heading['offset']
+        section = {
+            'id': len(sections),
+            'level': level,
+            'title': heading['text'],
+            'path': (sections[parent]['path'] if parent is not None else []) + [heading['text']],
+            'parent': sections[parent]['id'] if parent is not None else None,
+            'children': [],
+            'start': start,
+            'body_start': start + len(heading['text']),
+            'end': headings[i + 1]['offset'] if i + 1 < len(headings) else len(text)
+        }
+        if parent is not None:
+            sections[parent]['children'].append(section['id'])
+        sections.append(section)
+        stack.append(len(sections) - 1)
+
+    return sections
+
+def chunk_by_structure(text: str, headings: List[Dict], max_tokens: int = DEFAULT_WINDOW_TOKENS,
+                       overlap_tokens: int = DEFAULT_OVERLAP_TOKENS, min_tokens: int = DEFAULT_MIN_TOKENS,
+                       token_counter=None) -> Dict:
+    """
+    Chia text theo cây sections dựng từ heading offsets (kết quả md_parser)
+    Mỗi section (heading + phần thân trước section con đầu tiên) được chia bằng cửa sổ trượt,
+    chunk mang heading path và vị trí ký tự trong text để biết nó thuộc mục nào của tài liệu.
+    Returns: {'chunks': [...], 'sections': [...], 'chunking': {...}}
+    """
+    sections = build_section_tree(text, headings)
+    params = chunking_params(max_tokens, overlap_tokens, min_tokens, token_counter)
+    count_tokens = token_counter or estimate_token_counts
+
+    chunks = []
+    for section in sections:
+        # Thân section: từ sau heading tới heading kế tiếp (section con là section riêng)
+        if not text[section['body_start']:section['end']].strip():
+            continue
+
+        # Heading là câu đầu tiên của section (dòng riêng nên luôn là một ranh giới câu)
+        windows = sliding_window_chunks(text[section['start']:section['end']], window_tokens=max_tokens,
+                                        overlap_tokens=overlap_tokens, min_tokens=min_tokens,
+                                        token_counter=token_counter)
+        # Cửa sổ được chọn trên text gốc (giữ offset), tokens/words/chars đếm trên content đã làm sạch
+        contents = [clean_text_advanced(window['content']) for window in windows]
+        for window, content, tokens in zip(windows, contents, count_tokens(contents)):
+            chunks.append({
+                'chunk_id': len(chunks) + 1,
+                'content': content,
+                'tokens': int(round(tokens)),
+                'words': len(content.split()),
+                'chars': len(content),
+                'context': f"section_{section['level']}" if section['level'] else 'general_content',
+                'heading_level': section['level'],
+                'heading_title': section['title'],
+                'heading_path': section['path'],
+                'section_id': section['id'],
+                'section_start': section['start'],
+                'section_end': section['end'],
+                'start_offset': section['start'] + window['start'],
+                'end_offset': section['start'] + window['end'],
+                'overlap_tokens': window['overlap_tokens'],
+                'chunking': params
             })
-            chunk_id += 1
-    
-    return chunks_with_context
 
-def process_chunks(input_file: str, output_file: str = None):
-    """Xử lý chunking cho file JSON đã processed"""
+    return {'chunks': chunks, 'sections': sections, 'chunking': params}
+
+def chunk_by_headings(text: str, headings: List, max_tokens: int = DEFAULT_WINDOW_TOKENS,
+                      overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[Dict]:
+    """Chia text theo headings, giữ nguyên cấu trúc (headings: [(level, title)] hoặc dict có offset)"""
+    if headings and not isinstance(headings[0], dict):
+        headings = locate_headings(text, headings)
+    return chunk_by_structure(text, headings, max_tokens, overlap_tokens)['chunks']
+
+def process_chunks(input_file: str, output_file: str = None, pretty: bool = None):
+    """Xử lý chunking cho file đã processed (pretty: ghi thêm bản JSON indent=2)"""
     print(f"Đang xử lý chunking: {input_file}")
     
     try:
-        # Đọc file JSON
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = read_stage(input_file)
         
         text = data['clean_content']
-        headings = data['metadata']['headings']
         
-        print(f"📄 Text gốc: {estimate_tokens(text)} tokens")
+        # Heading offsets từ md_parser; file processed cũ chỉ có (level, title)
+        headings = data.get('structure', {}).get('headings')
+        if headings is None:
+            headings = locate_headings(text, data['metadata']['headings'])
         
-        # Làm sạch text thêm
-        clean_text = clean_text_advanced(text)
-        print(f"🧹 Text đã làm sạch: {estimate_tokens(clean_text)} tokens")
+        print(f"📄 Text gốc: {estimate_tokens(text)} tokens, {len(headings)} headings")
         
-        # Chunking theo headings
-        chunks = chunk_by_headings(clean_text, headings)
+        # Chunking theo cây sections (làm sạch từng chunk, giữ nguyên offset của text gốc)
+        structured = chunk_by_structure(text, headings)
+        chunks = structured['chunks']
+        print(f"🌳 Sections: {len(structured['sections'])}")
+        print(f"🪟 Cửa sổ: {structured['chunking']['window_tokens']} tokens, "
+              f"overlap {structured['chunking']['overlap_tokens']} tokens")
         
         # Thống kê
         stats = {
@@ -202,17 +187,19 @@ def process_chunks(input_file: str, output_file: str = None):
         result = {
             'source_file': input_file,
             'original_metadata': data['metadata'],
+            'sections': [{key: section[key] for key in ('id', 'level', 'title', 'path', 'parent', 'start', 'end')}
+                         for section in structured['sections']],
+            'chunking': structured['chunking'],
             'chunks': chunks,
             'stats': stats
         }
         
         # Lưu kết quả
         if not output_file:
-            base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_file = f"/opt/rag-copilot/output/{base_name}_chunked.json"
+            output_file = os.path.join("/opt/rag-copilot/output",
+                                       os.path.basename(stage_path(input_file, '_chunked')))
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        write_stage(output_file, result, 'chunks', pretty=pretty)
         
         print(f"\n✅ Chunking hoàn thành!")
         print(f"📊 Thống kê:")
@@ -229,21 +216,22 @@ def process_chunks(input_file: str, output_file: str = None):
         return None
 
 def main():
-    if len(sys.argv) != 2:
-        print("Sử dụng: python3.8 chunk_text.py <processed_file.json>")
+    args = [arg for arg in sys.argv[1:] if arg != '--pretty']
+    if len(args) != 1:
+        print("Sử dụng: python3.8 chunk_text.py <file_processed.jsonl> [--pretty]")
         sys.exit(1)
     
-    input_file = sys.argv[1]
+    input_file = args[0]
     
     if not os.path.exists(input_file):
         print(f"File không tồn tại: {input_file}")
         sys.exit(1)
     
-    if not input_file.lower().endswith('.json'):
-        print(f"File không phải định dạng JSON: {input_file}")
+    if not input_file.lower().endswith(STAGE_EXTENSIONS):
+        print(f"File không phải định dạng JSON Lines / msgpack / JSON: {input_file}")
         sys.exit(1)
     
-    process_chunks(input_file)
+    process_chunks(input_file, pretty=True if '--pretty' in sys.argv else None)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3.8
+"""
+Phát hiện chunk trùng lặp / gần trùng lặp trước khi embedding (MinHash + LSH)
+- Shingle: k từ liên tiếp (mặc định 3) sau khi chuẩn hoá Unicode và chữ thường
+- MinHash: num_perm hàm hash (a*x + b) mod p tính bằng numpy cho cả chunk một lần
+- LSH: chia chữ ký thành bands, chỉ so sánh các chunk rơi vào cùng bucket ở ít nhất một band
+- Độ giống = tỉ lệ giá trị MinHash bằng nhau (ước lượng Jaccard của tập shingle)
+
+Chunk bị bỏ không mất đi: nó được ghi thành alias của chunk giữ lại (metadata['aliases']),
+để trích dẫn vẫn chỉ được tới mọi tài liệu chứa đoạn đó.
+
+Sử dụng:
+    python3.8 dedup_chunks.py /opt/rag-copilot/output/AI-Starter-Kit_final_output [--threshold 0.8]
+"""
+
+import re
+import sys
+import zlib
+import argparse
+import numpy as np
+
+from text_segmenter import normalize_unicode
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_SIZE = 3
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+SHINGLE_BASE = np.uint64(1000003)
+
+WORD_PATTERN = re.compile(r'\w+')
+
+def shingle_hashes(text, size=DEFAULT_SHINGLE_SIZE):
+    """Hash 32-bit của các shingle k từ (text ngắn hơn k từ: cả text là một shingle)"""
+    words = WORD_PATTERN.findall(normalize_unicode(text).lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+
+    word_hashes = np.fromiter((zlib.crc32(w.encode('utf-8')) for w in words), dtype=np.uint64, count=len(words))
+    if len(words) <= size:
+        size = len(words)
+
+    # Hash đa thức của size từ liên tiếp, tính cho mọi vị trí cùng lúc (tràn uint64 là modulo 2^64)
+    count = len(words) - size + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for offset in range(size):
+            combined = combined * SHINGLE_BASE + word_hashes[offset:offset + count]
+    return np.unique(combined & MAX_HASH)
+
+class MinHasher:
+    """Chữ ký MinHash với num_perm hàm hash cố định (cùng seed -> cùng chữ ký giữa các lần chạy)"""
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        """Chữ ký num_perm giá trị (text rỗng: toàn MAX_HASH)"""
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not len(hashes):
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        # a, x < 2^32 nên a*x + b < 2^64, không tràn trước khi lấy modulo
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+def lsh_params(threshold, num_perm=DEFAULT_NUM_PERM):
+    """
+    (bands, rows) với bands * rows <= num_perm
+    Ngưỡng của đường cong S, (1/bands)^(1/rows), đặt thấp hơn threshold một chút để ít bỏ sót;
+    cặp ứng viên sai được loại ở bước so chữ ký
+    """
+    target = max(threshold - 0.1, 0.05)
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        knee = (1.0 / bands) ** (1.0 / rows)
+        if knee <= target and (best is None or knee > best[0]):
+            best = (knee, bands, rows)
+    return (best[1], best[2]) if best else (num_perm, 1)
+
+def similarity(signature_a, signature_b):
+    """Ước lượng Jaccard từ hai chữ ký"""
+    return float(np.mean(signature_a == signature_b))
+
+class DuplicateIndex:
+    """
+    Index LSH các chunk đã giữ lại; add() trả về chunk gốc nếu chunk mới là bản trùng
+    Thứ tự add quyết định chunk nào được giữ (chunk đến trước là bản gốc)
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, shingle_size=DEFAULT_SHINGLE_SIZE):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.buckets = [{} for _ in range(self.bands)]
+        self.signatures = {}
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, text, signature=None):
+        """(key của chunk gốc, độ giống) giống nhất vượt threshold, hoặc (None, 0.0)"""
+        if signature is None:
+            signature = self.hasher.signature(text)
+        best_key, best_score = None, 0.0
+        seen = set()
+        for band, band_key in self._band_keys(signature):
+            for key in self.buckets[band].get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = similarity(signature, self.signatures[key])
+                if score >= self.threshold and score > best_score:
+                    best_key, best_score = key, score
+        return best_key, best_score
+
+    def insert(self, key, text, signature=None):
+        if signature is None:
+            signature = self.hasher.signature(text)
+        self.signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self.buckets[band].setdefault(band_key, []).append(key)
+
+    def add(self, key, text):
+        """Chunk mới: trả về (key gốc, độ giống) nếu trùng, ngược lại thêm vào index và trả về (None, 0.0)"""
+        signature = self.hasher.signature(text)
+        original, score = self.find(text, signature)
+        if original is None:
+            self.insert(key, text, signature)
+        return original, score
+
+def find_duplicates(texts, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM,
+                    shingle_size=DEFAULT_SHINGLE_SIZE):
+    """Với mỗi text: (vị trí text gốc, độ giống) nếu là bản trùng, ngược lại (None, 0.0)"""
+    index = DuplicateIndex(threshold, num_perm, shingle_size)
+    return [index.add(i, text) for i, text in enumerate(texts)]
+
+def dedup_stats(total, removed, threshold):
+    """Thống kê dedup (dedup_ratio: tỉ lệ chunk bị bỏ)"""
+    return {
+        'total_chunks': total,
+        'unique_chunks': total - removed,
+        'duplicates_removed': removed,
+        'dedup_ratio': removed / total if total else 0.0,
+        'threshold': threshold
+    }
+
+def make_alias(chunk_id, metadata, score):
+    """Alias ghi vào metadata của chunk giữ lại, đủ để trích dẫn tài liệu chứa bản trùng"""
+    return {
+        'id': chunk_id,
+        'source_file': metadata.get('source_file'),
+        'source_path': metadata.get('source_path'),
+        'section': metadata.get('section'),
+        'heading_path': metadata.get('heading_path', []),
+        'similarity': round(score, 3)
+    }
+
+def deduplicate_embedding_data(data, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM,
+                               shingle_size=DEFAULT_SHINGLE_SIZE):
+    """
+    Bỏ chunk trùng khỏi dữ liệu embedding_ready ({documents, metadata, ids})
+    Chunk bị bỏ thành alias trong metadata của chunk giữ lại; thống kê ở data['dedup']
+    """
+    documents = data['documents']
+    metadata = data.get('metadata') or [{} for _ in documents]
+    ids = data.get('ids') or [str(i) for i in range(len(documents))]
+
+    duplicates = find_duplicates(documents, threshold, num_perm, shingle_size)
+
+    kept = {}
+    result = dict(data, documents=[], metadata=[], ids=[])
+    for i, (original, score) in enumerate(duplicates):
+        if original is None:
+            kept[i] = len(result['documents'])
+            result['documents'].append(documents[i])
+            result['metadata'].append(dict(metadata[i]))
+            result['ids'].append(ids[i])
+        else:
+            target = result['metadata'][kept[original]]
+            target.setdefault('aliases', []).append(make_alias(ids[i], metadata[i], score))
+
+    removed = len(documents) - len(result['documents'])
+    result['dedup'] = dedup_stats(len(documents), removed, threshold)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Báo cáo chunk trùng lặp (MinHash + LSH)")
+    parser.add_argument("input", help="Thư mục *_final_output, chunk store hoặc embedding_ready.json")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Ngưỡng độ giống (Jaccard)")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM, help="Số hàm hash MinHash")
+    parser.add_argument("--shingle-size", type=int, default=DEFAULT_SHINGLE_SIZE, help="Số từ mỗi shingle")
+    args = parser.parse_args()
+
+    from save_processed_data import load_embedding_ready
+
+    try:
+        data = load_embedding_ready(args.input)
+    except Exception as e:
+        print(f"❌ Không đọc được dữ liệu: {e}")
+        sys.exit(1)
+
+    bands, rows = lsh_params(args.threshold, args.num_perm)
+    result = deduplicate_embedding_data(data, args.threshold, args.num_perm, args.shingle_size)
+    stats = result['dedup']
+
+    print(f"🔎 Dedup: threshold {args.threshold}, {args.num_perm} perms, LSH {bands} bands x {rows} rows")
+    print(f"   - Tổng chunks: {stats['total_chunks']}")
+    print(f"   - Giữ lại: {stats['unique_chunks']}")
+    print(f"   - Trùng lặp: {stats['duplicates_removed']} ({stats['dedup_ratio']:.1%})")
+
+    for doc_id, meta in zip(result['ids'], result['metadata']):
+        for alias in meta.get('aliases', [])[:3]:
+            print(f"   - {alias['id']} ≈ {doc_id} ({alias['similarity']:.2f})")
+
+if __name__ == "__main__":
+    main()
@@ -4,29 +4,75 @@ Script trích xuất metadata nâng cao cho RAG Pipeline
 Gắn metadata chi tiết vào từng chunk
 """
 
-import json
 import sys
 import re
+import time
+import string
+import argparse
+from functools import partial
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 
+from text_segmenter import normalize_unicode, tokenize, filter_keywords, sentence_spans
+from stage_io import iter_stage, write_stage, stage_path, split_stage_path, STAGE_EXTENSIONS
+
+# Từ khoá phân loại nội dung, theo thứ tự ưu tiên (loại đầu tiên có từ khoá xuất hiện được chọn)
+CONTENT_TYPE_KEYWORDS = [
+    ('instruction', ['hướng dẫn', 'cài đặt', 'setup', 'install']),
+    ('overview', ['tổng quan', 'giới thiệu', 'overview', 'introduction']),
+    ('tool_description', ['công cụ', 'tool', 'phần mềm', 'software']),
+    ('example', ['ví dụ', 'example', 'demo', 'mẫu']),
+    ('recommendation', ['khuyến nghị', 'recommend', 'nên', 'should'])
+]
+CONTENT_TYPE_PRIORITY = {content_type: i for i, (content_type, _) in enumerate(CONTENT_TYPE_KEYWORDS)}
+
+# Một regex cho tất cả từ khoá: quét chunk một lần, lastgroup cho biết loại nội dung
+CONTENT_TYPE_PATTERN = re.compile('|'.join(
+    f"(?P<{content_type}>{'|'.join(re.escape(word) for word in words)})"
+    for content_type, words in CONTENT_TYPE_KEYWORDS
+))
+
+# Bullet / numbered list ở đầu câu (mỗi dòng luôn bắt đầu một câu mới, xem sentence_spans) và link
+LIST_ITEM_PATTERN = re.compile(r'\s*(?:(?P<bullet>[-*+])|(?P<numbered>\d+)\.)\s')
+LINK_PATTERN = re.compile(r'https?://[^\s]+')
+
+VIETNAMESE_CHARS = 'àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ'
+
+
+def analyze_chunk(content, max_keywords=10):
+    """
+    Phân tích chunk trong một lượt: chữ thường một lần, tách từ một lần, tách câu một lần (số câu và
+    list items), đếm ký tự một lần (Counter) và một regex cho từ khoá phân loại
+    Returns: {'type', 'keywords', 'structure', 'sentences', 'language'}
+    """
+    content_lower = normalize_unicode(content).lower()
+    char_counts = Counter(content_lower)
+    
+    words = filter_keywords(tokenize(content_lower, normalized=True))
+    
+    # Một lượt tách câu cho cả số câu và bullet/numbered list
+    spans = sentence_spans(content)
+    
+    return {
+        'type': _content_type(content, content_lower, char_counts),
+        'keywords': _top_keywords(words, max_keywords),
+        'structure': analyze_structure(content, spans),
+        'sentences': count_sentences(content, spans),
+        'language': _language(char_counts)
+    }
+
 def extract_chunk_metadata(chunk, chunk_index, original_metadata, total_chunks):
     """Trích xuất metadata cho một chunk"""
     
     content = chunk['content']
     
-    # Phân loại nội dung chunk
-    content_type = classify_content_type(content)
+    # Phân loại, keywords, cấu trúc, số câu, ngôn ngữ: một lượt phân tích
+    analysis = analyze_chunk(content)
     
     # Tính toán vị trí trong document
     position_ratio = (chunk_index + 1) / total_chunks
     
-    # Trích xuất keywords quan trọng
-    keywords = extract_keywords(content)
-    
-    # Phân tích structure
-    structure_info = analyze_structure(content)
-    
     # Metadata nâng cao
     metadata = {
         # Thông tin cơ bản
@@ -40,22 +86,24 @@ def extract_chunk_metadata(chunk, chunk_index, original_metadata, total_chunks):
             'index': chunk_index,
             'total_chunks': total_chunks,
             'ratio': round(position_ratio, 3),
-            'section': get_document_section(position_ratio)
+            'section': get_document_section(position_ratio),
+            # Mục trong tài liệu (chỉ có khi chunk được chia theo cấu trúc headings)
+            'heading_path': chunk.get('heading_path', [])
         },
         
         # Thông tin nội dung
         'content_info': {
-            'type': content_type,
+            'type': analysis['type'],
             'tokens': chunk['tokens'],
             'words': chunk['words'],
             'chars': chunk['chars'],
-            'sentences': count_sentences(content),
-            'keywords': keywords,
-            'language': detect_language(content)
+            'sentences': analysis['sentences'],
+            'keywords': analysis['keywords'],
+            'language': analysis['language']
         },
         
         # Thông tin cấu trúc
-        'structure': structure_info,
+        'structure': analysis['structure'],
         
         # Metadata gốc
         'source_metadata': {
@@ -68,72 +116,73 @@ def extract_chunk_metadata(chunk, chunk_index, original_metadata, total_chunks):
         'processing_metadata': {
             'processed_time': datetime.now().isoformat(),
             'processor_version': '1.0.0',
-            'chunk_method': 'simple_sentence_based'
+            'chunk_method': chunk['chunking']['strategy'] if chunk.get('chunking') else 'simple_sentence_based',
+            # Tham số cửa sổ trượt (window/overlap tokens, tokenizer); None với chunks cũ
+            'chunking': chunk.get('chunking'),
+            'char_span': [chunk['start_offset'], chunk['end_offset']] if 'start_offset' in chunk else None
         }
     }
     
     return metadata
 
-def classify_content_type(content):
-    """Phân loại loại nội dung của chunk"""
-    content_lower = content.lower()
+def _content_type(content, content_lower, char_counts):
+    """Loại nội dung: từ khoá ưu tiên cao nhất xuất hiện trong chunk, sau đó code và links"""
+    best = None
+    for match in CONTENT_TYPE_PATTERN.finditer(content_lower):
+        priority = CONTENT_TYPE_PRIORITY[match.lastgroup]
+        if best is None or priority < best:
+            best = priority
+            if best == 0:
+                break
+    if best is not None:
+        return CONTENT_TYPE_KEYWORDS[best][0]
     
-    # Kiểm tra các pattern
-    if any(word in content_lower for word in ['hướng dẫn', 'cài đặt', 'setup', 'install']):
-        return 'instruction'
-    elif any(word in content_lower for word in ['tổng quan', 'giới thiệu', 'overview', 'introduction']):
-        return 'overview'
-    elif any(word in content_lower for word in ['công cụ', 'tool', 'phần mềm', 'software']):
-        return 'tool_description'
-    elif any(word in content_lower for word in ['ví dụ', 'example', 'demo', 'mẫu']):
-        return 'example'
-    elif any(word in content_lower for word in ['khuyến nghị', 'recommend', 'nên', 'should']):
-        return 'recommendation'
-    elif content.count('```') >= 2 or content.count('`') >= 4:
+    if char_counts['`'] >= 4:
         return 'code_example'
-    elif content.count('http') > 0 or content.count('www') > 0:
+    elif 'http' in content or 'www' in content:
         return 'reference_with_links'
     else:
         return 'general_content'
 
+def classify_content_type(content):
+    """Phân loại loại nội dung của chunk"""
+    content_lower = normalize_unicode(content).lower()
+    return _content_type(content, content_lower, Counter(content_lower))
+
+def _top_keywords(words, max_keywords):
+    """Keywords xuất hiện nhiều nhất (cùng tần suất: giữ thứ tự xuất hiện)"""
+    return [{'word': word, 'frequency': freq} for word, freq in Counter(words).most_common(max_keywords)]
+
 def extract_keywords(content, max_keywords=10):
-    """Trích xuất keywords quan trọng từ content"""
-    
-    # Loại bỏ stop words tiếng Việt và tiếng Anh
-    stop_words = {
-        'và', 'hoặc', 'nhưng', 'vì', 'nên', 'để', 'từ', 'trong', 'trên', 'dưới', 'với', 'của', 'cho', 'về',
-        'the', 'and', 'or', 'but', 'for', 'with', 'from', 'to', 'in', 'on', 'at', 'by', 'as', 'is', 'are',
-        'this', 'that', 'these', 'those', 'a', 'an'
-    }
-    
-    # Tách từ và làm sạch
-    words = re.findall(r'\w+', content.lower())
-    
-    # Lọc từ có ý nghĩa (độ dài >= 3, không phải stop word)
-    meaningful_words = [
-        word for word in words 
-        if len(word) >= 3 and word not in stop_words
-    ]
-    
-    # Đếm tần suất
-    word_freq = {}
-    for word in meaningful_words:
-        word_freq[word] = word_freq.get(word, 0) + 1
-    
-    # Sắp xếp theo tần suất và lấy top keywords
-    keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:max_keywords]
-    
-    return [{'word': word, 'frequency': freq} for word, freq in keywords]
+    """Trích xuất keywords quan trọng từ content (từ ghép tiếng Việt là một keyword, vd. hệ_thống)"""
+    return _top_keywords(filter_keywords(tokenize(content)), max_keywords)
 
-def analyze_structure(content):
-    """Phân tích cấu trúc của chunk"""
+def analyze_structure(content, spans=None):
+    """
+    Phân tích cấu trúc của chunk
+    spans: sentence_spans(content) nếu đã tính (list items được đọc tại đầu các câu, không quét lại)
+    """
+    if spans is None:
+        spans = sentence_spans(content)
     
-    # Đếm các elements
-    bullet_points = len(re.findall(r'^[\s]*[-*+]\s', content, re.MULTILINE))
-    numbered_lists = len(re.findall(r'^[\s]*\d+\.\s', content, re.MULTILINE))
+    # Bullet, numbered list: câu bắt đầu ở đầu dòng (sau ranh giới chứa xuống dòng) bằng -, *, + hoặc "1."
+    bullet_points = numbered_lists = 0
+    for start, end in spans:
+        if start and content[start] not in '-*+' and not content[start].isdecimal():
+            continue
+        match = LIST_ITEM_PATTERN.match(content, start)
+        if match is None or match.end() > end:
+            continue
+        line_start = content.rfind('\n', 0, start) + 1
+        if line_start != start and not content[line_start:start].isspace():
+            continue
+        if match.lastgroup == 'bullet':
+            bullet_points += 1
+        else:
+            numbered_lists += 1
+    links = len(LINK_PATTERN.findall(content)) if 'http' in content else 0
     code_blocks = content.count('```')
     inline_code = content.count('`') - code_blocks * 6  # Trừ đi code blocks
-    links = len(re.findall(r'http[s]?://[^\s]+', content))
     emphasis = content.count('**') + content.count('*')
     
     return {
@@ -164,21 +213,29 @@ def calculate_structure_complexity(bullets, numbers, code, links):
     
     return min(complexity, 5)
 
-def count_sentences(content):
-    """Đếm số câu trong content"""
-    sentences = re.split(r'[.!?]+', content)
-    return len([s for s in sentences if s.strip()])
+def count_sentences(content, spans=None):
+    """Đếm số câu trong content (= len(split_sentences), không tạo danh sách câu)"""
+    if spans is None:
+        spans = sentence_spans(content)
+    # Các span sau bắt đầu ngay sau khoảng trắng của ranh giới, chỉ span đầu có thể toàn khoảng trắng
+    if spans and content[spans[0][0]:spans[0][1]].isspace():
+        return len(spans) - 1
+    return len(spans)
 
-def detect_language(content):
-    """Phát hiện ngôn ngữ chính (đơn giản)"""
-    vietnamese_chars = len(re.findall(r'[àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ]', content.lower()))
-    english_chars = len(re.findall(r'[a-z]', content.lower()))
+def _language(char_counts):
+    """Ngôn ngữ chính từ số lần xuất hiện các ký tự (đã chữ thường)"""
+    vietnamese_chars = sum(char_counts[char] for char in VIETNAMESE_CHARS)
+    english_chars = sum(char_counts[char] for char in string.ascii_lowercase)
     
     if vietnamese_chars > english_chars * 0.1:
         return 'vietnamese'
     else:
         return 'english'
 
+def detect_language(content):
+    """Phát hiện ngôn ngữ chính (đơn giản)"""
+    return _language(Counter(normalize_unicode(content).lower()))
+
 def get_document_section(position_ratio):
     """Xác định phần của tài liệu (beginning, middle, end)"""
     if position_ratio <= 0.3:
@@ -188,38 +245,59 @@ def get_document_section(position_ratio):
     else:
         return 'end'
 
-def process_metadata_extraction(input_file):
-    """Xử lý trích xuất metadata cho file chunked"""
+def _enhance_chunk(indexed_chunk, original_metadata, total_chunks):
+    """Chunk kèm metadata (hàm top-level để chạy được trong process pool)"""
+    i, chunk = indexed_chunk
+    return {
+        'chunk_id': chunk['chunk_id'],
+        'content': chunk['content'],
+        'basic_stats': {
+            'tokens': chunk['tokens'],
+            'words': chunk['words'],
+            'chars': chunk['chars']
+        },
+        'metadata': extract_chunk_metadata(chunk, i, original_metadata, total_chunks)
+    }
+
+def enhance_chunks(chunks, original_metadata, workers=1, total_chunks=None):
+    """
+    Trích xuất metadata cho tất cả chunks
+    chunks có thể là iterator (đọc streaming từ iter_stage) khi biết trước total_chunks
+    workers > 1: chia chunks cho nhiều process (mỗi chunk độc lập, thứ tự kết quả giữ nguyên)
+    """
+    if total_chunks is None:
+        chunks = list(chunks)
+        total_chunks = len(chunks)
+    enhance = partial(_enhance_chunk, original_metadata=original_metadata, total_chunks=total_chunks)
+    if workers <= 1 or total_chunks < 2 * workers:
+        return [enhance(item) for item in enumerate(chunks)]
+    
+    import multiprocessing
+    chunksize = max(1, total_chunks // (workers * 4))
+    with multiprocessing.Pool(workers) as pool:
+        return list(pool.imap(enhance, enumerate(chunks), chunksize=chunksize))
+
+def process_metadata_extraction(input_file, workers=1, pretty=None):
+    """Xử lý trích xuất metadata cho file chunked (pretty: ghi thêm bản JSON indent=2)"""
     
     print(f"Đang trích xuất metadata: {input_file}")
     
     try:
-        # Đọc file chunked
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Đọc file chunked streaming: header trước, chunks lần lượt (không giữ bản chunks gốc trong bộ nhớ)
+        header, chunks = iter_stage(input_file)
         
-        chunks = data['chunks']
-        original_metadata = data['original_metadata']
-        original_stats = data['stats']
+        total_chunks = header['_count']
+        original_metadata = header['original_metadata']
+        original_stats = header['stats']
         
-        print(f"Xử lý {len(chunks)} chunks từ {original_metadata['file_name']}")
+        print(f"Xử lý {total_chunks} chunks từ {original_metadata['file_name']}")
         
         # Trích xuất metadata cho từng chunk
-        enhanced_chunks = []
-        for i, chunk in enumerate(chunks):
-            chunk_metadata = extract_chunk_metadata(chunk, i, original_metadata, len(chunks))
-            
-            enhanced_chunk = {
-                'chunk_id': chunk['chunk_id'],
-                'content': chunk['content'],
-                'basic_stats': {
-                    'tokens': chunk['tokens'],
-                    'words': chunk['words'],
-                    'chars': chunk['chars']
-                },
-                'metadata': chunk_metadata
-            }
-            enhanced_chunks.append(enhanced_chunk)
+        start_time = time.time()
+        enhanced_chunks = enhance_chunks(chunks, original_metadata, workers, total_chunks)
+        elapsed = time.time() - start_time
+        print(f"⏱️  {elapsed:.2f}s ({len(enhanced_chunks) / elapsed if elapsed > 0 else 0:.0f} chunks/s, "
+              f"{workers} worker(s))")
         
         # Thống kê metadata
         content_types = {}
@@ -238,7 +316,7 @@ def process_metadata_extraction(input_file):
         metadata_stats = {
             'content_type_distribution': content_types,
             'language_distribution': languages,
-            'avg_keywords_per_chunk': total_keywords // len(chunks) if chunks else 0,
+            'avg_keywords_per_chunk': total_keywords // len(enhanced_chunks) if enhanced_chunks else 0,
             'metadata_extraction_time': datetime.now().isoformat()
         }
         
@@ -257,9 +335,8 @@ def process_metadata_extraction(input_file):
         }
         
         # Lưu file
-        output_file = input_file.replace('_simple_chunked.json', '_with_metadata.json')
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        output_file = write_stage(stage_path(input_file, '_with_metadata'), result, 'enhanced_chunks',
+                                  pretty=pretty)
         
         # In kết quả
         print(f"\n✅ Metadata extraction hoàn thành!")
@@ -282,21 +359,24 @@ def process_metadata_extraction(input_file):
         return None
 
 def main():
-    if len(sys.argv) != 2:
-        print("Sử dụng: python3.8 extract_metadata.py <chunked_file.json>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Trích xuất metadata cho file chunked")
+    parser.add_argument("input_file", help="File *_chunked.jsonl (hoặc *_chunked.json cũ)")
+    parser.add_argument("--workers", type=int, default=1, help="Số process trích xuất song song")
+    parser.add_argument("--pretty", action="store_true", default=None, help="Ghi thêm bản JSON indent=2 để debug")
+    args = parser.parse_args()
     
-    input_file = sys.argv[1]
+    input_file = args.input_file
     
     if not Path(input_file).exists():
         print(f"File không tồn tại: {input_file}")
         sys.exit(1)
     
-    if not input_file.endswith('_chunked.json'):
-        print(f"File không phải định dạng chunked JSON: {input_file}")
+    _, suffix, extension = split_stage_path(input_file)
+    if suffix not in ('_simple_chunked', '_chunked') or extension not in STAGE_EXTENSIONS:
+        print(f"File không phải output của bước chunking: {input_file}")
         sys.exit(1)
     
-    process_metadata_extraction(input_file)
+    process_metadata_extraction(input_file, workers=args.workers, pretty=args.pretty)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3.8
+"""
+Tokenizer Markdown một lượt cho RAG Pipeline
+Duyệt tài liệu đúng một lần, đồng thời tạo clean text, headings (kèm vị trí ký tự),
+vị trí các code block và danh sách links.
+
+Kết quả của parse_markdown():
+{
+  'clean_text': "...",
+  'headings':    [{'level': 2, 'text': 'Cài đặt', 'offset': 120, 'source_offset': 135, 'line': 7}],
+  'code_blocks': [{'language': 'bash', 'source_start': 300, 'source_end': 360,
+                   'line_start': 12, 'line_end': 15, 'offset': 250}],
+  'links':       [{'text': 'tài liệu', 'url': 'https://...', 'offset': 40, 'image': False}]
+}
+- offset: vị trí trong clean_text (heading/link bắt đầu, hoặc chỗ code block bị lược bỏ)
+- source_offset / source_start / source_end: vị trí trong nội dung gốc
+"""
+
+import re
+
+# Block level: heading hoặc fence mở code block.
+# Bắt đầu bằng '\n' để regex engine tìm nhanh theo ký tự cố định; dòng đầu tài liệu dùng BLOCK_START_PATTERN.
+_BLOCK_LINE = r'''
+    [ ]{0,3}(?:
+        (?P<fence>`{3,}|~{3,})[ \t]*(?P<language>[^`\s]*)[^\n]*
+      | (?P<hashes>\#{1,6})[ \t]+(?P<heading>[^\n]+?)(?:[ \t]+\#+)?[ \t\r]*(?=\n|$)
+    )
+'''
+BLOCK_PATTERN = re.compile(r'\n' + _BLOCK_LINE, re.VERBOSE)
+BLOCK_START_PATTERN = re.compile(_BLOCK_LINE, re.VERBOSE)
+
+THEMATIC_BREAK_PATTERN = re.compile(r'^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t\r]*$', re.MULTILINE)
+BLANK_LINES_PATTERN = re.compile(r'\n\n\n+')
+MULTI_SPACE_PATTERN = re.compile(r'  +')
+
+# Inline: một regex duy nhất, quét mỗi đoạn một lần từ trái sang phải.
+# Mọi nhánh bắt đầu bằng ký tự cố định để regex engine nhảy nhanh tới ký tự có thể khớp.
+# Dấu _ chỉ là emphasis khi không nằm giữa từ, nên snake_case được giữ nguyên.
+INLINE_PATTERN = re.compile(r'''
+    `(?P<code>`*)(?P<code_text>.+?)(?<!`)`(?P=code)(?!`)
+  | \[(?P<link_text>[^\]\n]*)\]\((?P<url>[^)\s]*)(?:[ \t]+"[^"]*")?\)
+  | !\[(?P<image_text>[^\]\n]*)\]\((?P<image_url>[^)\s]*)(?:[ \t]+"[^"]*")?\)
+  | <(?P<autolink>(?:https?|ftp)://[^>\s]+)>
+  | \*\*(?=\S)(?P<strong_text>.+?)(?<=\S)\*\*
+  | __(?<!\w__)(?=\S)(?P<ustrong_text>.+?)(?<=\S)__(?!\w)
+  | \*(?=[^\s*])(?P<em_text>.+?)(?<=[^\s*])\*
+  | _(?<!\w_)(?=[^\s_])(?P<uem_text>.+?)(?<=[^\s_])_(?!\w)
+''', re.VERBOSE)
+INLINE_TRIGGER_PATTERN = re.compile(r'[`\[<*_]')
+
+_fence_close_patterns = {}
+
+def _fence_close_pattern(marker):
+    """Fence đóng: cùng ký tự, dài ít nhất bằng fence mở"""
+    key = (marker[0], len(marker))
+    if key not in _fence_close_patterns:
+        _fence_close_patterns[key] = re.compile(
+            r'\n {0,3}' + re.escape(marker[0]) + '{' + str(len(marker)) + r',}[ \t\r]*(?=\n|$)')
+    return _fence_close_patterns[key]
+
+def _next_block(content, position):
+    """Heading/fence tiếp theo từ position; trả về (vị trí đầu dòng, match) hoặc (None, None)"""
+    if position == 0:
+        match = BLOCK_START_PATTERN.match(content)
+        if match:
+            return 0, match
+    match = BLOCK_PATTERN.search(content, position)
+    if match is None:
+        return None, None
+    return match.start() + 1, match
+
+def render_inline(text, links=None, base_offset=0):
+    """Bỏ cú pháp inline (code, link, image, bold, italic); ghi lại links theo vị trí trong kết quả"""
+    out = []
+    length = 0
+    last = 0
+
+    for match in INLINE_PATTERN.finditer(text):
+        start = match.start()
+        if start > last:
+            out.append(text[last:start])
+            length += start - last
+        last = match.end()
+
+        kind = match.lastgroup
+        if kind == 'code_text':
+            # Nội dung inline code giữ nguyên, không xử lý emphasis bên trong
+            piece = match.group('code_text').strip() or match.group('code_text')
+        elif kind in ('url', 'image_url'):
+            offset = base_offset + length
+            piece = match.group('link_text' if kind == 'url' else 'image_text')
+            if INLINE_TRIGGER_PATTERN.search(piece):
+                piece = render_inline(piece, links, offset)
+            if links is not None:
+                links.append({'text': piece, 'url': match.group(kind), 'offset': offset,
+                              'image': kind == 'image_url'})
+        elif kind == 'autolink':
+            piece = match.group('autolink')
+            if links is not None:
+                links.append({'text': piece, 'url': piece, 'offset': base_offset + length, 'image': False})
+        else:
+            piece = match.group(kind)
+            if INLINE_TRIGGER_PATTERN.search(piece):
+                piece = render_inline(piece, links, base_offset + length)
+
+        out.append(piece)
+        length += len(piece)
+
+    if not out:
+        return text
+    out.append(text[last:])
+    return ''.join(out)
+
+def normalize_whitespace(text):
+    """Bỏ khoảng trắng đầu/cuối dòng, gộp dòng trống và khoảng trắng liên tiếp"""
+    if '\t' in text:
+        text = text.replace('\t', ' ')
+    text = '\n'.join(map(str.strip, text.strip().split('\n')))
+    text = BLANK_LINES_PATTERN.sub('\n\n', text)
+    return MULTI_SPACE_PATTERN.sub(' ', text)
+
+def parse_markdown(content, keep_code_blocks=False):
+    """
+    Phân tích Markdown trong một lượt duyệt
+    Heading và code block được tìm bằng một regex trên toàn tài liệu; đoạn text giữa chúng
+    được chuẩn hoá khoảng trắng và bỏ cú pháp inline theo từng khối, không lặp từng dòng.
+    keep_code_blocks: giữ nội dung code block trong clean_text (mặc định lược bỏ như trước)
+    """
+    pieces = []
+    length = 0
+    pending_break = False
+
+    headings = []
+    code_blocks = []
+    links = []
+
+    def separator():
+        if not pieces:
+            return ''
+        return '\n\n' if pending_break else '\n'
+
+    def emit(text):
+        """Thêm text vào clean_text; trả về offset của text"""
+        nonlocal length, pending_break
+        sep = separator()
+        pieces.append(sep)
+        pieces.append(text)
+        offset = length + len(sep)
+        length = offset + len(text)
+        pending_break = False
+        return offset
+
+    def emit_text(segment):
+        """Đoạn text giữa hai heading/code block"""
+        nonlocal pending_break
+        if '---' in segment or '***' in segment or '___' in segment:
+            segment = THEMATIC_BREAK_PATTERN.sub('', segment)
+        body = segment.strip()
+        if not body:
+            if segment.count('\n') >= 2:
+                pending_break = bool(pieces)
+            return
+        if segment[:len(segment) - len(segment.lstrip())].count('\n') >= 2:
+            pending_break = bool(pieces)
+
+        body = normalize_whitespace(body)
+        emit(render_inline(body, links, length + len(separator())))
+
+        if segment[len(segment.rstrip()):].count('\n') >= 2:
+            pending_break = True
+
+    position = 0
+    line_number = 1
+    while True:
+        line_start, match = _next_block(content, position)
+        if match is None:
+            emit_text(content[position:])
+            break
+
+        emit_text(content[position:line_start])
+        line_number += content.count('\n', position, line_start)
+
+        if match.group('hashes'):
+            text = MULTI_SPACE_PATTERN.sub(' ', match.group('heading').strip().replace('\t', ' '))
+            clean = render_inline(text, links, length + len(separator()))
+            offset = emit(clean)
+            headings.append({'level': len(match.group('hashes')), 'text': clean, 'offset': offset,
+                             'source_offset': line_start, 'line': line_number})
+            position = match.end()
+            continue
+
+        # Code block: nhảy thẳng tới fence đóng (không đóng thì kéo dài tới cuối tài liệu)
+        close = _fence_close_pattern(match.group('fence')).search(content, match.end())
+        end = close.end() if close else len(content)
+        block = {
+            'language': match.group('language') or None,
+            'source_start': line_start,
+            'source_end': end,
+            'line_start': line_number,
+            'line_end': line_number + content.count('\n', line_start, end),
+            'offset': length + (2 if pieces else 0)
+        }
+        code_blocks.append(block)
+
+        pending_break = bool(pieces)
+        if keep_code_blocks:
+            code = content[match.end():close.start() if close else len(content)].strip('\n')
+            if code.strip():
+                block['offset'] = emit(code)
+                pending_break = True
+        line_number = block['line_end']
+        position = end
+
+    return {
+        'clean_text': ''.join(pieces),
+        'headings': headings,
+        'code_blocks': code_blocks,
+        'links': links
+    }
@@ -6,13 +6,17 @@ Script xử lý file Markdown (.md) cho RAG Pipeline
 
 import os
 import sys
-import re
-import json
 from datetime import datetime
 from pathlib import Path
 
-def extract_metadata_from_md(file_path):
-    """Trích xuất metadata từ file markdown"""
+from md_parser import parse_markdown
+from stage_io import write_stage, default_extension
+
+def extract_metadata_from_md(file_path, parsed=None):
+    """
+    Trích xuất metadata từ file markdown
+    parsed: kết quả parse_markdown() đã có (tránh đọc và phân tích lại file)
+    """
     metadata = {
         'file_name': os.path.basename(file_path),
         'file_path': file_path,
@@ -24,17 +28,18 @@ def extract_metadata_from_md(file_path):
     }
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # Tìm title (heading đầu tiên)
-        title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
-        if title_match:
-            metadata['title'] = title_match.group(1).strip()
+        if parsed is None:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                parsed = parse_markdown(f.read())
         
-        # Tìm tất cả headings
-        headings = re.findall(r'^(#{1,6})\s+(.+)$', content, re.MULTILINE)
-        metadata['headings'] = [(len(h[0]), h[1].strip()) for h in headings]
+        # Title: heading cấp 1 đầu tiên (heading trong code block không tính)
+        for heading in parsed['headings']:
+            if heading['level'] == 1:
+                metadata['title'] = heading['text']
+                break
+        
+        # Tất cả headings
+        metadata['headings'] = [(h['level'], h['text']) for h in parsed['headings']]
         
     except Exception as e:
         print(f"Lỗi đọc metadata từ {file_path}: {e}")
@@ -50,11 +55,13 @@ def process_markdown_file(file_path):
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
+        # Phân tích một lượt: clean text, headings, code blocks, links
+        parsed = parse_markdown(content)
+        
         # Trích xuất metadata
-        metadata = extract_metadata_from_md(file_path)
+        metadata = extract_metadata_from_md(file_path, parsed)
         
-        # Làm sạch nội dung (loại bỏ markdown syntax cơ bản)
-        clean_content = clean_markdown_content(content)
+        clean_content = parsed['clean_text']
         
         # Thống kê
         stats = {
@@ -65,10 +72,15 @@ def process_markdown_file(file_path):
             'headings_count': len(metadata['headings'])
         }
         
+        # Nội dung gốc không lưu lại (đọc lại từ metadata['file_path'] khi cần)
         result = {
             'metadata': metadata,
-            'content': content,
             'clean_content': clean_content,
+            'structure': {
+                'headings': parsed['headings'],
+                'code_blocks': parsed['code_blocks'],
+                'links': parsed['links']
+            },
             'stats': stats
         }
         
@@ -80,38 +92,16 @@ def process_markdown_file(file_path):
         return None
 
 def clean_markdown_content(content):
-    """Làm sạch nội dung markdown"""
-    # Loại bỏ markdown syntax cơ bản
-    clean = content
-    
-    # Loại bỏ headers markdown
-    clean = re.sub(r'^#{1,6}\s+', '', clean, flags=re.MULTILINE)
-    
-    # Loại bỏ bold/italic
-    clean = re.sub(r'\*\*([^*]+)\*\*', r'\1', clean)  # **bold**
-    clean = re.sub(r'\*([^*]+)\*', r'\1', clean)      # *italic*
-    clean = re.sub(r'__([^_]+)__', r'\1', clean)      # __bold__
-    clean = re.sub(r'_([^_]+)_', r'\1', clean)        # _italic_
-    
-    # Loại bỏ links
-    clean = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', clean)  # [text](url)
-    
-    # Loại bỏ code blocks
-    clean = re.sub(r'```[^`]*```', '', clean, flags=re.DOTALL)
-    clean = re.sub(r'`([^`]+)`', r'\1', clean)  # inline code
-    
-    # Loại bỏ multiple spaces và newlines
-    clean = re.sub(r'\n\s*\n', '\n\n', clean)
-    clean = re.sub(r' +', ' ', clean)
-    
-    return clean.strip()
+    """Làm sạch nội dung markdown (bỏ headers, bold/italic, links, code blocks)"""
+    return parse_markdown(content)['clean_text']
 
 def main():
-    if len(sys.argv) != 2:
-        print("Sử dụng: python3.8 process_md.py <file_path.md>")
+    args = [arg for arg in sys.argv[1:] if arg != '--pretty']
+    if len(args) != 1:
+        print("Sử dụng: python3.8 process_md.py <file_path.md> [--pretty]")
         sys.exit(1)
     
-    file_path = sys.argv[1]
+    file_path = args[0]
     
     if not os.path.exists(file_path):
         print(f"File không tồn tại: {file_path}")
@@ -137,10 +127,9 @@ def main():
         preview = result['clean_content'][:300]
         print(f"{preview}{'...' if len(result['clean_content']) > 300 else ''}")
         
-        # Lưu kết quả ra file JSON
-        output_file = f"/opt/rag-copilot/output/{Path(file_path).stem}_processed.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        # Lưu kết quả (JSON Lines; --pretty ghi thêm bản JSON indent=2 để debug)
+        output_file = f"/opt/rag-copilot/output/{Path(file_path).stem}_processed{default_extension()}"
+        write_stage(output_file, result, pretty=True if '--pretty' in sys.argv else None)
         
         print(f"\n💾 Đã lưu kết quả: {output_file}")
     
@@ -1,20 +1,36 @@
 #!/usr/bin/env python3.8
 """
 Script lưu trữ và tổ chức dữ liệu đã xử lý cho RAG Pipeline
-Tạo các format khác nhau để sử dụng cho embedding và retrieval
+Ghi một chunk store duy nhất (<tên>_complete.jsonl) + processing_report.json; các format khác
+(CSV, embedding_ready, search index, pickle) là view được tạo từ store khi cần (ensure_view)
+
+Sử dụng:
+    python3.8 save_processed_data.py <file_with_metadata.jsonl> [--views csv,embedding] [--pretty]
+    python3.8 save_processed_data.py <thư_mục_final_output> --views csv,search,pickle
 """
 
 import json
 import csv
 import sys
 import pickle
+import argparse
 from datetime import datetime
 from pathlib import Path
-import pandas as pd
 import re
 
-def create_csv_export(enhanced_chunks, output_dir):
-    """Tạo file CSV cho dễ dàng xem và phân tích"""
+from stage_io import (read_stage, iter_stage, write_stage, split_stage_path, pretty_enabled,
+                      default_extension, STAGE_EXTENSIONS)
+
+def dump_json(data, path, pretty=None):
+    """Ghi JSON gọn (không indent); pretty/RAG_PRETTY_JSON=1: indent=2 để debug"""
+    with open(path, 'w', encoding='utf-8') as f:
+        if pretty_enabled(pretty):
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        else:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+def build_csv_rows(enhanced_chunks):
+    """Các dòng CSV tóm tắt chunks"""
     
     csv_data = []
     for chunk in enhanced_chunks:
@@ -39,6 +55,13 @@ def create_csv_export(enhanced_chunks, output_dir):
         }
         csv_data.append(row)
     
+    return csv_data
+
+def create_csv_export(enhanced_chunks, output_dir):
+    """Tạo file CSV cho dễ dàng xem và phân tích"""
+    
+    csv_data = build_csv_rows(enhanced_chunks)
+    
     # Lưu CSV
     csv_file = output_dir / 'chunks_summary.csv'
     with open(csv_file, 'w', newline='', encoding='utf-8') as f:
@@ -49,8 +72,8 @@ def create_csv_export(enhanced_chunks, output_dir):
     
     return csv_file
 
-def create_embedding_ready_format(enhanced_chunks, output_dir):
-    """Tạo format sẵn sàng cho embedding"""
+def build_embedding_ready(enhanced_chunks):
+    """Dữ liệu embedding_ready ({documents, metadata, ids}) từ các chunk"""
     
     embedding_data = {
         'documents': [],
@@ -71,6 +94,8 @@ def create_embedding_ready_format(enhanced_chunks, output_dir):
             'source_file': chunk['metadata']['source_file'],  # Fixed: use source_file instead of source
             'type': chunk['metadata']['content_info']['type'],
             'section': chunk['metadata']['position_in_doc']['section'],
+            'heading_path': chunk['metadata']['position_in_doc'].get('heading_path', []),
+            'chunking': chunk['metadata']['processing_metadata'].get('chunking'),
             'tokens': chunk['basic_stats']['tokens'],
             'keywords': [kw['word'] for kw in chunk['metadata']['content_info']['keywords'][:3]],
             'language': chunk['metadata']['content_info']['language']
@@ -81,10 +106,16 @@ def create_embedding_ready_format(enhanced_chunks, output_dir):
         chunk_id = f"{chunk['metadata']['source_file']}_{chunk['chunk_id']}"
         embedding_data['ids'].append(chunk_id)
     
+    return embedding_data
+
+def create_embedding_ready_format(enhanced_chunks, output_dir, pretty=None):
+    """Tạo format sẵn sàng cho embedding"""
+    
+    embedding_data = build_embedding_ready(enhanced_chunks)
+    
     # Lưu JSON format cho embedding
     embedding_file = output_dir / 'embedding_ready.json'
-    with open(embedding_file, 'w', encoding='utf-8') as f:
-        json.dump(embedding_data, f, ensure_ascii=False, indent=2)
+    dump_json(embedding_data, embedding_file, pretty)
     
     return embedding_file
 
@@ -111,10 +142,14 @@ def clean_text_for_embedding(text):
     
     return text
 
-def create_search_index(enhanced_chunks, output_dir):
-    """Tạo search index đơn giản"""
+def build_search_index(enhanced_chunks, store_file=None):
+    """
+    Search index đơn giản (keyword/type/section -> chunk ids)
+    Nội dung chunk không chép lại vào index, đọc từ chunk store (store_file) theo chunk_id
+    """
     
     search_index = {
+        'store': Path(store_file).name if store_file else None,
         'documents': {},
         'keyword_index': {},
         'type_index': {},
@@ -127,7 +162,6 @@ def create_search_index(enhanced_chunks, output_dir):
         
         # Document store
         search_index['documents'][chunk_id] = {
-            'content': chunk['content'],
             'metadata': metadata['content_info'],
             'stats': chunk['basic_stats']
         }
@@ -151,10 +185,16 @@ def create_search_index(enhanced_chunks, output_dir):
             search_index['section_index'][section] = []
         search_index['section_index'][section].append(chunk_id)
     
+    return search_index
+
+def create_search_index(enhanced_chunks, output_dir, pretty=None, store_file=None):
+    """Tạo search index đơn giản"""
+    
+    search_index = build_search_index(enhanced_chunks, store_file)
+    
     # Lưu search index
     index_file = output_dir / 'search_index.json'
-    with open(index_file, 'w', encoding='utf-8') as f:
-        json.dump(search_index, f, ensure_ascii=False, indent=2)
+    dump_json(search_index, index_file, pretty)
     
     return index_file
 
@@ -167,6 +207,83 @@ def create_pickle_backup(data, output_dir):
     
     return pickle_file
 
+# View được tạo từ chunk store khi cần: tên -> file trong thư mục final_output
+VIEW_FILES = {
+    'csv': 'chunks_summary.csv',
+    'embedding': 'embedding_ready.json',
+    'search': 'search_index.json',
+    'pickle': 'processed_data.pkl'
+}
+
+def find_chunk_store(output_dir):
+    """
+    Chunk store (<tên>_complete.jsonl / .msgpack) trong thư mục final_output
+    Có nhiều store (vd. đổi RAG_STAGE_FORMAT giữa các lần chạy): chọn file mới nhất,
+    cùng thời điểm thì ưu tiên định dạng đang cấu hình, và cảnh báo
+    """
+    stores = [path for path in Path(output_dir).glob("*_complete.*")
+              if path.suffix in STAGE_EXTENSIONS and path.suffix != '.json']
+    if not stores:
+        return None
+    
+    stores.sort(key=lambda path: (path.stat().st_mtime, path.suffix == default_extension()), reverse=True)
+    if len(stores) > 1:
+        print(f"⚠️  Nhiều chunk store trong {output_dir}: {', '.join(path.name for path in stores)} "
+              f"- dùng {stores[0].name} (mới nhất)")
+    return stores[0]
+
+def write_view(name, data, output_dir, store_file=None, pretty=None):
+    """Ghi một view từ dữ liệu đã load"""
+    if name == 'csv':
+        return create_csv_export(data['enhanced_chunks'], output_dir)
+    if name == 'embedding':
+        return create_embedding_ready_format(data['enhanced_chunks'], output_dir, pretty)
+    if name == 'search':
+        return create_search_index(data['enhanced_chunks'], output_dir, pretty, store_file)
+    if name == 'pickle':
+        return create_pickle_backup(data, output_dir)
+    raise ValueError(f"Unknown view: {name} (available: {', '.join(VIEW_FILES)})")
+
+def ensure_view(output_dir, name, pretty=None):
+    """
+    Đường dẫn file view; chỉ tạo lại khi chưa có hoặc cũ hơn chunk store
+    """
+    output_dir = Path(output_dir)
+    store_file = find_chunk_store(output_dir)
+    if store_file is None:
+        raise FileNotFoundError(f"No chunk store (*_complete.jsonl) in {output_dir}")
+    if name not in VIEW_FILES:
+        raise ValueError(f"Unknown view: {name} (available: {', '.join(VIEW_FILES)})")
+    
+    view_file = output_dir / VIEW_FILES[name]
+    if view_file.exists() and view_file.stat().st_mtime >= store_file.stat().st_mtime:
+        return view_file
+    
+    return write_view(name, read_stage(store_file), output_dir, store_file, pretty)
+
+def load_embedding_ready(path):
+    """
+    Dữ liệu embedding_ready từ chunk store, thư mục final_output hoặc file embedding_ready.json
+    (không cần ghi embedding_ready.json ra đĩa)
+    """
+    path = Path(path)
+    if path.is_dir():
+        view_file = path / VIEW_FILES['embedding']
+        store_file = find_chunk_store(path)
+        if store_file is None or (view_file.exists() and view_file.stat().st_mtime >= store_file.stat().st_mtime):
+            path = view_file
+        else:
+            path = store_file
+    
+    if path.suffix == '.json' and not split_stage_path(path)[1]:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    header, chunks = iter_stage(path)
+    data = build_embedding_ready(chunks)
+    data['source_file'] = header.get('original_metadata', {}).get('file_name')
+    return data
+
 def create_summary_report(data, output_files, output_dir):
     """Tạo summary report"""
     
@@ -222,21 +339,15 @@ def create_summary_report(data, output_files, output_dir):
             for chunk in enhanced_chunks
         ],
         
-        'output_files': {
-            'main_data': str(output_files['main']),
-            'csv_summary': str(output_files['csv']),
-            'embedding_ready': str(output_files['embedding']),
-            'search_index': str(output_files['search']),
-            'pickle_backup': str(output_files['pickle'])
-        },
+        'output_files': {name: str(path) for name, path in output_files.items()},
         
         'ready_for_embedding': {
             'status': 'ready',
             'recommendation': 'Dữ liệu đã sẵn sàng cho bước embedding với vector store',
             'next_steps': [
-                'Sử dụng embedding_ready.json cho vector embedding',
+                f'Sử dụng {Path(output_files["main"]).name} (hoặc thư mục này) cho vector embedding',
                 'Import vào vector database (Chroma/FAISS)',
-                'Test retrieval với search_index.json'
+                'Tạo view khi cần: --views csv,embedding,search,pickle'
             ]
         }
     }
@@ -252,8 +363,7 @@ def load_and_validate_data(input_file):
     """Load và validate dữ liệu từ file với metadata"""
     
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = read_stage(input_file)
         
         # Validate structure
         required_keys = ['enhanced_chunks', 'metadata_stats', 'original_metadata']
@@ -268,8 +378,11 @@ def load_and_validate_data(input_file):
         print(f"❌ Error loading data: {e}")
         return None
 
-def process_data_storage(input_file):
-    """Main function xử lý lưu trữ dữ liệu"""
+def process_data_storage(input_file, pretty=None, views=()):
+    """
+    Main function xử lý lưu trữ dữ liệu
+    views: các view ghi thêm ngay (csv, embedding, search, pickle); pretty: thêm bản JSON indent=2 để debug
+    """
     
     print(f"Đang xử lý lưu trữ dữ liệu: {input_file}")
     
@@ -280,38 +393,32 @@ def process_data_storage(input_file):
     
     # Tạo output directory
     input_path = Path(input_file)
-    base_name = input_path.stem.replace('_with_metadata', '')
+    base_name = Path(split_stage_path(input_file)[0]).name
     output_dir = input_path.parent / f"{base_name}_final_output"
     output_dir.mkdir(exist_ok=True)
     
     print(f"📁 Output directory: {output_dir}")
     
-    # Copy main data file
-    main_file = output_dir / f"{base_name}_complete.json"
-    with open(main_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    # Tạo các format khác nhau
-    print("📊 Tạo CSV summary...")
-    csv_file = create_csv_export(data['enhanced_chunks'], output_dir)
+    # Chunk store: bản lưu duy nhất của chunks
+    main_file = output_dir / f"{base_name}_complete{default_extension()}"
+    write_stage(main_file, data, 'enhanced_chunks', pretty=pretty)
+    output_files = {'main': main_file}
     
-    print("🔮 Tạo embedding-ready format...")
-    embedding_file = create_embedding_ready_format(data['enhanced_chunks'], output_dir)
+    # Store định dạng khác từ lần chạy trước đã cũ
+    for extension in STAGE_EXTENSIONS:
+        stale_store = output_dir / f"{base_name}_complete{extension}"
+        if extension != '.json' and stale_store != main_file and stale_store.exists():
+            stale_store.unlink()
+            print(f"🗑️  Xóa chunk store cũ: {stale_store.name}")
     
-    print("🔍 Tạo search index...")
-    search_file = create_search_index(data['enhanced_chunks'], output_dir)
+    # View cũ (nếu có) không còn khớp với store mới
+    for name, file_name in VIEW_FILES.items():
+        if name not in views and (output_dir / file_name).exists():
+            (output_dir / file_name).unlink()
     
-    print("💾 Tạo pickle backup...")
-    pickle_file = create_pickle_backup(data, output_dir)
-    
-    # Tạo summary report
-    output_files = {
-        'main': main_file,
-        'csv': csv_file,
-        'embedding': embedding_file,
-        'search': search_file,
-        'pickle': pickle_file
-    }
+    for name in views:
+        print(f"📊 Tạo view {name}...")
+        output_files[name] = write_view(name, data, output_dir, main_file, pretty)
     
     print("📋 Tạo summary report...")
     report_file, report = create_summary_report(data, output_files, output_dir)
@@ -337,17 +444,18 @@ def process_data_storage(input_file):
     return output_dir
 
 def test_data_loading(output_dir):
-    """Test load lại dữ liệu để đảm bảo integrity"""
+    """Test load lại dữ liệu để đảm bảo integrity (chunk store + các view đã tạo)"""
     
     print(f"\n🧪 Testing data loading from {output_dir}...")
     
     try:
-        # Test JSON load
-        main_file = output_dir / "AI-Starter-Kit_complete.json"
-        if main_file.exists():
-            with open(main_file, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-            print(f"✅ JSON load: {len(json_data['enhanced_chunks'])} chunks")
+        # Test chunk store: đọc streaming, số record khớp header
+        store_file = find_chunk_store(output_dir)
+        header, chunks = iter_stage(store_file)
+        count = sum(1 for _ in chunks)
+        if count != header['_count']:
+            raise ValueError(f"{store_file.name}: {count} chunks, header says {header['_count']}")
+        print(f"✅ Chunk store load: {count} chunks")
         
         # Test pickle load
         pickle_file = output_dir / "processed_data.pkl"
@@ -359,8 +467,17 @@ def test_data_loading(output_dir):
         # Test CSV load
         csv_file = output_dir / "chunks_summary.csv"
         if csv_file.exists():
-            df = pd.read_csv(csv_file)
-            print(f"✅ CSV load: {len(df)} rows")
+            with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+                rows = sum(1 for _ in csv.DictReader(f))
+            print(f"✅ CSV load: {rows} rows")
+        
+        # Test JSON views
+        for name in ('embedding', 'search'):
+            view_file = output_dir / VIEW_FILES[name]
+            if view_file.exists():
+                with open(view_file, 'r', encoding='utf-8') as f:
+                    json.load(f)
+                print(f"✅ {view_file.name} load")
         
         print("✅ All data formats load successfully!")
         return True
@@ -370,22 +487,40 @@ def test_data_loading(output_dir):
         return False
 
 def main():
-    if len(sys.argv) != 2:
-        print("Sử dụng: python3.8 save_processed_data.py <metadata_file.json>")
+    parser = argparse.ArgumentParser(description="Lưu chunk store và tạo các view (csv, embedding, search, pickle)")
+    parser.add_argument("input", help="File *_with_metadata.jsonl, hoặc thư mục *_final_output đã có chunk store")
+    parser.add_argument("--views", default="", help="Các view cần tạo, vd. csv,embedding,search,pickle")
+    parser.add_argument("--pretty", action="store_true", default=None, help="Ghi JSON indent=2 để debug")
+    args = parser.parse_args()
+    
+    input_path = Path(args.input)
+    views = [name.strip() for name in args.views.split(',') if name.strip()]
+    unknown = [name for name in views if name not in VIEW_FILES]
+    if unknown:
+        print(f"View không hợp lệ: {', '.join(unknown)} (có: {', '.join(VIEW_FILES)})")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    
-    if not Path(input_file).exists():
-        print(f"File không tồn tại: {input_file}")
+    if not input_path.exists():
+        print(f"File không tồn tại: {input_path}")
         sys.exit(1)
     
-    if not input_file.endswith('_with_metadata.json'):
-        print(f"File không phải định dạng metadata JSON: {input_file}")
+    # Thư mục final_output: chỉ tạo view từ chunk store
+    if input_path.is_dir():
+        if find_chunk_store(input_path) is None:
+            print(f"Không tìm thấy chunk store (*_complete.jsonl) trong {input_path}")
+            sys.exit(1)
+        for name in views:
+            print(f"📄 {name}: {ensure_view(input_path, name, args.pretty)}")
+        test_data_loading(input_path)
+        return
+    
+    _, suffix, extension = split_stage_path(input_path)
+    if suffix != '_with_metadata' or extension not in STAGE_EXTENSIONS:
+        print(f"File không phải output của bước metadata: {input_path}")
         sys.exit(1)
     
     # Process data storage
-    output_dir = process_data_storage(input_file)
+    output_dir = process_data_storage(str(input_path), pretty=args.pretty, views=views)
     
     if output_dir:
         # Test data loading
@@ -394,4 +529,4 @@ def main():
         print(f"📁 Location: {output_dir}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
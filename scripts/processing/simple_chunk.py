@@ -1,106 +1,47 @@
 #!/usr/bin/env python3.8
 """
 Script chunking đơn giản cho RAG Pipeline
-Chia text theo câu, không phụ thuộc vào headings
+Chia text theo câu, không phụ thuộc vào headings; các chunk chồng lấn (sliding window)
+
+Sử dụng:
+    python3.8 simple_chunk.py <file_processed.jsonl> [--window-tokens 800] [--overlap-tokens 100]
+    python3.8 simple_chunk.py <file_processed.jsonl> --tokenizer sentence-transformers/all-MiniLM-L6-v2
+    python3.8 simple_chunk.py <file_processed.jsonl> --pretty      # thêm bản JSON indent=2 để debug
 """
 
-import json
-import re
 import sys
+import argparse
 from datetime import datetime
 
-def simple_chunk_text(text, max_tokens=800, min_tokens=200):
-    """Chia text thành chunks theo câu"""
-    
-    # Tách câu
-    sentences = re.split(r'[.!?]+\s+', text)
-    
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-        
-        # Ước tính tokens (1 token ≈ 4 chars cho tiếng Việt)
-        sentence_tokens = len(sentence) // 4
-        
-        # Nếu câu quá dài, chia nhỏ hơn
-        if sentence_tokens > max_tokens:
-            # Lưu chunk hiện tại
-            if current_chunk:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = []
-                current_tokens = 0
-            
-            # Chia câu dài thành các phần
-            words = sentence.split()
-            temp_chunk = []
-            temp_tokens = 0
-            
-            for word in words:
-                word_tokens = len(word) // 4
-                if temp_tokens + word_tokens > max_tokens and temp_chunk:
-                    chunks.append(' '.join(temp_chunk))
-                    temp_chunk = [word]
-                    temp_tokens = word_tokens
-                else:
-                    temp_chunk.append(word)
-                    temp_tokens += word_tokens
-            
-            if temp_chunk:
-                chunks.append(' '.join(temp_chunk))
-        
-        # Nếu thêm câu này vượt quá max_tokens
-        elif current_tokens + sentence_tokens > max_tokens:
-            if current_chunk:
-                chunks.append(' '.join(current_chunk))
-            current_chunk = [sentence]
-            current_tokens = sentence_tokens
-        else:
-            current_chunk.append(sentence)
-            current_tokens += sentence_tokens
-    
-    # Thêm chunk cuối
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    # Gộp chunks quá nhỏ với chunk tiếp theo
-    final_chunks = []
-    i = 0
-    while i < len(chunks):
-        chunk = chunks[i]
-        chunk_tokens = len(chunk) // 4
-        
-        if chunk_tokens < min_tokens and i + 1 < len(chunks):
-            next_chunk = chunks[i + 1]
-            combined_tokens = chunk_tokens + len(next_chunk) // 4
-            
-            if combined_tokens <= max_tokens:
-                final_chunks.append(chunk + ' ' + next_chunk)
-                i += 2  # Skip next chunk
-            else:
-                final_chunks.append(chunk)
-                i += 1
-        else:
-            final_chunks.append(chunk)
-            i += 1
-    
-    return final_chunks
+from sliding_window import (sliding_window_chunks, chunking_params, load_token_counter,
+                            DEFAULT_WINDOW_TOKENS, DEFAULT_OVERLAP_TOKENS, DEFAULT_MIN_TOKENS)
+from stage_io import read_stage, write_stage, stage_path
+
+def simple_chunk_text(text, max_tokens=DEFAULT_WINDOW_TOKENS, min_tokens=DEFAULT_MIN_TOKENS,
+                      overlap_tokens=DEFAULT_OVERLAP_TOKENS, token_counter=None):
+    """
+    Chia text thành chunks theo câu, tối đa max_tokens, chồng lấn overlap_tokens
+    Phần cuối ít hơn min_tokens được gộp bằng cách kéo lùi chunk cuối (không tạo chunk nhỏ lẻ)
+    """
+    windows = sliding_window_chunks(text, window_tokens=max_tokens, overlap_tokens=overlap_tokens,
+                                    min_tokens=min_tokens, token_counter=token_counter)
+    return [window['content'] for window in windows]
 
 def main():
-    if len(sys.argv) != 2:
-        print("Sử dụng: python3.8 simple_chunk.py <processed_file.json>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Chia text đã xử lý thành chunks chồng lấn")
+    parser.add_argument("input_file", help="File *_processed.jsonl (hoặc *_processed.json cũ)")
+    parser.add_argument("--window-tokens", type=int, default=DEFAULT_WINDOW_TOKENS, help="Kích thước chunk (tokens)")
+    parser.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS, help="Overlap giữa 2 chunk (tokens)")
+    parser.add_argument("--min-tokens", type=int, default=DEFAULT_MIN_TOKENS, help="Phần cuối tối thiểu (tokens)")
+    parser.add_argument("--tokenizer", help="Đếm tokens bằng tokenizer của model (mặc định: ước tính 4 ký tự/token)")
+    parser.add_argument("--pretty", action="store_true", default=None, help="Ghi thêm bản JSON indent=2 để debug")
+    args = parser.parse_args()
     
-    input_file = sys.argv[1]
+    input_file = args.input_file
     
     try:
         # Đọc file processed
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = read_stage(input_file)
         
         text = data['clean_content']
         original_metadata = data['metadata']
@@ -109,19 +50,32 @@ def main():
         print(f"Text length: {len(text)} chars")
         print(f"Estimated tokens: {len(text) // 4}")
         
-        # Chunking
-        chunks_text = simple_chunk_text(text)
+        token_counter = None
+        if args.tokenizer:
+            try:
+                token_counter = load_token_counter(args.tokenizer)
+            except Exception as e:
+                print(f"⚠️ Không tải được tokenizer {args.tokenizer}, dùng ước tính 4 ký tự/token: {e}")
+        
+        # Chunking (sliding window, cắt tại ranh giới câu)
+        params = chunking_params(args.window_tokens, args.overlap_tokens, args.min_tokens, token_counter)
+        windows = sliding_window_chunks(text, window_tokens=args.window_tokens, overlap_tokens=args.overlap_tokens,
+                                        min_tokens=args.min_tokens, token_counter=token_counter)
         
         # Tạo chunks với metadata
         chunks = []
-        for i, chunk_content in enumerate(chunks_text):
-            chunk_tokens = len(chunk_content) // 4
+        for i, window in enumerate(windows):
+            chunk_content = window['content']
             chunks.append({
                 'chunk_id': i + 1,
                 'content': chunk_content,
-                'tokens': chunk_tokens,
+                'tokens': window['tokens'],
                 'chars': len(chunk_content),
-                'words': len(chunk_content.split())
+                'words': len(chunk_content.split()),
+                'start_offset': window['start'],
+                'end_offset': window['end'],
+                'overlap_tokens': window['overlap_tokens'],
+                'chunking': params
             })
         
         # Thống kê
@@ -136,6 +90,7 @@ def main():
             'avg_tokens_per_chunk': avg_tokens,
             'min_tokens': min_tokens,
             'max_tokens': max_tokens,
+            'chunking': params,
             'processed_time': datetime.now().isoformat()
         }
         
@@ -148,9 +103,7 @@ def main():
         }
         
         # Lưu file
-        output_file = input_file.replace('_processed.json', '_simple_chunked.json')
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        output_file = write_stage(stage_path(input_file, '_simple_chunked'), result, 'chunks', pretty=args.pretty)
         
         # In kết quả
         print(f"\n✅ Chunking hoàn thành!")
@@ -160,6 +113,7 @@ def main():
         print(f"   - Min: {stats['min_tokens']} tokens")
         print(f"   - Max: {stats['max_tokens']} tokens")
         print(f"   - Tổng tokens: {stats['total_tokens']}")
+        print(f"   - Cửa sổ: {params['window_tokens']} tokens, overlap {params['overlap_tokens']} tokens ({params['tokenizer']})")
         
         print(f"\n📖 Preview 3 chunks đầu:")
         for i, chunk in enumerate(chunks[:3]):
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3.8
+"""
+Engine chia chunks theo cửa sổ trượt cho RAG Pipeline
+Cửa sổ có kích thước và overlap tính bằng tokens, ranh giới luôn rơi vào ranh giới câu (text_segmenter).
+Ranh giới được tìm bằng tổng tích luỹ (np.cumsum) + np.searchsorted thay vì cộng dồn từng câu.
+
+Tokens mặc định ước tính 1 token ≈ 4 ký tự (như phần còn lại của pipeline); truyền
+token_counter (vd. load_token_counter("sentence-transformers/all-MiniLM-L6-v2")) để đếm
+đúng theo tokenizer của model embedding.
+"""
+
+import re
+import numpy as np
+
+from text_segmenter import sentence_spans
+
+DEFAULT_WINDOW_TOKENS = 800
+DEFAULT_OVERLAP_TOKENS = 100
+DEFAULT_MIN_TOKENS = 200
+CHARS_PER_TOKEN = 4
+
+WORD_PATTERN = re.compile(r'\S+\s*')
+
+def estimate_token_counts(texts):
+    """Ước tính tokens (1 token ≈ 4 ký tự), giữ phần lẻ để tổng khớp với độ dài chunk"""
+    return [len(t) / CHARS_PER_TOKEN for t in texts]
+
+def load_token_counter(model_name):
+    """Đếm tokens bằng tokenizer của model (cần transformers)"""
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def count_tokens(texts):
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+
+    count_tokens.name = model_name
+    return count_tokens
+
+def _units(text, window_tokens, token_counter):
+    """Các đơn vị (câu; câu dài hơn cửa sổ được chia theo từ) và số tokens của chúng"""
+    spans = sentence_spans(text)
+    counts = np.asarray(token_counter([text[s:e] for s, e in spans]), dtype=np.float64)
+    if not len(spans) or counts.max() <= window_tokens:
+        return spans, counts
+
+    units = []
+    unit_counts = []
+    for (start, end), count in zip(spans, counts):
+        if count <= window_tokens:
+            units.append((start, end))
+            unit_counts.append(count)
+            continue
+
+        words = [(m.start(), m.end()) for m in WORD_PATTERN.finditer(text, start, end)]
+        word_counts = np.asarray(token_counter([text[s:e] for s, e in words]), dtype=np.float64)
+        for first, last in window_boundaries(word_counts, window_tokens, 0):
+            units.append((words[first][0], words[last - 1][1]))
+            unit_counts.append(word_counts[first:last].sum())
+    return units, np.asarray(unit_counts, dtype=np.float64)
+
+def _window_end(cumulative, start, window_tokens, n):
+    """Đơn vị cuối (exclusive) của cửa sổ lớn nhất bắt đầu tại start (tối thiểu 1 đơn vị)"""
+    end = int(np.searchsorted(cumulative, cumulative[start] + window_tokens, side='right')) - 1
+    return min(max(end, start + 1), n)
+
+def window_boundaries(token_counts, window_tokens=DEFAULT_WINDOW_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                      min_tokens=0):
+    """
+    Chỉ số (start, end) của các cửa sổ trên dãy đơn vị có token_counts
+    - mỗi cửa sổ chứa nhiều đơn vị nhất mà tổng <= window_tokens (tối thiểu 1 đơn vị)
+    - cửa sổ sau bắt đầu ở đơn vị sớm nhất mà phần lặp lại <= overlap_tokens
+    - end luôn tăng dần: nếu cửa sổ sau không vượt qua end trước (đơn vị kế tiếp quá lớn để kèm overlap)
+      thì nó bắt đầu ngay tại end trước, không lặp lại
+    - phần cuối mới ít hơn min_tokens thì cửa sổ cuối được kéo lùi cho đủ kích thước,
+      nhưng phần lặp lại với cửa sổ trước vẫn <= overlap_tokens
+    """
+    if overlap_tokens >= window_tokens:
+        raise ValueError("overlap_tokens must be smaller than window_tokens")
+
+    n = len(token_counts)
+    cumulative = np.concatenate(([0.0], np.cumsum(token_counts, dtype=np.float64)))
+    windows = []
+    start = 0
+    while start < n:
+        end = _window_end(cumulative, start, window_tokens, n)
+        if windows and end <= windows[-1][1]:
+            # Overlap would only repeat a subset of the previous window
+            start = windows[-1][1]
+            end = _window_end(cumulative, start, window_tokens, n)
+
+        if end == n:
+            if windows and cumulative[n] - cumulative[windows[-1][1]] < min_tokens:
+                previous_start, previous_end = windows[-1]
+                full_start = int(np.searchsorted(cumulative, cumulative[n] - window_tokens, side='left'))
+                overlap_start = int(np.searchsorted(cumulative, cumulative[previous_end] - overlap_tokens, side='left'))
+                start = max(min(start, full_start), overlap_start, previous_start + 1)
+            windows.append((start, n))
+            break
+
+        windows.append((start, end))
+        next_start = int(np.searchsorted(cumulative, cumulative[end] - overlap_tokens, side='left'))
+        start = max(next_start, start + 1)
+    return windows
+
+def sliding_window_chunks(text, window_tokens=DEFAULT_WINDOW_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                          min_tokens=DEFAULT_MIN_TOKENS, token_counter=None):
+    """
+    Chia text thành các cửa sổ chồng lấn, cắt tại ranh giới câu
+    Returns: list of {'content', 'start', 'end', 'tokens', 'overlap_tokens'} (start/end: vị trí ký tự trong text)
+    """
+    token_counter = token_counter or estimate_token_counts
+    units, counts = _units(text, window_tokens, token_counter)
+    if not units:
+        return []
+
+    cumulative = np.concatenate(([0.0], np.cumsum(counts)))
+    chunks = []
+    previous_end = 0
+    for first, last in window_boundaries(counts, window_tokens, overlap_tokens, min_tokens):
+        start, end = units[first][0], units[last - 1][1]
+        content = text[start:end].strip()
+        if not content:
+            continue
+        overlap = cumulative[previous_end] - cumulative[first] if chunks and first < previous_end else 0.0
+        chunks.append({
+            'content': content,
+            'start': start,
+            'end': end,
+            'tokens': int(round(cumulative[last] - cumulative[first])),
+            'overlap_tokens': int(round(overlap))
+        })
+        previous_end = last
+    return chunks
+
+def chunking_params(window_tokens=DEFAULT_WINDOW_TOKENS, overlap_tokens=DEFAULT_OVERLAP_TOKENS,
+                    min_tokens=DEFAULT_MIN_TOKENS, token_counter=None):
+    """Tham số chunking, ghi vào metadata của từng chunk"""
+    return {
+        'strategy': 'sliding_window',
+        'window_tokens': window_tokens,
+        'overlap_tokens': overlap_tokens,
+        'min_tokens': min_tokens,
+        'boundary': 'sentence',
+        'tokenizer': getattr(token_counter, 'name', None) or f'chars/{CHARS_PER_TOKEN}'
+    }
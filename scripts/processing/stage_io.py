@@ -0,0 +1,142 @@
+#!/usr/bin/env python3.8
+"""
+Định dạng file trung gian giữa các bước của RAG Pipeline
+(_processed, _simple_chunked / _chunked, _with_metadata, _complete)
+
+Mỗi file là một chuỗi record: record đầu là header (các trường cấp tài liệu), các record sau là
+từng phần tử của danh sách chính (chunks / enhanced_chunks), nên có thể ghi và đọc từng chunk
+mà không cần giữ cả file trong bộ nhớ.
+- .jsonl   : JSON Lines, mỗi dòng một record (mặc định, chỉ cần thư viện chuẩn)
+- .msgpack : msgpack, các record nối tiếp nhau (cần package msgpack; RAG_STAGE_FORMAT=msgpack)
+
+JSON dễ đọc (indent=2) chỉ là bản export để debug: truyền pretty=True hoặc đặt RAG_PRETTY_JSON=1,
+file <tên>.json được ghi thêm cạnh file record. File .json cũ vẫn đọc được.
+
+Header:
+{"_format": "rag-stage", "_version": 1, "_records": "chunks", "_count": 42, ...trường của tài liệu}
+"""
+
+import os
+import json
+
+STAGE_FORMAT = "rag-stage"
+STAGE_VERSION = 1
+STAGE_EXTENSIONS = ('.jsonl', '.msgpack', '.json')
+STAGE_SUFFIXES = ('_processed', '_simple_chunked', '_chunked', '_with_metadata', '_complete')
+
+def default_extension():
+    """Phần mở rộng cho file trung gian mới (RAG_STAGE_FORMAT=jsonl|msgpack)"""
+    return '.msgpack' if os.environ.get('RAG_STAGE_FORMAT', 'jsonl').lower() == 'msgpack' else '.jsonl'
+
+def pretty_enabled(pretty=None):
+    """pretty=None: theo biến môi trường RAG_PRETTY_JSON"""
+    if pretty is None:
+        return os.environ.get('RAG_PRETTY_JSON', '').lower() in ('1', 'true', 'yes')
+    return pretty
+
+def split_stage_path(path):
+    """'/out/doc_simple_chunked.jsonl' -> ('/out/doc', '_simple_chunked', '.jsonl')"""
+    base, extension = os.path.splitext(str(path))
+    if extension not in STAGE_EXTENSIONS:
+        base, extension = str(path), ''
+    for suffix in STAGE_SUFFIXES:
+        if base.endswith(suffix):
+            return base[:-len(suffix)], suffix, extension
+    return base, '', extension
+
+def stage_path(path, suffix, extension=None):
+    """Đường dẫn file của bước tiếp theo, vd. stage_path('doc_processed.jsonl', '_simple_chunked')"""
+    base, _, _ = split_stage_path(path)
+    return base + suffix + (extension or default_extension())
+
+def is_stage_file(path, suffix):
+    """File có phải output của bước suffix không (mọi định dạng)"""
+    _, found, extension = split_stage_path(path)
+    return found == suffix and extension in STAGE_EXTENSIONS
+
+def _header(document, records_key, count):
+    header = {'_format': STAGE_FORMAT, '_version': STAGE_VERSION, '_records': records_key, '_count': count}
+    header.update((key, value) for key, value in document.items() if key != records_key)
+    return header
+
+def _open_writer(path):
+    """Hàm ghi một record vào file đang mở"""
+    if path.endswith('.msgpack'):
+        import msgpack
+        packer = msgpack.Packer(use_bin_type=True)
+        f = open(path, 'wb')
+        return f, lambda record: f.write(packer.pack(record))
+
+    f = open(path, 'w', encoding='utf-8')
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    return f, lambda record: f.write(dumps(record) + '\n')
+
+def write_stage(path, document, records_key=None, pretty=None):
+    """
+    Ghi tài liệu của một bước: header + mỗi phần tử của document[records_key] là một record
+    records_key=None: chỉ có header (vd. _processed)
+    """
+    path = str(path)
+    records = document.get(records_key) or [] if records_key else []
+    tmp_path = path + '.tmp'
+    f, write = _open_writer(tmp_path)
+    try:
+        write(_header(document, records_key, len(records)))
+        for record in records:
+            write(record)
+    finally:
+        f.close()
+    os.replace(tmp_path, path)
+
+    if pretty_enabled(pretty):
+        export_pretty_json(path, document)
+    return path
+
+def export_pretty_json(path, document):
+    """Bản JSON indent=2 để debug, cạnh file record"""
+    json_path = os.path.splitext(str(path))[0] + '.json'
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    return json_path
+
+def _read_records(path):
+    """Lần lượt các record của file .jsonl / .msgpack"""
+    if path.endswith('.msgpack'):
+        import msgpack
+        with open(path, 'rb') as f:
+            yield from msgpack.Unpacker(f, raw=False)
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_stage(path):
+    """
+    Đọc streaming: (header, iterator các record)
+    File .json cũ được đọc toàn bộ rồi trả về như định dạng mới
+    """
+    path = str(path)
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            document = json.load(f)
+        records_key = next((key for key in ('enhanced_chunks', 'chunks') if key in document), None)
+        records = document.get(records_key, []) if records_key else []
+        return _header(document, records_key, len(records)), iter(records)
+
+    records = _read_records(path)
+    header = next(records, None)
+    if not header or header.get('_format') != STAGE_FORMAT:
+        raise ValueError(f"Not a pipeline stage file: {path}")
+    if header.get('_version') != STAGE_VERSION:
+        raise ValueError(f"Unsupported stage file version {header.get('_version')}: {path}")
+    return header, records
+
+def read_stage(path):
+    """Đọc toàn bộ tài liệu (danh sách record được ghép lại dưới key gốc)"""
+    header, records = iter_stage(path)
+    document = {key: value for key, value in header.items() if not key.startswith('_')}
+    if header.get('_records'):
+        document[header['_records']] = list(records)
+    return document
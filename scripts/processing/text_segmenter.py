@@ -0,0 +1,195 @@
+#!/usr/bin/env python3.8
+"""
+Tách câu và tách từ tiếng Việt/tiếng Anh cho RAG Pipeline
+Dùng chung cho chunking (sliding_window), trích xuất keywords (extract_metadata)
+và các chỉ mục theo từ khoá (keyword index / BM25).
+
+- Câu: chỉ tách tại dấu câu thật sự kết thúc câu; không tách ở chữ viết tắt (TP., ThS., e.g., v.v.),
+  số thập phân (3.5), URL, tên viết tắt (J. Smith) hay số thứ tự đầu dòng (1. Cài đặt).
+- Từ: URL, số thập phân, phiên bản (v1.2.0), snake_case là một token; các âm tiết tiếng Việt
+  thuộc từ ghép phổ biến được nối bằng '_' (hệ_thống, cơ_sở_dữ_liệu) như quy ước của VnCoreNLP.
+
+Chỉ dùng regex biên dịch sẵn và tra cứu dict/set, không phụ thuộc thư viện NLP.
+"""
+
+import re
+import unicodedata
+
+# Ứng viên ranh giới câu: xuống dòng, hoặc dấu kết câu (có thể kèm ngoặc/nháy đóng) + khoảng trắng.
+# Mọi nhánh bắt đầu bằng cùng một tập ký tự để regex engine nhảy nhanh tới ứng viên tiếp theo.
+# Mỗi dòng (heading, list item) luôn là một câu riêng; dấu chấm cần kiểm tra thêm (_is_sentence_end).
+BOUNDARY_PATTERN = re.compile(r'[\n.!?…](?:(?<=\n)|[.!?…]*["\'”’)\]]*\s)\s*')
+CLOSING_CHARS = '"\'”’)]'
+
+# Token: URL, hoặc từ (số thập phân/phiên bản/tên miền giữ nguyên); group 2 khác rỗng khi token
+# theo sau bởi đúng một dấu cách và một từ khác (điều kiện để nối âm tiết thành từ ghép)
+_WORD = r'\w+(?:\.\w+)*'
+_URL = r'''(?:https?|ftp)://[^\s<>"\'\]\[)(]*[^\s<>"\'\]\[)(.,;:!?]'''
+WORD_PATTERN = re.compile(r'(' + _WORD + r')( (?=\w))?')
+URL_WORD_PATTERN = re.compile(r'(' + _URL + '|' + _WORD + r')( (?=\w))?')
+WORD_LOOKBACK = 30
+
+# Chữ viết tắt kết thúc bằng dấu chấm (so sánh chữ thường, không gồm dấu chấm cuối)
+ABBREVIATIONS = frozenset([
+    # Tiếng Anh
+    'e.g', 'i.e', 'etc', 'vs', 'approx', 'fig', 'figs', 'vol', 'pp', 'mr', 'mrs', 'ms', 'dr', 'prof',
+    'sr', 'jr', 'inc', 'ltd', 'corp', 'dept', 'univ', 'al', 'cf', 'a.m', 'p.m', 'u.s', 'u.k', 'ph.d',
+    'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+    # Tiếng Việt
+    'tp', 'tx', 'tt', 'ths', 'th.s', 'ts', 'pgs', 'gs', 'bs', 'ks', 'cn', 'ncs', 'ls', 'đ/c', 'v.v', 'vv',
+    'tr', 'nxb', 'sđd', 'đt', 'đc', 'stt', 'kt', 'tl', 'tm'
+])
+ACRONYM_PATTERN = re.compile(r'(?:[^\W\d_]\.)+[^\W\d_]$')
+
+# Từ ghép tiếng Việt phổ biến trong tài liệu nội bộ (âm tiết cách nhau bởi dấu cách, chữ thường, NFC)
+VIETNAMESE_COMPOUNDS = frozenset([
+    'tài liệu', 'hệ thống', 'dữ liệu', 'cơ sở dữ liệu', 'cơ sở', 'thông tin', 'người dùng', 'máy chủ',
+    'máy tính', 'phần mềm', 'phần cứng', 'ứng dụng', 'cài đặt', 'cấu hình', 'triển khai', 'kiểm tra',
+    'kiểm thử', 'xử lý', 'quản lý', 'quản trị', 'bảo mật', 'bảo trì', 'bảo hiểm', 'mật khẩu', 'tài khoản',
+    'đăng nhập', 'đăng ký', 'đăng xuất', 'truy cập', 'truy vấn', 'tìm kiếm', 'câu hỏi', 'trả lời',
+    'câu trả lời', 'văn bản', 'mô hình', 'ngôn ngữ', 'trí tuệ nhân tạo', 'học máy', 'mạng máy tính',
+    'nhân viên', 'nhân sự', 'công ty', 'doanh nghiệp', 'tổ chức', 'phòng ban', 'dự án', 'khách hàng',
+    'đối tác', 'hợp đồng', 'hướng dẫn', 'yêu cầu', 'chính sách', 'quy trình', 'quy định', 'nội quy',
+    'nghỉ phép', 'tiền lương', 'phúc lợi', 'đào tạo', 'đánh giá', 'báo cáo', 'kế hoạch', 'mục tiêu',
+    'chức năng', 'tính năng', 'giao diện', 'lập trình', 'mã nguồn', 'thư viện', 'tham số', 'biến môi trường',
+    'môi trường', 'máy ảo', 'lưu trữ', 'sao lưu', 'khôi phục', 'cập nhật', 'nâng cấp', 'phiên bản',
+    'tệp tin', 'thư mục', 'đường dẫn', 'kết nối', 'tường lửa', 'máy khách', 'dịch vụ',
+    'vận hành', 'phát hành', 'giám sát', 'cảnh báo', 'sự cố', 'lỗi hệ thống', 'hiệu năng', 'tốc độ', 'bộ nhớ',
+    'tài nguyên', 'chi phí', 'thời gian', 'ngày làm việc', 'làm việc', 'giờ làm việc', 'văn phòng',
+    'điện thoại', 'thư điện tử', 'địa chỉ', 'liên hệ', 'hỗ trợ', 'kỹ thuật', 'công nghệ',
+    'an toàn', 'an ninh', 'xác thực', 'phân quyền', 'quyền hạn', 'mã hoá', 'mã hóa',
+    'chỉ mục', 'ngữ cảnh', 'tóm tắt', 'phân loại', 'từ khoá', 'từ khóa', 'câu lệnh', 'dòng lệnh',
+    'trình duyệt', 'đám mây', 'trung tâm dữ liệu', 'sản phẩm', 'chất lượng', 'quy mô', 'nội bộ',
+    'bên ngoài', 'trách nhiệm', 'phê duyệt', 'thủ tục', 'biểu mẫu', 'hồ sơ', 'giấy tờ', 'thanh toán',
+    'hoá đơn', 'hóa đơn', 'ngân sách', 'tài chính', 'kế toán', 'pháp lý', 'ví dụ', 'lưu ý',
+    'chú ý', 'tổng quan', 'giới thiệu', 'kết quả', 'hiệu quả', 'phương pháp', 'giải pháp', 'vấn đề',
+    'trường hợp', 'đầu vào', 'đầu ra', 'tự động', 'thủ công', 'song song', 'đồng bộ', 'bất đồng bộ'
+])
+
+# Stop words tiếng Việt (âm tiết) và tiếng Anh
+STOP_WORDS = frozenset([
+    'và', 'hoặc', 'nhưng', 'vì', 'nên', 'để', 'từ', 'trong', 'trên', 'dưới', 'với', 'của', 'cho', 'về',
+    'là', 'các', 'những', 'một', 'được', 'có', 'này', 'khi', 'thì', 'đã', 'sẽ', 'cũng', 'như', 'theo',
+    'tại', 'bị', 'do', 'đến', 'nếu', 'mà', 'rất', 'đó', 'đây', 'nào', 'hay', 'không', 'còn', 'vào',
+    'ra', 'lên', 'sau', 'trước', 'bằng', 'qua', 'việc', 'người', 'cần', 'phải', 'thể', 'nhiều', 'mỗi',
+    'the', 'and', 'or', 'but', 'for', 'with', 'from', 'to', 'in', 'on', 'at', 'by', 'as', 'is', 'are',
+    'this', 'that', 'these', 'those', 'a', 'an', 'of', 'be', 'was', 'were', 'it', 'its', 'if', 'not',
+    'can', 'will', 'should', 'all', 'any', 'you', 'your', 'we', 'our', 'they', 'their', 'use', 'used'
+])
+
+def _build_compound_index(compounds):
+    """âm tiết đầu -> [(số âm tiết, các âm tiết còn lại)] của các từ ghép bắt đầu bằng nó, dài trước"""
+    index = {}
+    for compound in compounds:
+        syllables = compound.split()
+        if len(syllables) > 1:
+            index.setdefault(syllables[0], set()).add((len(syllables), tuple(syllables[1:])))
+    return {first: sorted(items, reverse=True) for first, items in index.items()}
+
+_COMPOUND_INDEX = _build_compound_index(VIETNAMESE_COMPOUNDS)
+
+def normalize_unicode(text):
+    """Chuẩn hoá NFC (tiếng Việt dấu tổ hợp -> dựng sẵn) để so khớp từ ghép/stop words"""
+    if text.isascii() or unicodedata.is_normalized('NFC', text):
+        return text
+    return unicodedata.normalize('NFC', text)
+
+def _is_sentence_end(text, match):
+    """Ứng viên match (dấu kết câu + khoảng trắng) có thật sự kết thúc câu không"""
+    boundary = match.group()
+    if '\n' in boundary or boundary.rstrip().rstrip(CLOSING_CHARS)[-1] != '.':
+        return True
+    end = match.end()
+    if end < len(text) and text[end].islower():
+        return False
+
+    # Từ ngay trước dấu chấm
+    dot = match.start()
+    low = max(0, dot - WORD_LOOKBACK)
+    word_start = max(text.rfind(' ', low, dot), text.rfind('\n', low, dot), text.rfind('\t', low, dot)) + 1
+    if word_start == 0 and low > 0:
+        return True
+    word = text[word_start:dot].lstrip('("\'[“‘').lower()
+    if not word:
+        return True
+    if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()) or ACRONYM_PATTERN.match(word):
+        return False
+    if word.isdigit() and (word_start == 0 or text[word_start - 1] == '\n'):
+        return False
+    return True
+
+def sentence_spans(text):
+    """Vị trí (start, end) các câu; end gồm cả khoảng trắng sau câu để các span liền nhau"""
+    spans = []
+    start = 0
+    for match in BOUNDARY_PATTERN.finditer(text):
+        if text[match.start()] != '\n' and not _is_sentence_end(text, match):
+            continue
+        if match.start() > start:
+            spans.append((start, match.end()))
+        start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+def split_sentences(text):
+    """Danh sách câu (đã bỏ khoảng trắng đầu/cuối)"""
+    sentences = []
+    for start, end in sentence_spans(text):
+        sentence = text[start:end].strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def tokenize(text, compounds=True, normalized=False):
+    """
+    Tách từ, chữ thường; URL/số thập phân/snake_case giữ nguyên một token
+    compounds: nối âm tiết của từ ghép tiếng Việt bằng '_' (chỉ khi cách nhau đúng một dấu cách)
+    normalized: text đã chuẩn hoá NFC và chữ thường (bỏ qua bước này)
+    """
+    if not normalized:
+        text = normalize_unicode(text).lower()
+    pairs = (URL_WORD_PATTERN if '://' in text else WORD_PATTERN).findall(text)
+    words = [word for word, _ in pairs]
+    if not compounds:
+        return words
+
+    # Chỉ duyệt các vị trí là âm tiết đầu của một từ ghép
+    index = _COMPOUND_INDEX
+    tokens = []
+    last = 0
+    for i in [i for i, word in enumerate(words) if word in index]:
+        if i < last or not pairs[i][1]:
+            continue
+        for length, rest in index[words[i]]:
+            if tuple(words[i + 1:i + length]) == rest and all(pair[1] for pair in pairs[i + 1:i + length - 1]):
+                tokens.extend(words[last:i])
+                tokens.append('_'.join((words[i],) + rest))
+                last = i + length
+                break
+    if not last:
+        return words
+    tokens.extend(words[last:])
+    return tokens
+
+_NON_KEYWORDS = STOP_WORDS | ABBREVIATIONS
+
+def is_keyword(token, min_length=3):
+    """Token có dùng làm keyword không: bỏ stop words, chữ viết tắt, URL, số thập phân, token quá ngắn"""
+    if token in _NON_KEYWORDS or '://' in token:
+        return False
+    if '.' in token and token.replace('.', '').isdigit():
+        return False
+    return len(token) >= min_length or '_' in token
+
+def filter_keywords(tokens, min_length=3):
+    """is_keyword cho cả danh sách token (lọc nhanh bằng set trước, chỉ token có '.'/':' mới kiểm tra thêm)"""
+    return [
+        token for token in tokens
+        if token not in _NON_KEYWORDS and (len(token) >= min_length or '_' in token)
+        and ('.' not in token and ':' not in token or is_keyword(token, min_length))
+    ]
+
+def keyword_terms(text, min_length=3):
+    """Token dùng làm keyword (từ ghép luôn được giữ)"""
+    return filter_keywords(tokenize(text), min_length)
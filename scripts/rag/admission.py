@@ -0,0 +1,242 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Step 5d: Admission control for LLM generation
+Ollama serves only a few generations at once (OLLAMA_NUM_PARALLEL). Sending it more makes every
+request slower, so generation slots are handed out here instead:
+    - at most `concurrency` generations per backend, the rest wait in a bounded queue
+    - interactive requests are served before batch ones (and displace queued batch requests when full)
+    - requests whose expected or actual queue time exceeds max_queue_wait are shed with ServerBusy
+      right away, instead of waiting only to miss their deadline
+Queue depth and wait time are recorded as histograms (micro_batcher.Histogram).
+"""
+
+import os
+import sys
+import time
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vector'))
+from micro_batcher import Histogram
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+DEFAULT_CONCURRENCY = 1
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_MAX_QUEUE_WAIT = 5.0      # Seconds a request may wait for a generation slot
+SERVICE_SMOOTHING = 0.2           # EWMA weight of the newest generation time
+
+QUEUE_WAIT_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10]
+QUEUE_DEPTH_BUCKETS = [0, 1, 2, 4, 8, 16, 32]
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+class ServerBusy(Exception):
+    """Request shed by admission control; retry_after is a hint in seconds"""
+
+    def __init__(self, reason, queue_depth, retry_after):
+        super().__init__(f"Server busy: {reason} (queue depth {queue_depth})")
+        self.reason = reason
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+class _Waiter:
+    """One queued request; granted is set by release() when a slot is handed over"""
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.event = threading.Event()
+        self.granted = False
+        self.evicted = False
+
+class AdmissionController:
+    """
+    Bounded priority queue in front of one LLM backend
+    Use `with controller.slot(priority, deadline): ...` around a generation (or acquire()/release()).
+    """
+
+    def __init__(self, name, concurrency=DEFAULT_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE,
+                 max_queue_wait=DEFAULT_MAX_QUEUE_WAIT):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.active = 0
+        self.service_time = None
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.queue_wait = Histogram(QUEUE_WAIT_BUCKETS)
+        self.queue_depth = Histogram(QUEUE_DEPTH_BUCKETS)
+        self.counters = {name: {'admitted': 0, 'shed': 0} for name in PRIORITIES}
+
+    def _depth(self):
+        return sum(1 for _, _, waiter in self._queue if not waiter.evicted)
+
+    def _expected_wait(self, ahead):
+        """Queue time for a request with `ahead` requests in front of it (0.0 while service time is unknown)"""
+        if self.service_time is None:
+            return 0.0
+        # Running generations are on average half done
+        return (ahead / self.concurrency + 0.5) * self.service_time
+
+    def _shed(self, priority, reason, depth):
+        self.counters[priority]['shed'] += 1
+        retry_after = round(max(self._expected_wait(depth), 1.0), 1)
+        raise ServerBusy(reason, depth, retry_after)
+
+    def _evict_batch(self):
+        """Drop the newest queued batch request to make room for an interactive one"""
+        candidates = [entry for entry in self._queue if entry[2].priority == "batch" and not entry[2].evicted]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda entry: entry[1])[2]
+        victim.evicted = True
+        victim.event.set()
+        return True
+
+    def acquire(self, priority="interactive", deadline=None):
+        """
+        Wait for a generation slot; returns the seconds spent queued
+        Raises ServerBusy when the queue is full, the expected wait is too long, or the wait times out.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r} (expected one of {', '.join(PRIORITIES)})")
+        enqueued = time.time()
+        max_wait = self.max_queue_wait
+        if deadline is not None and deadline.remaining() is not None:
+            max_wait = min(max_wait, deadline.remaining())
+
+        with self._lock:
+            depth = self._depth()
+            self.queue_depth.observe(depth)
+            if self.active < self.concurrency and depth == 0:
+                self.active += 1
+                self.counters[priority]['admitted'] += 1
+                self.queue_wait.observe(0.0)
+                return 0.0
+
+            # Interactive requests only queue behind other interactive ones
+            ahead = depth if priority == "batch" else sum(
+                1 for _, _, waiter in self._queue if waiter.priority == "interactive" and not waiter.evicted)
+            if depth >= self.max_queue and not (priority == "interactive" and self._evict_batch()):
+                self._shed(priority, "queue full", depth)
+            if self._expected_wait(ahead) > max_wait:
+                self._shed(priority, f"expected wait {self._expected_wait(ahead):.1f}s > {max_wait:.1f}s", depth)
+
+            waiter = _Waiter(priority)
+            heapq.heappush(self._queue, (PRIORITIES[priority], next(self._sequence), waiter))
+
+        waiter.event.wait(max_wait)
+
+        with self._lock:
+            if not waiter.granted:
+                # Timed out or evicted: leave the queue (release() skips evicted entries)
+                waiter.evicted = True
+                self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                heapq.heapify(self._queue)
+                reason = "displaced by interactive request" if waiter.event.is_set() else f"queued over {max_wait:.1f}s"
+                self._shed(priority, reason, self._depth())
+            self.counters[priority]['admitted'] += 1
+
+        waited = time.time() - enqueued
+        self.queue_wait.observe(waited)
+        return waited
+
+    def release(self, service_seconds=None):
+        """Free a slot (handing it to the next queued request) and learn the generation time"""
+        with self._lock:
+            if service_seconds is not None:
+                self.service_time = service_seconds if self.service_time is None else (
+                    (1 - SERVICE_SMOOTHING) * self.service_time + SERVICE_SMOOTHING * service_seconds)
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.evicted:
+                    continue
+                waiter.granted = True
+                waiter.event.set()
+                return  # Slot passes straight to the waiter; active count unchanged
+            self.active -= 1
+
+    def slot(self, priority="interactive", deadline=None):
+        """Acquire a slot (may raise ServerBusy); use the result as a context manager to release it"""
+        return _Slot(self, priority, deadline)
+
+    def configure(self, concurrency, max_queue, max_queue_wait):
+        """Apply new limits; extra slots go to queued requests right away"""
+        with self._lock:
+            self.concurrency = max(1, concurrency)
+            self.max_queue = max_queue
+            self.max_queue_wait = max_queue_wait
+            while self.active < self.concurrency and self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.evicted:
+                    continue
+                waiter.granted = True
+                waiter.event.set()
+                self.active += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'concurrency': self.concurrency,
+                'active': self.active,
+                'queued': self._depth(),
+                'max_queue': self.max_queue,
+                'max_queue_wait': self.max_queue_wait,
+                'service_time': round(self.service_time, 3) if self.service_time is not None else None,
+                'by_priority': {name: dict(counts) for name, counts in self.counters.items()},
+                'queue_wait': self.queue_wait.snapshot(),
+                'queue_depth': self.queue_depth.snapshot()
+            }
+
+class _Slot:
+    """
+    One generation slot, acquired on creation (ServerBusy is raised before any `with` block)
+    Leaving the `with` block releases it; skip() keeps a generation that never ran (or failed)
+    out of the service-time estimate. `waited` is the queue time.
+    """
+
+    def __init__(self, controller, priority, deadline):
+        self.controller = controller
+        self.waited = controller.acquire(priority, deadline)
+        self.measured = True
+        self._started = time.time()
+
+    def skip(self):
+        self.measured = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        measured = self.measured and exc_type is None
+        self.controller.release(time.time() - self._started if measured else None)
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def get_admission_controller(backend, concurrency=DEFAULT_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE,
+                             max_queue_wait=DEFAULT_MAX_QUEUE_WAIT):
+    """Process-wide controller per backend (e.g. Ollama host), shared by every generator using it"""
+    with _controllers_lock:
+        controller = _controllers.get(backend)
+        if controller is None:
+            controller = AdmissionController(backend, concurrency, max_queue, max_queue_wait)
+            _controllers[backend] = controller
+            log_message(f"🚦 Admission control for {backend}: {concurrency} concurrent, "
+                        f"queue {max_queue}, max wait {max_queue_wait}s")
+        elif (controller.concurrency, controller.max_queue, controller.max_queue_wait) != (
+                max(1, concurrency), max_queue, max_queue_wait):
+            # Last configuration wins; every generator on this host shares the new limits
+            log_message(f"⚠️  Reconfiguring admission control for {backend}: "
+                        f"{controller.concurrency} → {concurrency} concurrent, queue {controller.max_queue} → "
+                        f"{max_queue}, max wait {controller.max_queue_wait}s → {max_queue_wait}s", "WARNING")
+            controller.configure(concurrency, max_queue, max_queue_wait)
+        return controller
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Step 5b: Lazy, retrying component initialization
+A LazyComponent wraps the setup of one dependency (Ollama client, vector database).
+Setup failures are recorded instead of exiting: the next use retries once the
+exponential backoff has passed, and health() reports readiness per component.
+"""
+
+import time
+import threading
+from datetime import datetime
+
+DEFAULT_INITIAL_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+class LazyComponent:
+    """
+    One dependency initialized on first use and re-initialized after failures
+    States: "pending" (never tried), "ready", "failed" (retry after backoff)
+    Only one thread runs setup at a time. Callers wait for the first attempt; after a failure
+    they see the current state instead of queueing behind a retry.
+    """
+
+    def __init__(self, name, setup, initial_backoff=DEFAULT_INITIAL_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF):
+        self.name = name
+        self.setup = setup
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.state = "pending"
+        self.attempts = 0
+        self.failures = 0
+        self.last_error = None
+        self.ready_since = None
+        self.next_retry_at = 0.0
+        self._backoff = initial_backoff
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def ensure(self, force=False):
+        """
+        Run setup unless ready; False while setup is failing or backing off
+        force=True ignores the backoff and waits for a setup already in progress.
+        """
+        if self.state == "ready":
+            return True
+        if not force and time.time() < self.next_retry_at:
+            return False
+        if not self._lock.acquire(blocking=force or self.state == "pending"):
+            return self.state == "ready"
+
+        try:
+            if self.state == "ready":
+                return True
+            if not force and time.time() < self.next_retry_at:
+                return False  # The attempt we waited for just failed
+            self.attempts += 1
+            try:
+                self.setup()
+            except (Exception, SystemExit) as e:
+                # SystemExit from legacy setup code must not take the process down either
+                self._failed(e)
+                return False
+            self.state = "ready"
+            self.ready_since = time.time()
+            self.last_error = None
+            self._backoff = self.initial_backoff
+            log_message(f"✅ {self.name} ready (attempt {self.attempts})")
+            return True
+        finally:
+            self._lock.release()
+
+    def mark_failed(self, error):
+        """Report a failure seen while using the component (e.g. connection refused)"""
+        with self._lock:
+            self._failed(error)
+
+    def _failed(self, error):
+        self.state = "failed"
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.ready_since = None
+        self.next_retry_at = time.time() + self._backoff
+        log_message(f"⚠️  {self.name} unavailable ({self.last_error}), retry in {self._backoff:.0f}s", "WARNING")
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def status(self):
+        return {
+            'state': self.state,
+            'attempts': self.attempts,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'ready_since': datetime.fromtimestamp(self.ready_since).isoformat() if self.ready_since else None,
+            'retry_in': round(max(0.0, self.next_retry_at - time.time()), 1) if self.state == "failed" else None
+        }
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Step 3b: Context Compression
+Extractive sentence-level compression of retrieved chunks before prompt injection
+"""
+
+import re
+import numpy as np
+from datetime import datetime
+
+from mmr import cosine_relevance
+
+# Sentence boundaries: terminal punctuation followed by whitespace, or line breaks
+SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[.!?])\s+|\n+')
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def estimate_tokens(text):
+    """Simple token estimation (1 token ≈ 4 characters for Vietnamese/English)"""
+    return len(text) // 4
+
+def split_sentences(text):
+    """Split a chunk into non-empty sentences"""
+    return [s.strip() for s in SENTENCE_SPLIT_PATTERN.split(text) if s and s.strip()]
+
+def compress_contexts(contexts, query_embedding, model, max_tokens=600, window=1):
+    """
+    Keep only the sentences of retrieved contexts that best match the query
+
+    Args:
+        contexts: Context dictionaries from retrieve_context (full chunk content)
+        query_embedding: Query embedding already computed for the vector search
+        model: Sentence transformer model (used once to encode all sentences)
+        max_tokens: Token budget for the compressed context
+        window: Number of neighbor sentences kept around each selected sentence
+
+    Returns:
+        (compressed_contexts, stats)
+    """
+    sentences = []
+    owners = []
+    for ci, ctx in enumerate(contexts):
+        for sentence in split_sentences(ctx.get('content', '')):
+            sentences.append(sentence)
+            owners.append(ci)
+
+    original_tokens = sum(estimate_tokens(ctx.get('content', '')) for ctx in contexts)
+    stats = {
+        'original_tokens': original_tokens,
+        'compressed_tokens': original_tokens,
+        'compression_ratio': 1.0,
+        'sentences_total': len(sentences),
+        'sentences_kept': len(sentences)
+    }
+
+    if not sentences:
+        return contexts, stats
+
+    # Score every sentence against the query in a single matmul
+    scores = cosine_relevance(query_embedding, model.encode(sentences))
+
+    owners = np.asarray(owners)
+    token_counts = np.array([estimate_tokens(s) for s in sentences])
+    selected = np.zeros(len(sentences), dtype=bool)
+    truncated = {}   # sentence index -> tokens it was cut to
+    used_tokens = 0
+
+    def keep(idx, budget):
+        """Select a sentence, cut to budget tokens when longer; returns the tokens used"""
+        selected[idx] = True
+        if token_counts[idx] <= budget:
+            truncated.pop(idx, None)
+            return int(token_counts[idx])
+        truncated[idx] = budget
+        return budget
+
+    # Every context keeps at least its best sentence (cut to an equal share of the budget if needed)
+    share = max(1, max_tokens // len(contexts))
+    for ci in np.unique(owners):
+        positions = np.flatnonzero(owners == ci)
+        best = positions[np.argmax(scores[positions])]
+        used_tokens += keep(best, max(1, min(share, max_tokens - used_tokens)))
+
+    for idx in np.argsort(-scores, kind='stable'):
+        if idx in truncated:
+            # Reserved above in part: give it more of the budget if any is left
+            given = truncated[idx]
+            used_tokens += keep(idx, given + max(0, max_tokens - used_tokens)) - given
+            continue
+        if selected[idx]:
+            continue
+        # Neighbor window stays inside the sentence's own chunk
+        lo = max(0, idx - window)
+        hi = min(len(sentences), idx + window + 1)
+        span = np.arange(lo, hi)
+        span = span[(owners[span] == owners[idx]) & ~selected[span]]
+        span_tokens = int(token_counts[span].sum())
+
+        if used_tokens + span_tokens <= max_tokens:
+            selected[span] = True
+            used_tokens += span_tokens
+        elif used_tokens < max_tokens:
+            # Sentence longer than what is left (e.g. an unpunctuated run): keep its beginning
+            used_tokens += keep(idx, max_tokens - used_tokens)
+
+    # Rebuild each context from its kept sentences, preserving document order
+    compressed = []
+    for ci, ctx in enumerate(contexts):
+        new_ctx = dict(ctx)
+        new_ctx['metadata'] = dict(ctx.get('metadata', {}))
+        positions = np.flatnonzero((owners == ci) & selected)
+        if len(positions) == 0:
+            compressed.append(new_ctx)  # No sentences to choose from (empty content)
+            continue
+
+        texts = [sentences[pos][:truncated[pos] * 4].rstrip() + "..." if pos in truncated else sentences[pos]
+                 for pos in positions]
+        parts = [texts[0]]
+        for prev, pos, text in zip(positions[:-1], positions[1:], texts[1:]):
+            parts.append(text if pos == prev + 1 else f"... {text}")
+
+        new_ctx['content'] = ' '.join(parts)
+        new_ctx['metadata']['compressed'] = True
+        new_ctx['metadata']['original_tokens'] = estimate_tokens(ctx.get('content', ''))
+        if any(pos in truncated for pos in positions):
+            new_ctx['metadata']['truncated'] = True
+        compressed.append(new_ctx)
+
+    compressed_tokens = sum(estimate_tokens(ctx.get('content', '')) for ctx in compressed)
+    stats.update({
+        'compressed_tokens': compressed_tokens,
+        'compression_ratio': round(compressed_tokens / original_tokens, 3) if original_tokens else 1.0,
+        'sentences_kept': int(selected.sum())
+    })
+    for ctx in compressed:
+        ctx['metadata']['compression'] = stats
+
+    log_message(f"✅ Context compressed: {original_tokens} → {compressed_tokens} tokens "
+                f"(ratio {stats['compression_ratio']:.3f}, "
+                f"{stats['sentences_kept']}/{stats['sentences_total']} sentences)")
+
+    return compressed, stats
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Retrieved Context Cache and Prefetching
+Retrieval results (context lists) kept for a short TTL, keyed on normalized query text,
+vector store build and retrieval settings, bounded by entry count and approximate bytes.
+Prefetcher runs retrieval for partial queries in the background (e.g. while the user is
+typing), so the final submit finds both the query embedding and the contexts cached.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from process_query import normalize_query
+
+DEFAULT_TTL = 60.0                    # Seconds a retrieval result stays valid
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+MIN_PREFETCH_CHARS = 8                # Shorter partial queries retrieve nothing useful
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def estimate_context_bytes(contexts):
+    """Approximate memory held by a context list (text dominates)"""
+    return sum(len(ctx.get('content', '')) * 2 + len(str(ctx.get('metadata', {}))) + 64 for ctx in contexts)
+
+class ContextCache:
+    """TTL + LRU cache of retrieved contexts, bounded by entries and bytes"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (expires_at, size, contexts)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query_text, store_key, settings):
+        """Normalized query + vector store build + retrieval settings (top_k, max_tokens, ...)"""
+        return (normalize_query(query_text), store_key, tuple(sorted(settings.items())))
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        """Cached contexts for key, or None (expired entries count as misses)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(ctx) for ctx in entry[2]]
+
+    def put(self, key, contexts):
+        """Store contexts, evicting least recently used entries beyond the bounds"""
+        size = estimate_context_bytes(contexts)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time() + self.ttl, size, [dict(ctx) for ctx in contexts])
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        """Drop all entries (e.g. after the vector database was reloaded)"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class Prefetcher:
+    """
+    Background retrieval for partial queries, latest request wins
+    While one prefetch runs, newer submissions replace the pending one, so a burst
+    of keystrokes costs at most two retrievals.
+    """
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self._pending = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self.submitted = 0
+        self.superseded = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, query_text):
+        with self._condition:
+            self.submitted += 1
+            if self._pending is not None:
+                self.superseded += 1
+            self._pending = query_text
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="context-prefetch", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                query_text, self._pending = self._pending, None
+            try:
+                self.fetch(query_text)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                log_message(f"⚠️  Prefetch failed for '{query_text[:50]}': {e}", "WARNING")
+
+    def stats(self):
+        with self._condition:
+            return {
+                'submitted': self.submitted,
+                'superseded': self.superseded,
+                'completed': self.completed,
+                'failed': self.failed,
+                'pending': self._pending is not None
+            }
@@ -10,6 +10,9 @@ import json
 import numpy as np
 from datetime import datetime
 
+# Shared embedding backend lives in scripts/vector
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vector'))
+
 def create_mock_vector_db():
     """Create mock vector database files"""
     print("🔧 Creating mock vector database for Step 4 testing...")
@@ -25,7 +28,7 @@ def create_mock_vector_db():
     
     try:
         import faiss
-        from sentence_transformers import SentenceTransformer
+        from embedder_factory import get_embedder
         print("✅ Required libraries available")
     except ImportError as e:
         print(f"❌ Missing libraries: {e}")
@@ -64,7 +67,7 @@ def create_mock_vector_db():
     
     # Initialize embedding model
     print("🤖 Loading embedding model...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = get_embedder()
     
     # Generate embeddings
     print("🔢 Generating embeddings...")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Step 5c: Request deadlines and cancellation
+A Deadline is created once per request (RAGPipeline.process_query) and passed down to every
+stage. Stages check the remaining budget before starting work. LLM generation arms a watchdog
+(Deadline.on_expire) that closes the in-flight Ollama stream the moment the deadline passes or
+the caller cancels (client disconnected), even while Ollama is still evaluating the prompt or has
+stalled, which frees the generation slot.
+
+TokenRateEstimator learns prompt-eval and generation speed from Ollama's final stream chunk,
+so num_predict can be sized to what fits in the remaining budget.
+"""
+
+import time
+import threading
+
+DEFAULT_REQUEST_TIMEOUT = 15.0    # Epic target: < 15s per query
+DEFAULT_LLM_READ_TIMEOUT = 10.0   # Longest silence tolerated from Ollama (stalled generation)
+READ_TIMEOUT_GRACE = 1.0          # Socket timeouts trail the deadline; the watchdog fires first
+MIN_PREDICT_TOKENS = 16           # Below this an answer is not worth starting
+RATE_SMOOTHING = 0.3              # EWMA weight of the newest observation
+
+class DeadlineExceeded(Exception):
+    """Raised by Deadline.check when the budget is spent or the request was cancelled"""
+
+    def __init__(self, stage, cancelled=False):
+        reason = "cancelled" if cancelled else "deadline exceeded"
+        super().__init__(f"{reason} before {stage}")
+        self.stage = stage
+        self.cancelled = cancelled
+
+class Deadline:
+    """
+    Absolute deadline for one request plus a cancellation flag
+    timeout=None means no time limit (cancellation still works).
+    """
+
+    def __init__(self, timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.started = time.time()
+        self.expires_at = self.started + timeout if timeout is not None else None
+        self._cancelled = threading.Event()
+        self._watchdogs = []
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds left (None = unlimited, never negative)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.time())
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Caller went away (e.g. client disconnected): fire watchdogs, stop at the next check"""
+        self._cancelled.set()
+        with self._lock:
+            watchdogs, self._watchdogs = self._watchdogs, []
+        for watchdog in watchdogs:
+            watchdog.fire()
+
+    def on_expire(self, callback):
+        """
+        Call callback (once, from a timer thread) when the deadline passes or cancel() is called
+        Returns the Watchdog; disarm() it when the guarded work finishes.
+        """
+        watchdog = Watchdog(self, callback)
+        with self._lock:
+            self._watchdogs.append(watchdog)
+        if self.expired():
+            watchdog.fire()
+        else:
+            watchdog.arm(self.remaining())
+        return watchdog
+
+    def _forget(self, watchdog):
+        with self._lock:
+            if watchdog in self._watchdogs:
+                self._watchdogs.remove(watchdog)
+
+    def expired(self):
+        return self.cancelled or (self.expires_at is not None and time.time() >= self.expires_at)
+
+    def check(self, stage):
+        """Raise DeadlineExceeded unless there is budget left to start `stage`"""
+        if self.expired():
+            raise DeadlineExceeded(stage, cancelled=self.cancelled)
+
+    def to_dict(self):
+        remaining = self.remaining()
+        return {
+            'timeout': self.timeout,
+            'elapsed': round(self.elapsed(), 3),
+            'remaining': round(remaining, 3) if remaining is not None else None,
+            'cancelled': self.cancelled
+        }
+
+class Watchdog:
+    """One on_expire registration: fires its callback at most once, unless disarmed first"""
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.fired = False
+        self._done = False
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def arm(self, seconds):
+        if seconds is None:
+            return  # No time limit: only cancel() fires
+        with self._lock:
+            if self._done:
+                return
+            self._timer = threading.Timer(seconds, self.fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def fire(self):
+        with self._lock:
+            if self._done:
+                return
+            self._done = True
+            self.fired = True
+            timer = self._timer
+        if timer:
+            timer.cancel()
+        self.deadline._forget(self)
+        self.callback()
+
+    def disarm(self):
+        with self._lock:
+            self._done = True
+            timer = self._timer
+        if timer:
+            timer.cancel()
+        self.deadline._forget(self)
+
+class TokenRateEstimator:
+    """Smoothed prompt-eval and generation speed (tokens/second) observed from Ollama"""
+
+    def __init__(self):
+        self.prompt_rate = None
+        self.eval_rate = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _smooth(current, observed):
+        return observed if current is None else (1 - RATE_SMOOTHING) * current + RATE_SMOOTHING * observed
+
+    def observe(self, stats):
+        """Update from the final chunk of a generation (prompt_eval_count/duration, eval_count/duration in ns)"""
+        with self._lock:
+            if stats.get('prompt_eval_count') and stats.get('prompt_eval_duration'):
+                self.prompt_rate = self._smooth(self.prompt_rate,
+                                                stats['prompt_eval_count'] / (stats['prompt_eval_duration'] / 1e9))
+            if stats.get('eval_count') and stats.get('eval_duration'):
+                self.eval_rate = self._smooth(self.eval_rate, stats['eval_count'] / (stats['eval_duration'] / 1e9))
+
+    def predict_budget(self, remaining, prompt_tokens, max_tokens):
+        """
+        Tokens that can still be generated in `remaining` seconds (at most max_tokens)
+        Unknown speed (no generation observed yet) keeps max_tokens; 0 means not worth starting.
+        """
+        if remaining is None or self.eval_rate is None:
+            return max_tokens
+        prompt_seconds = prompt_tokens / self.prompt_rate if self.prompt_rate else 0.0
+        budget = int((remaining - prompt_seconds) * self.eval_rate)
+        if budget < min(MIN_PREDICT_TOKENS, max_tokens):
+            return 0
+        return min(max_tokens, budget)
+
+    def to_dict(self):
+        return {
+            'prompt_tokens_per_sec': round(self.prompt_rate, 1) if self.prompt_rate else None,
+            'eval_tokens_per_sec': round(self.eval_rate, 1) if self.eval_rate else None
+        }
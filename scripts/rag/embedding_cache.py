@@ -0,0 +1,180 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Query Embedding Cache
+In-process LRU cache for query embeddings, keyed on normalized query text
+"""
+
+import os
+import atexit
+import pickle
+import threading
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime
+
+from process_query import normalize_query
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_NAMESPACE = "torch:all-MiniLM-L6-v2"
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings
+    Optionally persisted to disk so it survives process restarts
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, persist_path=None, namespace=DEFAULT_NAMESPACE):
+        """Initialize cache, loading persisted entries if available"""
+        self.max_size = max_size
+        self.persist_path = persist_path
+        self.namespace = namespace
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, query_text):
+        """Return cached embedding (1 x dim) for a query, or None"""
+        key = normalize_query(query_text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return embedding.copy()
+
+    def put(self, query_text, embedding):
+        """Store embedding for a query, evicting least recently used entries"""
+        key = normalize_query(query_text)
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(1, -1).copy()
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def encode(self, model, query_text):
+        """Drop-in for model.encode([query]) that consults the cache first"""
+        embedding = self.get(query_text)
+        if embedding is not None:
+            return embedding
+
+        embedding = model.encode([normalize_query(query_text)])
+        self.put(query_text, embedding)
+        return np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+
+    def clear(self):
+        """Drop all entries and reset metrics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Cache size and hit-rate metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def close(self):
+        """Persist now and drop the exit hook (cache replaced by a new configuration)"""
+        if self.persist_path:
+            self.save()
+            atexit.unregister(self.save)
+
+    def save(self):
+        """Persist entries to disk (atomic replace)"""
+        if not self.persist_path:
+            return False
+
+        try:
+            with self._lock:
+                payload = {
+                    'namespace': self.namespace,
+                    'entries': list(self._entries.items()),
+                    'saved_at': datetime.now().isoformat()
+                }
+            os.makedirs(os.path.dirname(os.path.abspath(self.persist_path)), exist_ok=True)
+            tmp_path = f"{self.persist_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(payload, f)
+            os.replace(tmp_path, self.persist_path)
+            return True
+        except Exception as e:
+            log_message(f"❌ Failed to save query embedding cache: {str(e)}", "ERROR")
+            return False
+
+    def load(self):
+        """Load persisted entries, ignoring files written for another model"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return False
+
+        try:
+            with open(self.persist_path, 'rb') as f:
+                payload = pickle.load(f)
+
+            if payload.get('namespace') != self.namespace:
+                log_message(f"⚠️  Query cache namespace mismatch, ignoring {self.persist_path}", "WARNING")
+                return False
+
+            with self._lock:
+                for key, embedding in payload.get('entries', [])[-self.max_size:]:
+                    self._entries[key] = embedding
+            log_message(f"✅ Query embedding cache loaded: {len(self._entries)} entries")
+            return True
+        except Exception as e:
+            log_message(f"⚠️  Failed to load query embedding cache: {str(e)}", "WARNING")
+            return False
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def configure_query_cache(max_size=DEFAULT_CACHE_SIZE, persist_path=None, namespace=DEFAULT_NAMESPACE):
+    """
+    Configure the process-wide query cache
+    Unchanged settings keep the existing cache; otherwise it is replaced, keeping entries of the same namespace.
+    """
+    global _query_cache
+    with _query_cache_lock:
+        previous = _query_cache
+        if previous is not None and (previous.max_size, previous.persist_path, previous.namespace) == (
+                max_size, persist_path, namespace):
+            return previous
+
+        _query_cache = QueryEmbeddingCache(max_size=max_size, persist_path=persist_path, namespace=namespace)
+        if previous is not None:
+            previous.close()
+            if previous.namespace == namespace:
+                with previous._lock:
+                    entries = list(previous._entries.items())
+                for key, embedding in entries[-max_size:]:
+                    _query_cache.put(key, embedding)
+    return _query_cache
+
+def get_query_cache():
+    """Process-wide query embedding cache"""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+        return _query_cache
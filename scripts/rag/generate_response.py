@@ -18,41 +18,112 @@ import os
 import json
 import time
 import argparse
+import threading
 from datetime import datetime
 
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+# Heavy dependencies (ollama, faiss, torch) are imported lazily on first use
 try:
-    import ollama
-    from retrieve_context import retrieve_context, setup_vector_db
-    print("✅ All required modules imported successfully")
+    from retrieve_context import retrieve_context, setup_vector_db, estimate_tokens, DB_DIR
+    from mmr import DEFAULT_MMR_LAMBDA
+    from embedding_cache import configure_query_cache, get_query_cache
+    from embedder_factory import lazy_import, preload_async, format_startup_profile, get_batched_embedder
+    from embedder_factory import get_vector_store, vector_store_key
+    from component_health import LazyComponent
+    from deadline import Deadline, DeadlineExceeded, TokenRateEstimator, DEFAULT_LLM_READ_TIMEOUT, READ_TIMEOUT_GRACE
+    from ollama_stream import OllamaGenerateStream
+    from admission import (get_admission_controller, ServerBusy,
+                           DEFAULT_CONCURRENCY, DEFAULT_MAX_QUEUE, DEFAULT_MAX_QUEUE_WAIT)
+    from process_query import normalize_query
+    from context_cache import ContextCache, Prefetcher, MIN_PREFETCH_CHARS
+    from context_cache import DEFAULT_TTL, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_BYTES
 except ImportError as e:
     print(f"❌ Import error: {e}")
     print("Please install required packages: pip3.8 install ollama sentence-transformers")
     sys.exit(1)
 
+# Characters of each passage shown in retrieval-only answers
+RETRIEVAL_ONLY_EXCERPT_CHARS = 600
+
 class RAGResponseGenerator:
     """
     RAG Response Generator integrating context retrieval with LLM generation
     """
     
-    def __init__(self, ollama_host="http://localhost:11434", model_name="mistral:7b"):
-        """Initialize RAG Response Generator"""
+    def __init__(self, ollama_host="http://localhost:11434", model_name="mistral:7b", compress_context=False,
+                 query_cache_size=None, query_cache_path=None, vector_db_mode="eager",
+                 embedding_batch_window_ms=None, embedding_max_batch_size=32, mmr_lambda=DEFAULT_MMR_LAMBDA,
+                 ollama_client=None, llm_read_timeout=DEFAULT_LLM_READ_TIMEOUT,
+                 llm_concurrency=DEFAULT_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE,
+                 max_queue_wait=DEFAULT_MAX_QUEUE_WAIT, context_cache_ttl=DEFAULT_TTL,
+                 context_cache_size=DEFAULT_MAX_ENTRIES, context_cache_bytes=DEFAULT_MAX_BYTES):
+        """
+        Initialize RAG Response Generator
+        
+        vector_db_mode:
+            "eager"      - load embedding model and index before returning (default)
+            "background" - start loading in a background thread, overlapping the Ollama check
+            "lazy"       - load on first dynamic retrieval (context-file runs never load it)
+        
+        embedding_batch_window_ms enables micro-batching of query embeddings across
+        concurrent generate_response calls (None = encode each query directly).
+        
+        mmr_lambda trades relevance against diversity when picking contexts (1.0 or None = similarity only).
+        
+        ollama_client replaces ollama.Client (e.g. stub_ollama.StubOllamaClient for offline benchmarks).
+        
+        Setup failures never exit the process: the Ollama client and the vector database are
+        LazyComponents retried with backoff on later requests. While the LLM is unavailable,
+        generate_response serves retrieval-only answers (ranked passages with citations).
+        
+        llm_read_timeout bounds how long Ollama may stay silent mid-generation (stalled model);
+        the overall per-request budget comes from the Deadline passed to generate_response.
+        
+        llm_concurrency, max_queue and max_queue_wait configure admission control for this Ollama
+        host (shared by all generators using it): excess requests queue by priority and are
+        shed with a "busy" result when they would wait longer than max_queue_wait.
+        
+        Retrieved contexts are cached for context_cache_ttl seconds (at most context_cache_size
+        entries / context_cache_bytes); prefetch() fills the cache while a query is being typed.
+        """
         self.ollama_host = ollama_host
         self.model_name = model_name
-        self.client = None
+        self.compress_context = compress_context
+        self.mmr_lambda = mmr_lambda
+        self.embedding_batch_window_ms = embedding_batch_window_ms
+        self.embedding_max_batch_size = embedding_max_batch_size
+        self.query_cache_size = query_cache_size
+        self.query_cache_path = query_cache_path
+        self.client = ollama_client
+        # Real Ollama hosts stream over our own abortable HTTP connection; injected clients stream themselves
+        self._http_generation = ollama_client is None
         self.vector_db = None
         self.model = None
+        self._reload_lock = threading.Lock()
+        self.started_at = time.time()
+        self.llm_read_timeout = llm_read_timeout
+        self.token_rate = TokenRateEstimator()
+        self.admission = get_admission_controller(ollama_host, llm_concurrency, max_queue, max_queue_wait)
+        self.context_cache = ContextCache(context_cache_ttl, context_cache_size, context_cache_bytes)
+        self.prefetcher = Prefetcher(self._prefetch_contexts)
+        self.llm = LazyComponent("Ollama LLM", self._setup_ollama_client)
+        self.retrieval = LazyComponent("Vector database", self._setup_vector_db)
         
         # Initialize components
-        self._setup_ollama_client()
-        self._setup_vector_db()
+        if vector_db_mode == "background":
+            preload_async(db_dir=DB_DIR)
+        self.llm.ensure()
+        if vector_db_mode in ("eager", "background"):
+            self.retrieval.ensure()
         
     def _setup_ollama_client(self):
-        """Setup Ollama client connection"""
+        """Setup Ollama client connection (raises on failure; called through self.llm)"""
         try:
-            self.client = ollama.Client(host=self.ollama_host)
+            if self.client is None:
+                ollama = lazy_import('ollama')
+                self.client = ollama.Client(host=self.ollama_host, timeout=self.llm_read_timeout)
             # Test connection
             models = self.client.list()
             print(f"✅ Ollama client connected to {self.ollama_host}")
@@ -71,7 +142,7 @@ class RAGResponseGenerator:
                 print("❌ Invalid response from Ollama server")
                 print(f"Response type: {type(models)}")
                 print(f"Response: {models}")
-                sys.exit(1)
+                raise RuntimeError(f"Invalid response from Ollama server: {type(models).__name__}")
             
             # Extract model names
             model_names = []
@@ -118,7 +189,7 @@ class RAGResponseGenerator:
                 for name in model_names:
                     print(f"  - {name}")
                 print(f"\nTo pull the model, run: ollama pull {self.model_name}")
-                sys.exit(1)
+                raise RuntimeError(f"Model {self.model_name} not found")
             
             print(f"✅ Model {self.model_name} ready")
             
@@ -126,16 +197,129 @@ class RAGResponseGenerator:
             print(f"❌ Failed to connect to Ollama: {e}")
             print("Make sure Ollama is running on localhost:11434")
             print("Check service status: systemctl status ollama")
-            sys.exit(1)
+            raise
     
     def _setup_vector_db(self):
-        """Setup vector database and embedding model"""
+        """Setup vector database and embedding model (raises on failure; called through self.retrieval)"""
         try:
             self.vector_db, self.model = setup_vector_db()
+            # Query embedding cache (process-wide, optionally persisted across restarts), namespaced by
+            # the embedder actually loaded so vectors of another backend or ONNX export are never reused
+            if self.query_cache_size or self.query_cache_path:
+                configure_query_cache(max_size=self.query_cache_size or 1024, persist_path=self.query_cache_path,
+                                      namespace=self.model.namespace)
+            if self.embedding_batch_window_ms:
+                self.model = get_batched_embedder(self.embedding_batch_window_ms, self.embedding_max_batch_size)
+                print(f"✅ Query embedding micro-batching: {self.embedding_batch_window_ms}ms window, "
+                      f"max {self.embedding_max_batch_size} per batch")
             print("✅ Vector database and embedding model loaded")
         except Exception as e:
             print(f"❌ Failed to setup vector DB: {e}")
-            sys.exit(1)
+            raise
+    
+    def health(self):
+        """
+        Liveness and readiness
+        live: the generator is up and answering; ready: LLM and vector database both usable;
+        degraded: answers are retrieval-only because the LLM is unavailable.
+        """
+        return {
+            "live": True,
+            "ready": self.llm.ready and self.retrieval.ready,
+            "degraded": not self.llm.ready,
+            "uptime": round(time.time() - self.started_at, 1),
+            "components": {
+                "llm": self.llm.status(),
+                "vector_db": self.retrieval.status()
+            },
+            "admission": self.admission.stats(),
+            "context_cache": self.context_cache.stats(),
+            "prefetch": self.prefetcher.stats()
+        }
+    
+    def _retrieve_contexts(self, query):
+        """
+        Retrieve contexts for a query, consulting the context cache first
+        Returns (contexts, cache_hit). Keys include the vector store build, so a reload never serves stale chunks.
+        """
+        vector_db = self.vector_db
+        settings = {
+            'top_k': 2,         # Reduced from 3 for faster generation
+            'max_tokens': 600,  # Reduced from 2000 for faster LLM generation
+            'compress': self.compress_context,
+            'mmr_lambda': self.mmr_lambda
+        }
+        key = self.context_cache.make_key(query, getattr(vector_db, 'key', None), settings)
+        context_data = self.context_cache.get(key)
+        if context_data is not None:
+            return context_data, True
+        
+        context_data = retrieve_context(query, vector_db, self.model, **settings)
+        self.context_cache.put(key, context_data)
+        return context_data, False
+    
+    def _prefetch_contexts(self, query):
+        """Prefetcher callback: load the vector DB if needed, then retrieve into the caches"""
+        if self.retrieval.ensure():
+            self._retrieve_contexts(query)
+    
+    def prefetch(self, partial_query, wait=False):
+        """
+        Speculative retrieval for a query still being typed
+        Warms the query embedding cache and the context cache so that submitting the same text
+        skips retrieval. Runs in the background (latest text wins) unless wait=True.
+        """
+        if len(normalize_query(partial_query)) < MIN_PREFETCH_CHARS:
+            return {"prefetched": False, "reason": f"query shorter than {MIN_PREFETCH_CHARS} characters"}
+        if self.retrieval.state == "failed":
+            return {"prefetched": False, "reason": f"vector database unavailable: {self.retrieval.last_error}"}
+        if not wait:
+            self.prefetcher.submit(partial_query)
+            return {"prefetched": True, "queued": True}
+        
+        if not self.retrieval.ensure():
+            return {"prefetched": False, "reason": f"vector database unavailable: {self.retrieval.last_error}"}
+        _, cache_hit = self._retrieve_contexts(partial_query)
+        return {"prefetched": True, "queued": False, "cached": cache_hit}
+    
+    def refresh_vector_db(self, report=None, background=False):
+        """
+        Swap in a newly published snapshot without restarting (cheap check, no-op if unchanged)
+        Index and chunks are loaded together off to the side and swapped in one assignment,
+        so in-flight queries keep the store they started with. With background=True the load
+        runs in a thread and queries keep using the current store until it finishes.
+        Usable as a CorpusWatcher on_sync callback.
+        """
+        if self.vector_db is None:
+            return False
+        try:
+            if vector_store_key(DB_DIR) == self.vector_db.key:
+                return False
+        except Exception as e:
+            print(f"⚠️  Vector database check failed, keeping current index: {e}")
+            return False
+
+        if not self._reload_lock.acquire(blocking=not background):
+            return False  # Reload already in progress
+        if background:
+            threading.Thread(target=self._reload_vector_db, name="vector-db-reload", daemon=True).start()
+            return True
+        return self._reload_vector_db()
+
+    def _reload_vector_db(self):
+        """Load the current snapshot and swap it in (called with _reload_lock held)"""
+        try:
+            vector_db = get_vector_store(DB_DIR)
+            if vector_db is self.vector_db:
+                return False
+            self.vector_db = vector_db
+            print(f"🔄 Vector database reloaded: {vector_db.ntotal} vectors (snapshot {vector_db.version})")
+            return True
+        except Exception as e:
+            print(f"⚠️  Vector database reload failed, keeping current index: {e}")
+            return False
+        finally:
+            self._reload_lock.release()
     
     def _detect_language(self, text):
         """Simple language detection for Vietnamese vs English"""
@@ -173,6 +357,11 @@ class RAGResponseGenerator:
                     source_info += f" - {ctx['metadata']['title']}"
                 if 'section' in ctx['metadata']:
                     source_info += f" (Section: {ctx['metadata']['section']})"
+                # Near-duplicate chunks dropped before embedding still get cited
+                alias_sources = sorted({alias['source_file'] for alias in ctx['metadata'].get('aliases', [])
+                                        if alias.get('source_file') and alias['source_file'] != ctx.get('source')})
+                if alias_sources:
+                    source_info += f" (also in: {', '.join(alias_sources)})"
             
             formatted_context += f"\n--- {source_info} ---\n"
             formatted_context += ctx['content']
@@ -216,7 +405,7 @@ ANSWER:"""
 
         return prompt_template, sources
     
-    def generate_response(self, query, max_tokens=1000, temperature=0.3):
+    def generate_response(self, query, max_tokens=1000, temperature=0.3, deadline=None, priority="interactive"):
         """
         Generate complete RAG response: Query → Context → LLM Response
         
@@ -224,11 +413,16 @@ ANSWER:"""
             query: User's question
             max_tokens: Maximum tokens for LLM response
             temperature: LLM temperature for creativity control
+            deadline: Deadline shared by all stages (None = no time limit)
+            priority: "interactive" (user waiting) or "batch" (evaluation runs), for admission control
             
         Returns:
             dict with response, sources, timing, and metadata
+            (partial=True when generation was cut short by the deadline or cancellation,
+            busy=True when admission control shed the request)
         """
         
+        deadline = deadline or Deadline(timeout=None)
         start_time = time.time()
         print(f"\n🔍 Processing query: {query}")
         
@@ -237,18 +431,37 @@ ANSWER:"""
         context_retrieval_start = time.time()
         
         try:
-            context_data = retrieve_context(
-                query, 
-                self.vector_db, 
-                self.model, 
-                top_k=2,         # Reduced from 3 for faster generation
-                max_tokens=600   # Reduced from 2000 for faster LLM generation
-            )
+            deadline.check("context retrieval")
+        except DeadlineExceeded as e:
+            return self._deadline_result(query, e)
+        
+        if not self.retrieval.ready:
+            if not self.retrieval.ensure():
+                print(f"❌ Vector database unavailable: {self.retrieval.last_error}")
+                return {
+                    "success": False,
+                    "error": f"Vector database unavailable: {self.retrieval.last_error}",
+                    "query": query,
+                    "health": self.health(),
+                    "timestamp": datetime.now().isoformat()
+                }
+        else:
+            # Never block a live query on loading a rebuilt index
+            self.refresh_vector_db(background=True)
+        
+        try:
+            context_data, context_cache_hit = self._retrieve_contexts(query)
             
             context_retrieval_time = time.time() - context_retrieval_start
-            print(f"✅ Context retrieved in {context_retrieval_time:.3f}s")
+            print(f"✅ Context retrieved in {context_retrieval_time:.3f}s"
+                  f"{' (cached/prefetched)' if context_cache_hit else ''}")
             print(f"📄 Found {len(context_data)} relevant documents")
             
+            compression = context_data[0].get('metadata', {}).get('compression') if context_data else None
+            if compression:
+                print(f"🗜️  Context compressed: {compression['original_tokens']} → "
+                      f"{compression['compressed_tokens']} tokens (ratio {compression['compression_ratio']:.3f})")
+            
         except Exception as e:
             print(f"❌ Context retrieval failed: {e}")
             return {
@@ -274,65 +487,277 @@ ANSWER:"""
             }
         
         # Step 3: Generate response using Mistral 7B via Ollama
-        print("🤖 Generating response with Mistral 7B...")
-        llm_start_time = time.time()
+        generation, result = self._generate_answer(query, prompt, sources, context_data, start_time,
+                                                   context_retrieval_time, max_tokens, temperature, deadline, priority)
+        if result is not None:
+            return result
+        text, stop_reason, num_predict = generation['text'], generation['stop_reason'], generation['num_predict']
+        total_time = time.time() - start_time
+        print(f"⏱️  Total processing time: {total_time:.3f}s")
         
+        # Format final response
+        result = {
+            "success": True,
+            "partial": generation['partial'],
+            "stop_reason": stop_reason,
+            "query": query,
+            "response": text.strip(),
+            "sources": sources,
+            "context_count": len(context_data),
+            "timing": {
+                "context_retrieval": context_retrieval_time,
+                "llm_queue": generation['queue_time'],
+                "llm_generation": generation['llm_time'],
+                "total": total_time
+            },
+            "metadata": {
+                "model": self.model_name,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "language": self._detect_language(query),
+                "prompt_length": len(prompt),
+                "response_length": len(text),
+                "num_predict": num_predict,
+                "deadline": deadline.to_dict(),
+                "token_rate": self.token_rate.to_dict(),
+                "priority": priority,
+                "context_compression": compression,
+                "query_cache": get_query_cache().stats(),
+                "context_cache_hit": context_cache_hit,
+                "context_cache": self.context_cache.stats(),
+                "embedding_batching": self.model.stats() if hasattr(self.model, 'stats') else None
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        return result
+    
+    def _generate_answer(self, query, prompt, sources, context_data, start_time, context_retrieval_time,
+                         max_tokens, temperature, deadline, priority):
+        """
+        LLM step shared by generate_response and generate_from_context_file
+        Waits for an admission slot, sizes num_predict to the remaining budget (skipping generation
+        when nothing fits) and streams the answer.
+        Returns (generation, None) with text, stop_reason, partial, num_predict, queue_time and llm_time,
+        or (None, result) with a finished busy or retrieval-only result.
+        """
+        if not self.llm.ensure():
+            return None, self._retrieval_only_result(query, context_data, sources, start_time, context_retrieval_time,
+                                                     max_tokens, temperature, self.llm.last_error)
+        
+        # Wait for a generation slot (bounded priority queue per Ollama host)
         try:
-            response = self.client.generate(
-                model=self.model_name,
-                prompt=prompt,
-                options={
-                    "num_predict": max_tokens,
-                    "temperature": temperature,
-                    "top_k": 40,
-                    "top_p": 0.9,
-                    "stop": ["Human:", "User:", "Question:", "CÂU HỎI:"]
-                }
-            )
-            
-            llm_time = time.time() - llm_start_time
-            total_time = time.time() - start_time
-            
-            print(f"✅ Response generated in {llm_time:.3f}s")
-            print(f"⏱️  Total processing time: {total_time:.3f}s")
-            
-            # Format final response
-            result = {
-                "success": True,
-                "query": query,
-                "response": response['response'].strip(),
-                "sources": sources,
-                "context_count": len(context_data),
-                "timing": {
-                    "context_retrieval": context_retrieval_time,
-                    "llm_generation": llm_time,
-                    "total": total_time
-                },
-                "metadata": {
-                    "model": self.model_name,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens,
-                    "language": self._detect_language(query),
-                    "prompt_length": len(prompt),
-                    "response_length": len(response['response'])
-                },
-                "timestamp": datetime.now().isoformat()
-            }
+            slot = self.admission.slot(priority, deadline)
+        except ServerBusy as e:
+            return None, self._busy_result(query, e)
+        
+        with slot:
+            # Only ask for what fits in the remaining budget
+            num_predict = self.token_rate.predict_budget(deadline.remaining(), estimate_tokens(prompt), max_tokens)
+            if num_predict == 0 or deadline.expired():
+                slot.skip()
+                stop_reason = "cancelled" if deadline.cancelled else "deadline"
+                print(f"⏰ No time left for generation ({stop_reason})")
+                result = self._retrieval_only_result(query, context_data, sources, start_time, context_retrieval_time,
+                                                     max_tokens, temperature, f"Generation skipped: {stop_reason}")
+                result.update(partial=True, stop_reason=stop_reason)
+                return None, result
             
-            return result
+            if slot.waited > 0:
+                print(f"🚦 Waited {slot.waited:.3f}s for a generation slot")
+            print("🤖 Generating response with Mistral 7B...")
+            llm_start_time = time.time()
             
+            try:
+                text, stop_reason = self._stream_generate(prompt, num_predict, temperature, deadline)
+            except Exception as e:
+                # Only failures of the LLM call itself put the LLM into backoff
+                slot.skip()
+                print(f"❌ LLM generation failed: {e}")
+                self.llm.mark_failed(e)
+                return None, self._retrieval_only_result(query, context_data, sources, start_time,
+                                                         context_retrieval_time, max_tokens, temperature,
+                                                         f"LLM generation failed: {e}")
+        
+        if not text.strip() and stop_reason in ("deadline", "cancelled"):
+            # Hung up before the first token: the passages are still worth returning
+            result = self._retrieval_only_result(query, context_data, sources, start_time, context_retrieval_time,
+                                                 max_tokens, temperature, f"Generation stopped: {stop_reason}")
+            result.update(partial=True, stop_reason=stop_reason)
+            return None, result
+        
+        partial = stop_reason in ("deadline", "cancelled", "error") or (
+            stop_reason == "length" and num_predict < max_tokens)
+        if partial:
+            print(f"✂️  Partial answer ({stop_reason}, {len(text)} chars)")
+        
+        llm_time = time.time() - llm_start_time
+        print(f"✅ Response generated in {llm_time:.3f}s")
+        return {
+            "text": text,
+            "stop_reason": stop_reason,
+            "partial": partial,
+            "num_predict": num_predict,
+            "queue_time": slot.waited,
+            "llm_time": llm_time
+        }, None
+    
+    def _open_generation(self, prompt, num_predict, temperature, deadline):
+        """
+        Start a streaming generation that close() can abort from another thread
+        Against a real Ollama host this is an OllamaGenerateStream; socket timeouts trail the
+        deadline by READ_TIMEOUT_GRACE so the watchdog, not a read timeout, ends over-budget requests.
+        """
+        options = {
+            "num_predict": num_predict,
+            "temperature": temperature,
+            "top_k": 40,
+            "top_p": 0.9,
+            "stop": ["Human:", "User:", "Question:", "CÂU HỎI:"]
+        }
+        if not self._http_generation:
+            return self.client.generate(model=self.model_name, prompt=prompt, options=options, stream=True)
+        
+        remaining = deadline.remaining()
+        # The first token waits for prompt evaluation: only the deadline bounds it
+        first_read_timeout = remaining + READ_TIMEOUT_GRACE if remaining is not None else self.llm_read_timeout
+        read_timeout = self.llm_read_timeout
+        if remaining is not None:
+            read_timeout = min(read_timeout, remaining + READ_TIMEOUT_GRACE)
+        return OllamaGenerateStream(self.ollama_host, {"model": self.model_name, "prompt": prompt, "options": options},
+                                    first_read_timeout, read_timeout)
+    
+    def _stream_generate(self, prompt, num_predict, temperature, deadline):
+        """
+        Stream tokens from Ollama until done, deadline or cancellation
+        Returns (text, stop_reason): Ollama's done_reason ("stop"/"length"), "deadline", "cancelled"
+        (text may be empty), or "error" when the stream broke after some text arrived.
+        A watchdog closes the stream the moment the deadline passes or the request is cancelled,
+        even before the first token; Ollama then aborts the generation and frees its slot.
+        Failures caused by that hang-up do not mark the LLM as failed.
+        """
+        requested_at = time.time()
+        stream = self._open_generation(prompt, num_predict, temperature, deadline)
+        watchdog = deadline.on_expire(stream.close)
+        
+        parts = []
+        stop_reason = None
+        first_token_at = None
+        try:
+            for chunk in stream:
+                parts.append(chunk['response'])
+                if chunk['done']:
+                    stop_reason = chunk.get('done_reason') or "stop"
+                    self.token_rate.observe(chunk)
+                    break
+                if first_token_at is None:
+                    first_token_at = time.time()
+                if deadline.expired():
+                    break
         except Exception as e:
-            print(f"❌ LLM generation failed: {e}")
-            return {
-                "success": False,
-                "error": f"LLM generation failed: {e}",
-                "query": query,
-                "context_count": len(context_data) if 'context_data' in locals() else 0,
-                "sources": sources if 'sources' in locals() else [],
-                "timestamp": datetime.now().isoformat()
-            }
+            if not deadline.expired():
+                if not parts:
+                    raise
+                # Keep what was generated; the LLM is retried on the next request
+                print(f"❌ Generation stream broke: {e}")
+                self.llm.mark_failed(e)
+                stop_reason = "error"
+        finally:
+            watchdog.disarm()
+            stream.close()
+        
+        if stop_reason is None:
+            if not deadline.expired():
+                # Connection ended without a final chunk
+                error = RuntimeError("Ollama closed the generation stream before it was done")
+                if not parts:
+                    raise error
+                print(f"❌ Generation stream broke: {error}")
+                self.llm.mark_failed(error)
+                return "".join(parts), "error"
+            stop_reason = "cancelled" if deadline.cancelled else "deadline"
+            # No final stats when we hang up; learn the generation speed from what streamed so far
+            if len(parts) > 1:
+                self.token_rate.observe({
+                    'prompt_eval_count': estimate_tokens(prompt),
+                    'prompt_eval_duration': (first_token_at - requested_at) * 1e9,
+                    'eval_count': len(parts) - 1,
+                    'eval_duration': (time.time() - first_token_at) * 1e9
+                })
+        
+        return "".join(parts), stop_reason
+    
+    def _busy_result(self, query, error):
+        """Fast rejection when the generation queue is full or too slow"""
+        print(f"🚦 {error}")
+        return {
+            "success": False,
+            "busy": True,
+            "error": str(error),
+            "retry_after": error.retry_after,
+            "query": query,
+            "admission": self.admission.stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def _deadline_result(self, query, error):
+        """Request ran out of budget (or was cancelled) before an answer could be produced"""
+        print(f"⏰ {error}")
+        return {
+            "success": False,
+            "error": str(error),
+            "stop_reason": "cancelled" if error.cancelled else "deadline",
+            "query": query,
+            "timestamp": datetime.now().isoformat()
+        }
     
-    def generate_from_context_file(self, query, context_file_path, max_tokens=1000, temperature=0.3):
+    def _retrieval_only_answer(self, query, context_data, sources):
+        """Ranked passages with their citations, in the query's language"""
+        if self._detect_language(query) == "vietnamese":
+            parts = ["Mô hình ngôn ngữ tạm thời không khả dụng. Các đoạn tài liệu liên quan nhất:"]
+        else:
+            parts = ["The language model is temporarily unavailable. Most relevant passages:"]
+        
+        for source_info, ctx in zip(sources, context_data):
+            content = ctx.get('content', '').strip()
+            if len(content) > RETRIEVAL_ONLY_EXCERPT_CHARS:
+                content = content[:RETRIEVAL_ONLY_EXCERPT_CHARS].rstrip() + "..."
+            parts.append(f"[{source_info}]\n{content}")
+        return "\n\n".join(parts)
+    
+    def _retrieval_only_result(self, query, context_data, sources, start_time, context_retrieval_time,
+                               max_tokens, temperature, llm_error):
+        """Successful but degraded result: retrieved passages instead of an LLM answer"""
+        print(f"⚠️  Serving retrieval-only answer ({llm_error})")
+        response = self._retrieval_only_answer(query, context_data, sources)
+        timing = {"llm_generation": 0.0, "total": time.time() - start_time}
+        if context_retrieval_time is not None:
+            timing["context_retrieval"] = context_retrieval_time
+        
+        return {
+            "success": True,
+            "degraded": True,
+            "mode": "retrieval_only",
+            "query": query,
+            "response": response,
+            "sources": sources,
+            "context_count": len(context_data),
+            "timing": timing,
+            "metadata": {
+                "model": None,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "language": self._detect_language(query),
+                "prompt_length": 0,
+                "response_length": len(response),
+                "llm_error": llm_error,
+                "llm_retry_in": self.llm.status()["retry_in"]
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def generate_from_context_file(self, query, context_file_path, max_tokens=1000, temperature=0.3, deadline=None,
+                                   priority="interactive"):
         """
         Generate response using pre-saved context file
         
@@ -341,6 +766,8 @@ ANSWER:"""
             context_file_path: Path to JSON file with context data
             max_tokens: Maximum tokens for LLM response
             temperature: LLM temperature
+            deadline: Deadline for generation (None = no time limit)
+            priority: "interactive" or "batch", for admission control
         """
         
         try:
@@ -364,36 +791,35 @@ ANSWER:"""
         
         try:
             prompt, sources = self._create_rag_prompt(query, context_data)
-            
-            response = self.client.generate(
-                model=self.model_name,
-                prompt=prompt,
-                options={
-                    "num_predict": max_tokens,
-                    "temperature": temperature,
-                    "top_k": 40,
-                    "top_p": 0.9,
-                    "stop": ["Human:", "User:", "Question:", "CÂU HỎI:"]
-                }
-            )
+            generation, result = self._generate_answer(query, prompt, sources, context_data, start_time, None,
+                                                       max_tokens, temperature, deadline or Deadline(timeout=None),
+                                                       priority)
+            if result is not None:
+                return result
             
             total_time = time.time() - start_time
             
             result = {
                 "success": True,
+                "partial": generation['partial'],
+                "stop_reason": generation['stop_reason'],
                 "query": query,
-                "response": response['response'].strip(),
+                "response": generation['text'].strip(),
                 "sources": sources,
                 "context_count": len(context_data),
                 "context_file": context_file_path,
                 "timing": {
+                    "llm_queue": generation['queue_time'],
+                    "llm_generation": generation['llm_time'],
                     "total": total_time
                 },
                 "metadata": {
                     "model": self.model_name,
                     "temperature": temperature,
                     "max_tokens": max_tokens,
-                    "language": self._detect_language(query)
+                    "language": self._detect_language(query),
+                    "num_predict": generation['num_predict'],
+                    "token_rate": self.token_rate.to_dict()
                 },
                 "timestamp": datetime.now().isoformat()
             }
@@ -430,6 +856,10 @@ def display_response(result):
     print("🤖 RAG RESPONSE GENERATION RESULT")
     print("="*80)
     
+    if result.get("busy"):
+        print(f"🚦 BUSY: {result['error']} - retry after {result['retry_after']}s")
+        return
+    
     if not result["success"]:
         print(f"❌ FAILED: {result.get('error', 'Unknown error')}")
         return
@@ -443,6 +873,11 @@ def display_response(result):
     for i, source in enumerate(result['sources'], 1):
         print(f"  {i}. {source}")
     
+    if result.get('degraded'):
+        print(f"\n⚠️  DEGRADED: retrieval-only answer ({result['metadata'].get('llm_error')})")
+    elif result.get('partial'):
+        print(f"\n✂️  PARTIAL ANSWER: generation stopped ({result['stop_reason']})")
+    
     print(f"\n🎯 RESPONSE:")
     print("-" * 80)
     print(result['response'])
@@ -458,8 +893,10 @@ def display_response(result):
     print(f"  - Model: {result['metadata']['model']}")
     print(f"  - Language: {result['metadata']['language']}")
     print(f"  - Temperature: {result['metadata']['temperature']}")
-    print(f"  - Prompt Length: {result['metadata']['prompt_length']} chars")
-    print(f"  - Response Length: {result['metadata']['response_length']} chars")
+    print(f"  - Prompt Length: {result['metadata'].get('prompt_length', 0)} chars")
+    print(f"  - Response Length: {result['metadata'].get('response_length', len(result['response']))} chars")
+    if result['metadata'].get('context_compression'):
+        print(f"  - Context Compression: {result['metadata']['context_compression']['compression_ratio']:.3f}")
 
 def main():
     """Main function with command line interface"""
@@ -471,6 +908,10 @@ def main():
     parser.add_argument("--max-tokens", type=int, default=200, help="Maximum response tokens (reduced for speed)")
     parser.add_argument("--temperature", type=float, default=0.3, help="LLM temperature")
     parser.add_argument("--host", default="http://localhost:11434", help="Ollama host")
+    parser.add_argument("--compress-context", action="store_true", help="Keep only query-relevant sentences of retrieved chunks")
+    parser.add_argument("--mmr-lambda", type=float, default=DEFAULT_MMR_LAMBDA,
+                        help="MMR relevance/diversity trade-off for context selection (1.0 = relevance only)")
+    parser.add_argument("--profile-startup", action="store_true", help="Print import/load time breakdown")
     
     args = parser.parse_args()
     
@@ -485,7 +926,11 @@ def main():
     try:
         generator = RAGResponseGenerator(
             ollama_host=args.host,
-            model_name=args.model
+            model_name=args.model,
+            compress_context=args.compress_context,
+            mmr_lambda=args.mmr_lambda,
+            # Context-file runs never touch the vector DB; dynamic runs overlap loading with the Ollama check
+            vector_db_mode="lazy" if args.context_file else "background"
         )
     except Exception as e:
         print(f"❌ Failed to initialize generator: {e}")
@@ -511,6 +956,10 @@ def main():
     # Display and save results
     display_response(result)
     
+    if args.profile_startup:
+        print()
+        print(format_startup_profile())
+    
     if args.output or result["success"]:
         output_file = save_response(result, args.output)
         if output_file and result["success"]:
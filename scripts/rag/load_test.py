@@ -0,0 +1,475 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Performance: End-to-end load generator and latency SLO benchmark
+Replays a query corpus against RAGPipeline at a fixed arrival rate (open loop) or with a
+fixed number of concurrent clients (closed loop) and reports throughput, per-stage latency
+percentiles, error rate and saturation.
+
+The LLM is a deterministic in-process stub (stub_ollama.py), the same stub behind the mock
+Ollama HTTP server (--mock-server, exercises ollama.Client too), or a real Ollama (--ollama-host).
+Stub runs are reproducible and can be compared against a stored baseline.
+
+Usage:
+    python3.8 load_test.py --rate 2 --duration 60
+    python3.8 load_test.py --concurrency 4 --requests 200 --save-baseline /opt/rag-copilot/output/load_baseline.json
+    python3.8 load_test.py --rate 2 --duration 60 --baseline /opt/rag-copilot/output/load_baseline.json
+    python3.8 load_test.py --concurrency 4 --requests 100 --mock-server --token-ms 10
+    python3.8 load_test.py --concurrency 2 --requests 20 --ollama-host http://localhost:11434
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from stub_ollama import (StubOllamaClient, LatencyModel, DEFAULT_PROMPT_TOKEN_MS, DEFAULT_TOKEN_MS,
+                         DEFAULT_RESPONSE_TOKENS)
+
+DEFAULT_QUERIES = [
+    "AI tools for developers",
+    "ChatGPT có những tính năng gì?",
+    "NotebookLM research assistant",
+    "Quy trình nghỉ phép của công ty như thế nào?",
+    "What is the expense reimbursement process?",
+    "Hướng dẫn sử dụng AI Starter Kit"
+]
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Epic target: answer within 15 seconds
+DEFAULT_SLO_P95 = 15.0
+
+# Open loop is saturated when completions fall behind arrivals by more than this
+SATURATION_RATIO = 0.95
+
+# Baseline comparison ignores latency differences below this (seconds)
+MIN_REGRESSION_SECONDS = 0.005
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def load_queries(path=None):
+    """Query corpus: JSON list (strings or {"query": ...}) or one query per line"""
+    if not path:
+        return list(DEFAULT_QUERIES)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            items = json.load(f)
+            queries = [item['query'] if isinstance(item, dict) else item for item in items]
+        else:
+            queries = [line.strip() for line in f]
+    queries = [q for q in queries if q]
+    if not queries:
+        raise ValueError(f"No queries in {path}")
+    return queries
+
+def stage_timings(result):
+    """Per-stage seconds reported by the pipeline (overhead = pipeline minus retrieval and LLM)"""
+    timing = result.get('timing', {})
+    stages = {}
+    if 'context_retrieval' in timing:
+        stages['retrieval'] = timing['context_retrieval']
+    if 'llm_queue' in timing:
+        stages['llm_queue'] = timing['llm_queue']
+    if 'llm_generation' in timing:
+        stages['llm'] = timing['llm_generation']
+    pipeline_time = result.get('pipeline_metadata', {}).get('pipeline_time')
+    if pipeline_time is not None:
+        stages['pipeline'] = pipeline_time
+        stages['overhead'] = max(0.0, pipeline_time - stages.get('retrieval', 0.0) - stages.get('llm_queue', 0.0)
+                                 - stages.get('llm', 0.0))
+    return stages
+
+class InFlight:
+    """Concurrent request counter with peak"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+def execute(handler, query, scheduled, in_flight):
+    """Run one request; latency is measured from its scheduled arrival, so queueing counts"""
+    started = time.time()
+    with in_flight:
+        try:
+            result = handler(query)
+            error = None if result.get('success') else (result.get('error') or 'unknown error')
+        except Exception as e:
+            result, error = {}, f"{type(e).__name__}: {e}"
+    finished = time.time()
+
+    return {
+        'query': query,
+        'scheduled': scheduled,
+        'started': started,
+        'finished': finished,
+        'success': error is None,
+        'error': error,
+        'degraded': bool(result.get('degraded')),
+        'partial': bool(result.get('partial')),
+        'shed': bool(result.get('busy')),
+        'stages': dict(stage_timings(result), queue=started - scheduled, latency=finished - scheduled)
+    }
+
+def run_open_loop(handler, queries, rate, duration=None, requests=None, max_in_flight=64):
+    """
+    Fixed arrival rate, independent of how fast requests complete
+    Arrivals beyond max_in_flight wait in the executor queue (shows up as queue time).
+    """
+    total = requests or max(1, int(round(rate * duration)))
+    in_flight = InFlight()
+    start = time.time()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="load") as pool:
+        futures = []
+        for i in range(total):
+            scheduled = start + i / rate
+            delay = scheduled - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(execute, handler, queries[i % len(queries)], scheduled, in_flight))
+        records = [f.result() for f in futures]
+
+    return records, time.time() - start, in_flight.peak
+
+def run_closed_loop(handler, queries, concurrency, duration=None, requests=None):
+    """Fixed number of clients, each sending its next request as soon as the previous one completes"""
+    in_flight = InFlight()
+    records = []
+    lock = threading.Lock()
+    counter = [0]
+    start = time.time()
+    deadline = start + duration if duration else None
+
+    def client():
+        while True:
+            with lock:
+                i = counter[0]
+                if (requests and i >= requests) or (deadline and time.time() >= deadline):
+                    return
+                counter[0] += 1
+            record = execute(handler, queries[i % len(queries)], time.time(), in_flight)
+            with lock:
+                records.append(record)
+
+    threads = [threading.Thread(target=client, name=f"load-{n}", daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return records, time.time() - start, in_flight.peak
+
+def percentile_summary(values):
+    """count/mean/max plus p50-p99 (seconds)"""
+    if not values:
+        return {'count': 0}
+    values = np.asarray(values, dtype=np.float64)
+    summary = {'count': int(len(values)), 'mean': round(float(values.mean()), 4)}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = round(float(value), 4)
+    summary['max'] = round(float(values.max()), 4)
+    return summary
+
+def summarize(records, elapsed, peak_in_flight, mode, offered_rate=None, slo_p95=DEFAULT_SLO_P95):
+    """Throughput, latency percentiles per stage, errors, shedding, saturation and SLO check"""
+    successes = [r for r in records if r['success']]
+    # Requests shed by admission control got a fast "busy" answer; latency/SLO cover served requests
+    served = [r for r in records if not r['shed']]
+    shed = len(records) - len(served)
+    # Retrieval-only answers succeed but skip the LLM; keep them out of stage latencies
+    full = [r for r in successes if not r['degraded']]
+    last_finish = max((r['finished'] for r in records), default=0.0)
+    first_arrival = min((r['scheduled'] for r in records), default=0.0)
+    span = max(last_finish - first_arrival, 1e-9)
+
+    stages = {}
+    for name in ('latency', 'queue', 'retrieval', 'llm_queue', 'llm', 'overhead', 'pipeline'):
+        # Queue/latency cover every served request; pipeline stages only successful ones
+        source = served if name in ('latency', 'queue') else full
+        values = [r['stages'][name] for r in source if name in r['stages']]
+        if values:
+            stages[name] = percentile_summary(values)
+
+    achieved_rate = len(records) / span
+    saturation = {
+        'offered_rate': offered_rate,
+        'achieved_rate': round(achieved_rate, 4),
+        'peak_in_flight': peak_in_flight,
+        # Little's law: average requests in the system
+        'mean_in_flight': round(sum(r['finished'] - r['scheduled'] for r in records) / span, 3),
+        'saturated': bool(offered_rate and achieved_rate < SATURATION_RATIO * offered_rate)
+    }
+
+    latency_p95 = stages.get('latency', {}).get('p95')
+    report = {
+        'mode': mode,
+        'requests': len(records),
+        'successes': len(successes),
+        'errors': len(served) - len(successes),
+        'error_rate': round((len(served) - len(successes)) / len(records), 4) if records else 0.0,
+        'shed': shed,
+        'shed_rate': round(shed / len(records), 4) if records else 0.0,
+        'degraded': len(successes) - len(full),
+        'degraded_rate': round((len(successes) - len(full)) / len(records), 4) if records else 0.0,
+        'partial': sum(1 for r in records if r['partial']),
+        'top_errors': Counter(r['error'] for r in served if r['error']).most_common(5),
+        'elapsed': round(elapsed, 3),
+        'throughput': round(len(successes) / span, 4),
+        'stages': stages,
+        'saturation': saturation,
+        'slo': {
+            'p95_target': slo_p95,
+            'p95': latency_p95,
+            'met': latency_p95 is not None and latency_p95 <= slo_p95 and len(full) == len(served)
+        }
+    }
+    return report
+
+def compare_to_baseline(report, baseline, tolerance=0.10):
+    """Regressions/improvements beyond tolerance: stage p50/p95/p99, throughput, error, shed and degraded rate"""
+    regressions = []
+    improvements = []
+
+    for stage, current in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous:
+            continue
+        for key in ('p50', 'p95', 'p99'):
+            if key not in current or key not in previous:
+                continue
+            delta = current[key] - previous[key]
+            change = f"{stage} {key}: {previous[key]:.3f}s → {current[key]:.3f}s"
+            if delta > MIN_REGRESSION_SECONDS and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(change)
+            elif -delta > MIN_REGRESSION_SECONDS and current[key] < previous[key] * (1 - tolerance):
+                improvements.append(change)
+
+    previous_throughput = baseline.get('throughput')
+    if previous_throughput:
+        change = f"throughput: {previous_throughput:.3f} → {report['throughput']:.3f} req/s"
+        if report['throughput'] < previous_throughput * (1 - tolerance):
+            regressions.append(change)
+        elif report['throughput'] > previous_throughput * (1 + tolerance):
+            improvements.append(change)
+
+    previous_errors = baseline.get('error_rate', 0.0)
+    if report['error_rate'] > previous_errors + 0.01:
+        regressions.append(f"error_rate: {previous_errors:.2%} → {report['error_rate']:.2%}")
+    previous_shed = baseline.get('shed_rate', 0.0)
+    if report['shed_rate'] > previous_shed + 0.01:
+        regressions.append(f"shed_rate: {previous_shed:.2%} → {report['shed_rate']:.2%}")
+    previous_degraded = baseline.get('degraded_rate', 0.0)
+    if report['degraded_rate'] > previous_degraded + 0.01:
+        regressions.append(f"degraded_rate: {previous_degraded:.2%} → {report['degraded_rate']:.2%}")
+
+    return {'tolerance': tolerance, 'regressions': regressions, 'improvements': improvements}
+
+def build_pipeline(args):
+    """RAGPipeline with the stub LLM (or a real Ollama host) and the vector DB loaded up front"""
+    from rag_pipeline import RAGPipeline
+
+    config = None
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    client = None
+    server = None
+    if not args.ollama_host:
+        client = StubOllamaClient(
+            latency=LatencyModel(args.prompt_token_ms, args.token_ms, jitter=args.jitter),
+            response_tokens=args.response_tokens,
+            parallel=args.llm_parallel,
+            failure_rate=0.0 if args.mock_server else args.failure_rate,
+            seed=args.seed
+        )
+    if args.mock_server:
+        from mock_ollama_server import MockOllamaServer, FailureInjector
+        server = MockOllamaServer(port=0, client=client,
+                                  injector=FailureInjector(error_rate=args.failure_rate, stall_rate=args.stall_rate,
+                                                           stall_seconds=args.stall_seconds, seed=args.seed)).start()
+        args.ollama_host = server.url
+
+    pipeline = RAGPipeline(config, ollama_client=None if server else client)
+    if args.ollama_host:
+        pipeline.config["ollama_host"] = args.ollama_host
+    # Loading the index is startup cost, not request latency
+    pipeline.config["vector_db_mode"] = "eager"
+    if args.request_timeout:
+        pipeline.config["request_timeout"] = args.request_timeout
+    if args.llm_concurrency:
+        pipeline.config["llm_concurrency"] = args.llm_concurrency
+    if args.max_queue_wait is not None:
+        pipeline.config["max_queue_wait"] = args.max_queue_wait
+    return pipeline, client, server
+
+def display_report(report):
+    """Print load test summary"""
+    log_message("=== LOAD TEST COMPLETED ===")
+    log_message(f"✅ Mode: {report['mode']}, requests: {report['requests']}, elapsed: {report['elapsed']:.1f}s")
+    log_message(f"✅ Throughput: {report['throughput']:.3f} req/s, error rate: {report['error_rate']:.2%}")
+    for error, count in report['top_errors']:
+        log_message(f"   ❌ {count}x {error}")
+    if report['shed']:
+        log_message(f"🚦 Shed (busy) requests: {report['shed']} ({report['shed_rate']:.2%})", "WARNING")
+    if report['partial']:
+        log_message(f"✂️  Partial answers (deadline/cancelled): {report['partial']}", "WARNING")
+    if report['degraded']:
+        log_message(f"⚠️  Degraded (retrieval-only) answers: {report['degraded']} ({report['degraded_rate']:.2%})", "WARNING")
+
+    log_message(f"{'stage':<10} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for stage, s in report['stages'].items():
+        log_message(f"{stage:<10} {s['p50']:>8.3f} {s['p90']:>8.3f} {s['p95']:>8.3f} {s['p99']:>8.3f} {s['max']:>8.3f}")
+
+    saturation = report['saturation']
+    log_message(f"📈 Saturation: offered {saturation['offered_rate']} req/s, achieved {saturation['achieved_rate']} req/s, "
+                f"in flight mean {saturation['mean_in_flight']} / peak {saturation['peak_in_flight']}"
+                f"{' ⚠️  SATURATED' if saturation['saturated'] else ''}")
+
+    admission = report.get('admission')
+    if admission:
+        log_message(f"🚦 Admission: {admission['concurrency']} concurrent, queue wait mean {admission['queue_wait']['mean']}s "
+                    f"/ max {admission['queue_wait']['max']}s, queue depth max {admission['queue_depth']['max']:.0f}")
+
+    slo = report['slo']
+    log_message(f"{'🎯' if slo['met'] else '⚠️ '} SLO p95 <= {slo['p95_target']}s: p95 = {slo['p95']}s "
+                f"({'met' if slo['met'] else 'missed'})")
+
+    comparison = report.get('baseline_comparison')
+    if comparison:
+        for change in comparison['improvements']:
+            log_message(f"   ⬆️  {change}")
+        for change in comparison['regressions']:
+            log_message(f"   ⬇️  {change}", "WARNING")
+        log_message(f"{'❌' if comparison['regressions'] else '✅'} Baseline: "
+                    f"{len(comparison['regressions'])} regressions (tolerance {comparison['tolerance']:.0%})")
+
+def main():
+    """Main load test"""
+    parser = argparse.ArgumentParser(description="End-to-end load generator for the RAG pipeline")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rate", type=float, help="Open loop: arrivals per second")
+    load.add_argument("--concurrency", type=int, help="Closed loop: concurrent clients (default: 1)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Run length in seconds (default: 30)")
+    parser.add_argument("--requests", type=int, help="Number of requests (instead of --duration)")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Open loop: concurrent request limit")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests before the run")
+    parser.add_argument("--queries", help="Query corpus (.json list or one query per line)")
+    parser.add_argument("--config", help="Pipeline configuration file (as for rag_pipeline.py)")
+    parser.add_argument("--ollama-host", help="Use a real Ollama server instead of the stub")
+    parser.add_argument("--mock-server", action="store_true", help="Serve the stub over HTTP (mock_ollama_server.py)")
+    parser.add_argument("--prompt-token-ms", type=float, default=DEFAULT_PROMPT_TOKEN_MS, help="Stub: ms per prompt token")
+    parser.add_argument("--token-ms", type=float, default=DEFAULT_TOKEN_MS, help="Stub: ms per generated token")
+    parser.add_argument("--response-tokens", type=int, default=DEFAULT_RESPONSE_TOKENS, help="Stub: tokens per answer")
+    parser.add_argument("--llm-parallel", type=int, default=1, help="Stub: concurrent generations (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Stub: fraction of failed generations")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Stub: relative latency jitter (seeded)")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Mock server: fraction of hung generations")
+    parser.add_argument("--stall-seconds", type=float, default=30.0, help="Mock server: stall length in seconds")
+    parser.add_argument("--request-timeout", type=float, help="Per-request deadline in seconds (default: pipeline config)")
+    parser.add_argument("--priority", choices=["interactive", "batch"], default="interactive",
+                        help="Admission priority class of the generated requests")
+    parser.add_argument("--llm-concurrency", type=int, help="Admission: concurrent generations (default: pipeline config)")
+    parser.add_argument("--max-queue-wait", type=float, help="Admission: shed after this many seconds queued")
+    parser.add_argument("--seed", type=int, default=0, help="Stub: random seed")
+    parser.add_argument("--slo-p95", type=float, default=DEFAULT_SLO_P95, help="End-to-end p95 target in seconds")
+    parser.add_argument("--baseline", help="Compare against a saved report")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative change vs baseline")
+    parser.add_argument("--save-baseline", help="Save this report as the new baseline")
+    parser.add_argument("--output", help="Report file (default: /tmp/load_test_<timestamp>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline output during the run")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    duration = None if args.requests else args.duration
+    if args.rate is not None:
+        mode = f"open-loop {args.rate} req/s"
+    else:
+        args.concurrency = args.concurrency or 1
+        mode = f"closed-loop {args.concurrency} clients"
+
+    log_message("=== US-004 LOAD TEST ===")
+    if args.mock_server and args.ollama_host:
+        parser.error("--mock-server and --ollama-host are mutually exclusive")
+    if args.stall_rate and not args.mock_server:
+        parser.error("--stall-rate needs --mock-server")
+
+    pipeline, client, server = build_pipeline(args)
+    llm = f"mock server {server.url}" if server else args.ollama_host or "stub"
+    log_message(f"Mode: {mode}, {'%d requests' % args.requests if args.requests else '%.0fs' % args.duration}, "
+                f"{len(queries)} queries, LLM: {llm}")
+    quiet = contextlib.redirect_stdout(open(os.devnull, 'w')) if not args.verbose else contextlib.nullcontext()
+
+    with quiet:
+        ready = pipeline.initialize()
+    if not ready:
+        log_message("❌ Pipeline initialization failed", "ERROR")
+        if server:
+            server.stop()
+        return 1
+
+    def handler(query):
+        return pipeline.process_query(query, save_output=False, priority=args.priority)
+
+    with quiet:
+        for i in range(args.warmup):
+            handler(queries[i % len(queries)])
+        if args.rate is not None:
+            records, elapsed, peak = run_open_loop(handler, queries, args.rate, duration, args.requests,
+                                                   args.max_in_flight)
+        else:
+            records, elapsed, peak = run_closed_loop(handler, queries, args.concurrency, duration, args.requests)
+    pipeline.shutdown()
+    if server:
+        server.stop()
+
+    report = summarize(records, elapsed, peak, mode, args.rate, args.slo_p95)
+    report.update({
+        'timestamp': datetime.now().isoformat(),
+        'queries': len(queries),
+        'llm': ({'stub': client.latency.to_dict(), 'response_tokens': args.response_tokens,
+                 'parallel': args.llm_parallel, 'failure_rate': args.failure_rate,
+                 'calls': client.stats(), 'mock_server': server.stats() if server else None}
+                if client else args.ollama_host),
+        'admission': pipeline.generator.admission.stats()
+    })
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report['baseline_comparison'] = compare_to_baseline(report, json.load(f), args.tolerance)
+
+    display_report(report)
+
+    output_file = args.output or f"/tmp/load_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    for path in filter(None, (output_file, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        log_message(f"💾 Report saved: {path}")
+
+    regressions = report.get('baseline_comparison', {}).get('regressions')
+    return 1 if regressions or not report['slo']['met'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
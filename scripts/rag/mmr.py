@@ -0,0 +1,63 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Step 3c: Maximal Marginal Relevance (MMR)
+Diversity-aware selection over an over-fetched candidate set, so near-duplicate
+chunks do not fill every context slot
+"""
+
+import numpy as np
+
+# 1.0 = pure relevance ranking, 0.0 = pure diversity
+DEFAULT_MMR_LAMBDA = 0.7
+# Candidates fetched from the index per selected context
+DEFAULT_FETCH_FACTOR = 4
+
+def _normalize_rows(matrix):
+    """L2-normalize each row, leaving zero rows untouched"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def cosine_relevance(query_embedding, vectors):
+    """Cosine similarity of each candidate vector to the query"""
+    query_vector = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+    return (_normalize_rows(np.asarray(vectors, dtype=np.float32)) @ _normalize_rows(query_vector)[0])
+
+def mmr_select(relevance, vectors, k, lambda_mult=DEFAULT_MMR_LAMBDA):
+    """
+    Greedy MMR selection
+
+    Args:
+        relevance: (n,) query relevance of each candidate, higher is better (any scale)
+        vectors: (n, d) candidate embeddings
+        k: Number of candidates to select
+        lambda_mult: Relevance/diversity trade-off
+
+    Returns:
+        Candidate positions in selection order
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    # Relevance rescaled to [0, 1] so it is comparable with cosine redundancy
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype=np.float32)
+
+    # All pairwise similarities in one matmul; redundancy = max similarity to anything selected
+    normalized = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    pairwise = np.clip(normalized @ normalized.T, 0.0, 1.0)
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    selected = []
+    for _ in range(k):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[:, best])
+    return selected
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Testing: Deterministic mock Ollama server
+Serves the Ollama HTTP API (/api/tags, /api/generate, /api/chat, /api/version) from
+stub_ollama.StubOllamaClient, so the real pipeline, ollama.Client included, runs on
+machines without a model. Streaming responses are NDJSON over chunked transfer encoding,
+as with Ollama.
+
+Latency: per-token cost plus prompt-eval cost proportional to prompt length (see stub_ollama).
+Failure injection (seeded, per request):
+    --error-rate       HTTP 500 {"error": ...}
+    --stall-rate       wait --stall-seconds before answering (hung generation)
+    --disconnect-rate  drop the connection halfway through the answer
+
+Usage:
+    python3.8 mock_ollama_server.py --port 11434 --token-ms 25 --prompt-token-ms 1
+    python3.8 mock_ollama_server.py --port 11500 --error-rate 0.05 --stall-rate 0.01 --stall-seconds 60
+    python3.8 generate_response.py "AI tools for developers" --host http://127.0.0.1:11500
+    python3.8 load_test.py --concurrency 4 --requests 100 --mock-server
+"""
+
+import sys
+import json
+import time
+import random
+import socket
+import select
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from stub_ollama import (StubOllamaClient, StubOllamaError, LatencyModel, DEFAULT_MODELS,
+                         DEFAULT_PROMPT_TOKEN_MS, DEFAULT_TOKEN_MS, DEFAULT_RESPONSE_TOKENS)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 11434
+MOCK_VERSION = "0.0.0-mock"
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+class FailureInjector:
+    """Seeded per-request failure decision: None, 'error', 'stall' or 'disconnect'"""
+
+    def __init__(self, error_rate=0.0, stall_rate=0.0, disconnect_rate=0.0, stall_seconds=30.0, seed=0):
+        self.rates = (('error', error_rate), ('stall', stall_rate), ('disconnect', disconnect_rate))
+        self.stall_seconds = stall_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {name: 0 for name, _ in self.rates}
+
+    def draw(self):
+        with self._lock:
+            roll = self._rng.random()
+            for name, rate in self.rates:
+                if roll < rate:
+                    self.counts[name] += 1
+                    return name
+                roll -= rate
+        return None
+
+    def to_dict(self):
+        return dict(self.rates, stall_seconds=self.stall_seconds, injected=dict(self.counts))
+
+class _ClientDisconnected(Exception):
+    pass
+
+class OllamaRequestHandler(BaseHTTPRequestHandler):
+    """Ollama API routes; the server object carries client, injector and counters"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOllama/" + MOCK_VERSION
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            log_message(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        data = (json.dumps(payload, ensure_ascii=False) + "\n").encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw.decode('utf-8')) if raw else {}
+
+    def _watch_disconnect(self, chunks, finished):
+        """Close chunks when the caller hangs up, even while no chunk is being written (prompt eval, stall)"""
+        while not finished.is_set():
+            try:
+                readable, _, _ = select.select([self.connection], [], [], 0.05)
+                if readable and not self.connection.recv(1, socket.MSG_PEEK):
+                    chunks.close()
+                    return
+            except (OSError, ValueError):
+                chunks.close()
+                return
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/api/tags":
+            self._send_json(200, self.server.client.list())
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": MOCK_VERSION})
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        routes = {"/api/generate": self._generate, "/api/chat": self._chat}
+        route = routes.get(self.path)
+        if route is None:
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        try:
+            request = self._read_json()
+        except ValueError as e:
+            self._send_json(400, {"error": f"invalid JSON: {e}"})
+            return
+
+        self.server.count_request(self.path)
+        try:
+            route(request)
+        except _ClientDisconnected:
+            self.close_connection = True
+        except (BrokenPipeError, ConnectionResetError):
+            # Caller gave up (timeout/cancel); nothing left to send
+            self.close_connection = True
+
+    def _generate(self, request):
+        stub = self.server.client
+        self._serve(request, lambda stream: stub.generate(
+            model=request.get("model", ""), prompt=request.get("prompt", ""),
+            options=request.get("options"), stream=stream))
+
+    def _chat(self, request):
+        stub = self.server.client
+        self._serve(request, lambda stream: stub.chat(
+            model=request.get("model", ""), messages=request.get("messages", []),
+            options=request.get("options"), stream=stream))
+
+    def _serve(self, request, call):
+        """Apply failure injection, then answer streamed (default, like Ollama) or as one JSON object"""
+        stream = request.get("stream", True)
+        failure = self.server.injector.draw()
+
+        if failure == "error":
+            self._send_json(500, {"error": "mock: injected failure"})
+            return
+        if failure == "stall":
+            time.sleep(self.server.injector.stall_seconds)
+
+        finished = threading.Event()
+        try:
+            if not stream:
+                if failure == "disconnect":
+                    raise _ClientDisconnected()
+                self._send_json(200, call(False))
+                return
+
+            chunks = call(True)
+            threading.Thread(target=self._watch_disconnect, args=(chunks, finished), daemon=True).start()
+            first = next(chunks)  # Model errors surface before any header is sent
+        except StubOllamaError as e:
+            finished.set()
+            self._send_json(e.status_code, {"error": e.error})
+            return
+        except StopIteration:
+            # Caller hung up during prompt evaluation
+            finished.set()
+            raise _ClientDisconnected()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        sent = 0
+        try:
+            self._write_chunk(first)
+            for chunk in chunks:
+                sent += 1
+                if failure == "disconnect" and sent >= self.server.client.response_tokens // 2:
+                    raise _ClientDisconnected()
+                self._write_chunk(chunk)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        finally:
+            # Frees the generation slot right away when the stream is abandoned
+            finished.set()
+            chunks.close()
+
+class MockOllamaServer(ThreadingHTTPServer):
+    """
+    Threaded mock Ollama on host:port (port 0 = pick a free port)
+    Use as a context manager or start()/stop(); url is the base URL for ollama.Client(host=...).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, client=None, injector=None, verbose=False):
+        super().__init__((host, port), OllamaRequestHandler)
+        self.client = client or StubOllamaClient()
+        self.injector = injector or FailureInjector()
+        self.verbose = verbose
+        self._thread = None
+        self._lock = threading.Lock()
+        self.requests = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self._lock:
+            requests = dict(self.requests)
+        return {'requests': requests, 'failures': self.injector.to_dict(), 'latency': self.client.latency.to_dict()}
+
+def main():
+    """Run the mock server in the foreground"""
+    parser = argparse.ArgumentParser(description="Deterministic mock Ollama server for offline testing")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT}, 0 = any free port)")
+    parser.add_argument("--models", nargs='+', default=list(DEFAULT_MODELS), help="Model names reported by /api/tags")
+    parser.add_argument("--prompt-token-ms", type=float, default=DEFAULT_PROMPT_TOKEN_MS, help="ms per prompt token")
+    parser.add_argument("--token-ms", type=float, default=DEFAULT_TOKEN_MS, help="ms per generated token")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="Fixed ms per request (model load)")
+    parser.add_argument("--response-tokens", type=int, default=DEFAULT_RESPONSE_TOKENS, help="Tokens per answer")
+    parser.add_argument("--parallel", type=int, default=1, help="Concurrent generations (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Relative latency jitter (seeded)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of requests that stall")
+    parser.add_argument("--stall-seconds", type=float, default=30.0, help="Stall length in seconds")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="Fraction of streams cut off halfway")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    client = StubOllamaClient(
+        models=args.models,
+        latency=LatencyModel(args.prompt_token_ms, args.token_ms, load_ms=args.load_ms, jitter=args.jitter),
+        response_tokens=args.response_tokens,
+        parallel=args.parallel,
+        seed=args.seed
+    )
+    injector = FailureInjector(args.error_rate, args.stall_rate, args.disconnect_rate, args.stall_seconds, args.seed)
+
+    try:
+        server = MockOllamaServer(args.host, args.port, client, injector, verbose=args.verbose)
+    except (OSError, socket.error) as e:
+        log_message(f"❌ Cannot bind {args.host}:{args.port}: {e}", "ERROR")
+        return 1
+
+    log_message(f"🧪 Mock Ollama listening on {server.url} (models: {', '.join(args.models)})")
+    log_message(f"   Latency: {args.prompt_token_ms}ms/prompt token, {args.token_ms}ms/token, "
+                f"{args.response_tokens} tokens, parallel {args.parallel}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        log_message(f"Stopped. {json.dumps(server.stats(), ensure_ascii=False)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Step 5c: Abortable streaming generation over the Ollama HTTP API
+ollama.Client streams cannot be interrupted from another thread: a read blocked on a model
+that is still evaluating the prompt (or has stalled) only returns when data or the read timeout
+arrives. OllamaGenerateStream talks NDJSON to /api/generate on its own connection, and close()
+shuts the socket down from any thread (e.g. a Deadline watchdog), which wakes the blocked read
+immediately. Ollama aborts the generation when the connection drops, freeing its slot.
+"""
+
+import json
+import socket
+import http.client
+from urllib.parse import urlsplit
+
+DEFAULT_OLLAMA_PORT = 11434
+
+class OllamaStreamError(Exception):
+    """Error response from Ollama (HTTP status or an {"error": ...} line)"""
+
+class OllamaGenerateStream:
+    """
+    Iterator of /api/generate chunks (dicts, same keys as ollama.Client.generate)
+    first_read_timeout bounds the wait for the first chunk (prompt evaluation), read_timeout
+    the silence between later chunks. The request is sent when iteration starts.
+    """
+
+    def __init__(self, host, payload, first_read_timeout, read_timeout):
+        url = urlsplit(host if '://' in host else f"http://{host}")
+        https = url.scheme == 'https'
+        connection_class = http.client.HTTPSConnection if https else http.client.HTTPConnection
+        self._connection = connection_class(url.hostname, url.port or (443 if https else DEFAULT_OLLAMA_PORT),
+                                            timeout=first_read_timeout)
+        self._path = url.path.rstrip('/') + "/api/generate"
+        self._body = json.dumps(dict(payload, stream=True)).encode('utf-8')
+        self.read_timeout = read_timeout
+        self.closed = False
+
+    def __iter__(self):
+        self._connection.request("POST", self._path, body=self._body, headers={"Content-Type": "application/json"})
+        response = self._connection.getresponse()
+        if response.status != 200:
+            body = response.read().decode('utf-8', 'replace')
+            try:
+                error = json.loads(body).get('error', body)
+            except ValueError:
+                error = body
+            raise OllamaStreamError(f"HTTP {response.status}: {error}")
+
+        first = True
+        while not self.closed:
+            line = response.readline()
+            if not line:
+                return
+            if first and self._connection.sock is not None:
+                # Prompt evaluated; from now on only short silences are normal
+                self._connection.sock.settimeout(self.read_timeout)
+                first = False
+            line = line.strip()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if 'error' in chunk:
+                raise OllamaStreamError(chunk['error'])
+            yield chunk
+
+    def close(self):
+        """Drop the connection; safe to call from another thread and more than once"""
+        self.closed = True
+        sock = self._connection.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._connection.close()
@@ -8,9 +8,11 @@ import sys
 import os
 import json
 import numpy as np
-import pickle
 from datetime import datetime
 
+# Shared embedding backend lives in scripts/vector
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vector'))
+
 def log_message(message, level="INFO"):
     """Log messages with timestamp"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -21,23 +23,25 @@ def load_vector_database():
     log_message("Loading vector database from US-003...")
     
     try:
-        # Import required libraries
-        import faiss
-        from sentence_transformers import SentenceTransformer
+        # Heavy libraries are imported lazily by the shared factory
+        from embedder_factory import get_embedder, get_vector_store
+        from index_snapshots import resolve_db_files, INDEX_FILE, METADATA_FILE
         
-        # Database paths from US-003
+        # Database paths from US-003 (current snapshot)
         db_dir = "/opt/rag-copilot/db"
-        index_file = os.path.join(db_dir, "vector_db.index")
-        metadata_file = os.path.join(db_dir, "vector_db_metadata.json")
-        chunks_file = os.path.join(db_dir, "chunks_backup.pkl")
+        files = resolve_db_files(db_dir)
+        index_file = files[INDEX_FILE]
+        metadata_file = files[METADATA_FILE]
         
         # Load FAISS index
         if not os.path.exists(index_file):
             log_message(f"❌ Vector database not found: {index_file}", "ERROR")
             return None, None, None
         
-        index = faiss.read_index(index_file)
-        log_message(f"✅ FAISS index loaded: {index.ntotal} vectors")
+        # Index and chunks come from the same snapshot
+        store = get_vector_store(db_dir)
+        index = store.index
+        log_message(f"✅ FAISS index loaded: {index.ntotal} vectors (snapshot {store.version})")
         
         # Load metadata
         metadata = {}
@@ -47,14 +51,12 @@ def load_vector_database():
             log_message(f"✅ Database metadata loaded")
         
         # Load document chunks
-        chunks = None
-        if os.path.exists(chunks_file):
-            with open(chunks_file, 'rb') as f:
-                chunks = pickle.load(f)
+        chunks = store.chunks or None
+        if chunks is not None:
             log_message(f"✅ Document chunks loaded: {len(chunks)} chunks")
         
         # Load embedding model (same as US-003)
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        model = get_embedder()
         log_message(f"✅ Embedding model loaded")
         
         return index, chunks, model
@@ -63,24 +65,27 @@ def load_vector_database():
         log_message(f"❌ Failed to load vector database: {str(e)}", "ERROR")
         return None, None, None
 
+MAX_QUERY_LENGTH = 1000
+
+def normalize_query(query_text):
+    """Normalize query text: trim, collapse whitespace, cap length"""
+    return ' '.join(query_text.split())[:MAX_QUERY_LENGTH]
+
 def preprocess_query(query_text):
     """Preprocess user query"""
     log_message(f"Preprocessing query: {query_text[:50]}...")
     
     try:
-        # Basic text cleaning
-        processed_query = query_text.strip()
-        
-        # Remove excessive whitespace
-        processed_query = ' '.join(processed_query.split())
-        
         # Basic validation
-        if len(processed_query) < 3:
+        collapsed_length = len(' '.join(query_text.split()))
+        if collapsed_length < 3:
             log_message("⚠️  Query too short (< 3 characters)", "WARNING")
         
-        if len(processed_query) > 1000:
-            log_message("⚠️  Query too long (> 1000 characters), truncating", "WARNING")
-            processed_query = processed_query[:1000]
+        if collapsed_length > MAX_QUERY_LENGTH:
+            log_message(f"⚠️  Query too long (> {MAX_QUERY_LENGTH} characters), truncating", "WARNING")
+        
+        # Basic text cleaning: strip, remove excessive whitespace, truncate
+        processed_query = normalize_query(query_text)
         
         # Detect language (simple heuristic)
         vietnamese_chars = set('àáãạảăắằẳẵặâấầẩẫậèéẹẻẽêềếểễệìíĩỉịòóõọỏôốồổỗộơớờởỡợùúũụủưứừửữựỳýỵỷỹđ')
@@ -102,8 +107,9 @@ def generate_query_embedding(query_text, model):
     log_message("Generating query embedding...")
     
     try:
-        # Generate embedding using same model as US-003
-        embedding = model.encode([query_text])
+        # Generate embedding using same model as US-003 (served from cache on repeats)
+        from embedding_cache import get_query_cache
+        embedding = get_query_cache().encode(model, query_text)
         
         log_message(f"✅ Query embedding generated")
         log_message(f"   Shape: {embedding.shape}")
@@ -23,6 +23,34 @@ from datetime import datetime
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+from deadline import Deadline, DEFAULT_REQUEST_TIMEOUT, DEFAULT_LLM_READ_TIMEOUT
+
+# Pipeline defaults; a config file only needs the keys it changes
+DEFAULT_CONFIG = {
+    "ollama_host": "http://localhost:11434",
+    "model_name": "mistral:7b",
+    "max_tokens": 200,
+    "temperature": 0.3,
+    "top_k": 2,
+    "context_tokens": 600,
+    "compress_context": True,
+    "mmr_lambda": 0.7,
+    "query_cache_size": 1024,
+    "query_cache_path": None,
+    "vector_db_mode": "background",
+    "embedding_batch_window_ms": None,
+    "embedding_max_batch_size": 32,
+    "watch_roots": None,
+    "watch_debounce": 2.0,
+    "request_timeout": DEFAULT_REQUEST_TIMEOUT,
+    "llm_read_timeout": DEFAULT_LLM_READ_TIMEOUT,
+    "llm_concurrency": 1,
+    "max_queue": 16,
+    "max_queue_wait": 5.0,
+    "context_cache_ttl": 60.0,
+    "context_cache_size": 256
+}
+
 def log_message(message, level="INFO"):
     """Log messages with timestamp"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -34,18 +62,14 @@ class RAGPipeline:
     Integrates all components for complete RAG functionality
     """
     
-    def __init__(self, config=None):
-        """Initialize RAG Pipeline"""
-        self.config = config or {
-            "ollama_host": "http://localhost:11434",
-            "model_name": "mistral:7b",
-            "max_tokens": 200,
-            "temperature": 0.3,
-            "top_k": 2,
-            "context_tokens": 600
-        }
+    def __init__(self, config=None, ollama_client=None):
+        """Initialize RAG Pipeline (ollama_client: optional replacement for ollama.Client, e.g. a stub)"""
+        # Keys missing from a caller-supplied config fall back to the defaults
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
         
+        self.ollama_client = ollama_client
         self.generator = None
+        self.watcher = None
         self.initialized = False
         
     def initialize(self):
@@ -59,24 +83,85 @@ class RAGPipeline:
             log_message("Initializing RAG Response Generator...")
             self.generator = RAGResponseGenerator(
                 ollama_host=self.config["ollama_host"],
-                model_name=self.config["model_name"]
+                model_name=self.config["model_name"],
+                compress_context=self.config["compress_context"],
+                mmr_lambda=self.config["mmr_lambda"],
+                query_cache_size=self.config["query_cache_size"],
+                query_cache_path=self.config["query_cache_path"],
+                vector_db_mode=self.config["vector_db_mode"],
+                embedding_batch_window_ms=self.config["embedding_batch_window_ms"],
+                embedding_max_batch_size=self.config["embedding_max_batch_size"],
+                ollama_client=self.ollama_client,
+                llm_read_timeout=self.config["llm_read_timeout"],
+                llm_concurrency=self.config["llm_concurrency"],
+                max_queue=self.config["max_queue"],
+                max_queue_wait=self.config["max_queue_wait"],
+                context_cache_ttl=self.config["context_cache_ttl"],
+                context_cache_size=self.config["context_cache_size"]
             )
             
+            if self.config["watch_roots"]:
+                self.start_watcher()
+            
             self.initialized = True
-            log_message("✅ RAG Pipeline initialized successfully")
+            health = self.generator.health()
+            if health["ready"]:
+                log_message("✅ RAG Pipeline initialized successfully")
+            else:
+                # Still serving: failed components are retried on later queries
+                unavailable = [name for name, status in health["components"].items() if status["state"] != "ready"]
+                log_message(f"⚠️  RAG Pipeline started degraded (not ready: {', '.join(unavailable)})", "WARNING")
             return True
             
         except Exception as e:
             log_message(f"❌ RAG Pipeline initialization failed: {e}", "ERROR")
             return False
     
-    def process_query(self, query, save_output=True):
+    def start_watcher(self):
+        """Watch document roots and hot-swap the index after each incremental ingestion"""
+        from watch_corpus import CorpusWatcher
+        
+        self.watcher = CorpusWatcher(
+            self.config["watch_roots"],
+            debounce=self.config["watch_debounce"],
+            on_sync=self.generator.refresh_vector_db
+        )
+        self.watcher.start()
+        log_message(f"👀 Corpus watcher started: {', '.join(self.config['watch_roots'])}")
+    
+    def shutdown(self):
+        """Stop background components"""
+        if self.watcher:
+            self.watcher.stop(timeout=5)
+            self.watcher = None
+    
+    def health(self):
+        """Liveness/readiness for monitoring: live while the process answers, ready when every component is up"""
+        if not self.initialized:
+            return {"live": True, "ready": False, "degraded": False, "error": "Pipeline not initialized"}
+        health = self.generator.health()
+        health["watcher"] = self.watcher is not None
+        return health
+    
+    def prefetch(self, partial_query, wait=False):
+        """
+        Warm retrieval for a query the user is still typing (call on each pause in typing)
+        Submitting the same text afterwards goes straight to prompt construction.
+        """
+        if not self.initialized:
+            return {"prefetched": False, "reason": "Pipeline not initialized"}
+        return self.generator.prefetch(partial_query, wait=wait)
+    
+    def process_query(self, query, save_output=True, deadline=None, priority="interactive"):
         """
         Process a query through the complete RAG pipeline
         
         Args:
             query: User's question
             save_output: Whether to save response to file
+            deadline: Deadline for this request (default: config request_timeout from now);
+                      call deadline.cancel() when the client disconnects
+            priority: "interactive" or "batch" (evaluation); batch requests yield generation slots
             
         Returns:
             dict with complete pipeline result
@@ -88,6 +173,8 @@ class RAGPipeline:
         
         log_message(f"=== PROCESSING QUERY: {query} ===")
         pipeline_start = time.time()
+        if deadline is None:
+            deadline = Deadline(self.config["request_timeout"])
         
         try:
             # Step 1: Generate RAG response
@@ -95,13 +182,21 @@ class RAGPipeline:
             result = self.generator.generate_response(
                 query=query,
                 max_tokens=self.config["max_tokens"],
-                temperature=self.config["temperature"]
+                temperature=self.config["temperature"],
+                deadline=deadline,
+                priority=priority
             )
             
             pipeline_time = time.time() - pipeline_start
             
-            if result.get("success", False):
+            if result.get("degraded"):
+                log_message(f"⚠️  RAG pipeline degraded: retrieval-only answer ({result['metadata']['llm_error']})", "WARNING")
+            elif result.get("partial"):
+                log_message(f"✂️  RAG pipeline returned a partial answer ({result['stop_reason']})", "WARNING")
+            elif result.get("success", False):
                 log_message("✅ RAG pipeline completed successfully")
+            
+            if result.get("success", False):
                 
                 # Add pipeline metadata
                 result["pipeline_metadata"] = {
@@ -118,6 +213,10 @@ class RAGPipeline:
                 
                 return result
                 
+            elif result.get("busy"):
+                log_message(f"🚦 RAG pipeline shed the request: {result['error']}", "WARNING")
+                return result
+                
             else:
                 log_message(f"❌ RAG pipeline failed: {result.get('error', 'Unknown error')}", "ERROR")
                 return result
@@ -163,6 +262,13 @@ class RAGPipeline:
         print(f"🔄 PIPELINE VERSION: {result['pipeline_metadata']['pipeline_version']}")
         print(f"🔗 INTEGRATION FLOW: {result['pipeline_metadata']['integration_flow']}")
         
+        if result.get('degraded'):
+            print(f"⚠️  DEGRADED MODE: {result['metadata'].get('llm_error')}")
+            print(f"   LLM retry in {result['metadata'].get('llm_retry_in') or 0:.0f}s; answer below lists retrieved passages")
+        
+        if result.get('partial') and not result.get('degraded'):
+            print(f"✂️  PARTIAL ANSWER: generation stopped ({result['stop_reason']}) to meet the request deadline")
+        
         # Performance metrics
         timing = result.get('timing', {})
         pipeline_time = result['pipeline_metadata']['pipeline_time']
@@ -203,6 +309,12 @@ class RAGPipeline:
         print(f"  - Max Tokens: {metadata.get('max_tokens', 0)}")
         print(f"  - Prompt Length: {metadata.get('prompt_length', 0)} chars")
         print(f"  - Response Length: {metadata.get('response_length', 0)} chars")
+        if metadata.get('context_compression'):
+            print(f"  - Context Compression: {metadata['context_compression']['compression_ratio']:.3f}")
+        if metadata.get('query_cache'):
+            cache_stats = metadata['query_cache']
+            print(f"  - Query Cache: {cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']} hits "
+                  f"({cache_stats['hit_rate']:.1%}), {cache_stats['size']}/{cache_stats['max_size']} entries")
         
         # Config used
         config = result['pipeline_metadata']['config']
@@ -213,6 +325,8 @@ class RAGPipeline:
         print(f"  - Temperature: {config['temperature']}")
         print(f"  - Top K: {config['top_k']}")
         print(f"  - Context Tokens: {config['context_tokens']}")
+        print(f"  - Compress Context: {config['compress_context']}")
+        print(f"  - Request Timeout: {config['request_timeout']}s")
         
         # Output file
         if 'output_file' in result:
@@ -253,7 +367,7 @@ def run_pipeline_tests():
         log_message(f"\n--- Test Case {i}: {test_case['description']} ---")
         
         try:
-            result = pipeline.process_query(test_case["query"], save_output=False)
+            result = pipeline.process_query(test_case["query"], save_output=False, priority="batch")
             results.append(result)
             
             if result.get("success", False):
@@ -288,9 +402,22 @@ def run_pipeline_tests():
             log_message("🎯 Average performance meets Epic target")
         else:
             log_message("⚠️  Average performance exceeds Epic target")
+        
+        cache_stats = successful_results[-1].get('metadata', {}).get('query_cache')
+        if cache_stats:
+            log_message(f"🗂️  Query embedding cache hit rate: {cache_stats['hit_rate']:.1%}")
     
     return passed == total
 
+def print_startup_profile():
+    """Print import/load time breakdown recorded by the shared factory"""
+    try:
+        from embedder_factory import format_startup_profile
+        print()
+        print(format_startup_profile())
+    except ImportError as e:
+        log_message(f"⚠️  Startup profile unavailable: {e}", "WARNING")
+
 def main():
     """Main function with command line interface"""
     parser = argparse.ArgumentParser(description="End-to-End RAG Pipeline - Step 5")
@@ -298,6 +425,7 @@ def main():
     parser.add_argument("--test", action="store_true", help="Run comprehensive pipeline tests")
     parser.add_argument("--config", help="Path to pipeline configuration file")
     parser.add_argument("--save", action="store_true", default=True, help="Save pipeline result to file")
+    parser.add_argument("--profile-startup", action="store_true", help="Print import/load time breakdown")
     
     args = parser.parse_args()
     
@@ -318,6 +446,8 @@ def main():
     # Run tests if requested
     if args.test:
         success = run_pipeline_tests()
+        if args.profile_startup:
+            print_startup_profile()
         return 0 if success else 1
     
     # Process single query
@@ -339,6 +469,9 @@ def main():
     # Display result
     pipeline.display_pipeline_result(result)
     
+    if args.profile_startup:
+        print_startup_profile()
+    
     if result.get("success", False):
         log_message("✅ Step 5 completed successfully!")
         return 0
@@ -11,13 +11,22 @@ import argparse
 import numpy as np
 from datetime import datetime
 
-# Import for vector database and embeddings
-try:
-    import faiss
-    from sentence_transformers import SentenceTransformer
-    DEPENDENCIES_AVAILABLE = True
-except ImportError:
-    DEPENDENCIES_AVAILABLE = False
+# Shared embedding backend lives in scripts/vector
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vector'))
+
+# Vector database and embeddings are imported lazily by the shared factory
+from embedder_factory import get_embedder, get_vector_store, get_chunk_store, get_embedding_store, is_available
+from index_snapshots import resolve_db_files, CHUNKS_FILE, EMBEDDINGS_FILE
+DEPENDENCIES_AVAILABLE = is_available('faiss')
+
+from compress_context import compress_contexts
+from embedding_cache import get_query_cache
+from mmr import mmr_select, cosine_relevance, DEFAULT_MMR_LAMBDA, DEFAULT_FETCH_FACTOR
+
+# Vector database files (from US-003 completion)
+DB_DIR = "/opt/rag-copilot/db"
+VECTOR_DB_PATH = "/opt/rag-copilot/db/vector_db.index"
+CHUNKS_PATH = "/opt/rag-copilot/db/chunks_backup.pkl"
 
 def log_message(message, level="INFO"):
     """Log messages with timestamp"""
@@ -31,7 +40,7 @@ def estimate_tokens(text):
 def setup_vector_db():
     """
     Setup vector database and embedding model for context retrieval
-    Returns: (vector_db, embedding_model)
+    Returns: (vector_db, embedding_model) - vector_db is a VectorStore (index + chunks of one snapshot)
     """
     log_message("Setting up vector database and embedding model...")
     
@@ -40,17 +49,12 @@ def setup_vector_db():
     
     try:
         # Load embedding model
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        model = get_embedder()
         log_message("✅ Embedding model loaded: all-MiniLM-L6-v2")
         
-        # Load FAISS index (from US-003 completion)
-        vector_db_path = "/opt/rag-copilot/db/vector_db.index"
-        
-        if not os.path.exists(vector_db_path):
-            raise FileNotFoundError(f"Vector database not found: {vector_db_path}")
-        
-        vector_db = faiss.read_index(vector_db_path)
-        log_message(f"✅ Vector database loaded: {vector_db.ntotal} vectors")
+        # Load FAISS index and chunks of the current snapshot (from US-003 completion)
+        vector_db = get_vector_store(DB_DIR)
+        log_message(f"✅ Vector database loaded: {vector_db.ntotal} vectors (snapshot {vector_db.version})")
         
         return vector_db, model
         
@@ -58,48 +62,90 @@ def setup_vector_db():
         log_message(f"❌ Failed to setup vector database: {str(e)}", "ERROR")
         raise
 
-def retrieve_context(query, vector_db, model, top_k=3, max_tokens=2000):
+def candidate_vectors(vector_db, positions):
+    """Embeddings of search candidates: stored vectors of the snapshot, else reconstructed from the index"""
+    if hasattr(vector_db, 'vectors'):
+        return vector_db.vectors(positions)
+    try:
+        return np.vstack([vector_db.reconstruct(int(i)) for i in positions]).astype(np.float32)
+    except Exception:
+        return None
+
+def diversify_results(vector_db, query_embedding, scores, indices, top_k, mmr_lambda):
+    """Re-rank over-fetched search results with MMR; same (scores, indices) shape as index.search"""
+    valid = indices[0] != -1
+    scores, indices = scores[0][valid], indices[0][valid]
+    if len(indices) <= top_k:
+        return scores[None, :], indices[None, :]
+    
+    vectors = candidate_vectors(vector_db, indices)
+    if vectors is None:
+        log_message("⚠️  Candidate embeddings unavailable, skipping MMR", "WARNING")
+        return scores[None, :top_k], indices[None, :top_k]
+    
+    order = mmr_select(cosine_relevance(query_embedding, vectors), vectors, top_k, mmr_lambda)
+    log_message(f"✅ MMR selected {len(order)}/{len(indices)} candidates (lambda={mmr_lambda})")
+    return scores[order][None, :], indices[order][None, :]
+
+def retrieve_context(query, vector_db, model, top_k=3, max_tokens=2000, compress=False, compression_window=1,
+                     mmr_lambda=DEFAULT_MMR_LAMBDA, fetch_k=None):
     """
     Retrieve relevant context for a query using vector similarity search
     
     Args:
         query: User's question
-        vector_db: FAISS vector database
+        vector_db: VectorStore (or a bare FAISS index, with chunks from the current snapshot)
         model: Sentence transformer model
         top_k: Number of top results to return
         max_tokens: Maximum tokens for context
+        compress: Keep only query-relevant sentences instead of truncating whole chunks
+        compression_window: Neighbor sentences kept around each selected sentence
+        mmr_lambda: MMR relevance/diversity trade-off (1.0 or None = plain similarity ranking)
+        fetch_k: Candidates fetched for MMR (default: top_k * DEFAULT_FETCH_FACTOR)
     
     Returns:
         List of context dictionaries with content, score, source, metadata
     """
     log_message(f"Retrieving context for query: {query}")
-    log_message(f"Parameters: top_k={top_k}, max_tokens={max_tokens}")
+    log_message(f"Parameters: top_k={top_k}, max_tokens={max_tokens}, compress={compress}, mmr_lambda={mmr_lambda}")
     
     try:
-        # Generate query embedding
-        query_embedding = model.encode([query])
-        log_message("✅ Query embedding generated")
-        
-        # Search vector database
-        scores, indices = vector_db.search(query_embedding, top_k)
+        # Generate query embedding (served from cache on repeated queries)
+        query_cache = get_query_cache()
+        query_embedding = query_cache.encode(model, query)
+        log_message(f"✅ Query embedding generated (cache hit rate: {query_cache.stats()['hit_rate']:.2%})")
+        
+        # Search vector database (over-fetch candidates for MMR)
+        use_mmr = mmr_lambda is not None and mmr_lambda < 1.0 and top_k > 1
+        search_k = (fetch_k or top_k * DEFAULT_FETCH_FACTOR) if use_mmr else top_k
+        scores, indices = vector_db.search(query_embedding, search_k)
         log_message(f"✅ Vector search completed: {len(indices[0])} results")
         
-        # Load document chunks (from US-003 completion)
-        chunks_path = "/opt/rag-copilot/db/chunks_backup.pkl"
+        if use_mmr:
+            scores, indices = diversify_results(vector_db, query_embedding, scores, indices, top_k, mmr_lambda)
         
-        if not os.path.exists(chunks_path):
-            log_message("⚠️  Document chunks not found, using basic format", "WARNING")
-            chunks = []
-        else:
-            import pickle
-            with open(chunks_path, 'rb') as f:
-                chunks = pickle.load(f)
+        # Load document chunks (from US-003 completion)
+        if hasattr(vector_db, 'chunks'):
+            # Same snapshot as the index that was just searched
+            chunks = vector_db.chunks
             log_message(f"✅ Document chunks loaded: {len(chunks)} chunks")
+        else:
+            chunks_path = resolve_db_files(DB_DIR)[CHUNKS_FILE]
+            if not os.path.exists(chunks_path):
+                log_message("⚠️  Document chunks not found, using basic format", "WARNING")
+                chunks = []
+            else:
+                # Cached per process; reloaded only when the file changes
+                chunks = get_chunk_store(chunks_path)
+                log_message(f"✅ Document chunks loaded: {len(chunks)} chunks")
         
         # Format results
         contexts = []
         total_tokens = 0
         
+        # With compression, collect whole chunks and let the compressor enforce the budget
+        token_budget = sys.maxsize if compress else max_tokens
+        
         for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
             if idx == -1:  # Invalid index
                 continue
@@ -133,9 +179,9 @@ def retrieve_context(query, vector_db, model, top_k=3, max_tokens=2000):
             content_tokens = estimate_tokens(content)
             
             # Check if adding this content exceeds token limit
-            if total_tokens + content_tokens > max_tokens:
+            if total_tokens + content_tokens > token_budget:
                 # Try to fit partial content
-                remaining_tokens = max_tokens - total_tokens
+                remaining_tokens = token_budget - total_tokens
                 if remaining_tokens > 100:  # Only if meaningful space left
                     chars_that_fit = remaining_tokens * 4
                     truncated_content = content[:chars_that_fit] + "..."
@@ -148,7 +194,8 @@ def retrieve_context(query, vector_db, model, top_k=3, max_tokens=2000):
                             'title': metadata.get('title', ''),
                             'section': metadata.get('section', ''),
                             'document_id': idx,
-                            'truncated': True
+                            'truncated': True,
+                            'aliases': metadata.get('aliases', [])
                         }
                     }
                     contexts.append(context)
@@ -164,13 +211,21 @@ def retrieve_context(query, vector_db, model, top_k=3, max_tokens=2000):
                         'title': metadata.get('title', ''),
                         'section': metadata.get('section', ''),
                         'document_id': idx,
-                        'truncated': False
+                        'truncated': False,
+                        'aliases': metadata.get('aliases', [])
                     }
                 }
                 contexts.append(context)
                 total_tokens += content_tokens
                 log_message(f"   Added context {i+1}: {content_tokens} tokens (Score: {score:.3f})")
         
+        if compress and contexts:
+            contexts, compression_stats = compress_contexts(
+                contexts, query_embedding, model,
+                max_tokens=max_tokens, window=compression_window
+            )
+            total_tokens = compression_stats['compressed_tokens']
+        
         log_message(f"✅ Context retrieval completed")
         log_message(f"   Retrieved contexts: {len(contexts)}")
         log_message(f"   Total tokens: {total_tokens}/{max_tokens}")
@@ -204,8 +259,19 @@ def retrieve_context_from_query_results(results_file, top_k=3, max_tokens=2000):
         log_message(f"❌ Failed to load query results: {str(e)}", "ERROR")
         return None, None, None
 
-def rank_contexts_by_relevance(results, query, top_k=3):
-    """Rank contexts by relevance score and content quality"""
+def load_result_vectors(results, db_dir=DB_DIR):
+    """Stored embeddings of query results (by document_index); None if unavailable"""
+    embeddings = get_embedding_store(resolve_db_files(db_dir)[EMBEDDINGS_FILE])
+    if embeddings is None:
+        return None
+    
+    positions = [r.get('document_index') for r in results]
+    if any(p is None or not 0 <= p < len(embeddings) for p in positions):
+        return None
+    return np.asarray(embeddings[np.asarray(positions, dtype=np.int64)], dtype=np.float32)
+
+def rank_contexts_by_relevance(results, query, top_k=3, mmr_lambda=DEFAULT_MMR_LAMBDA):
+    """Rank contexts by relevance score, diversified with MMR over the stored embeddings"""
     log_message(f"Ranking contexts by relevance (top {top_k})...")
     
     try:
@@ -219,8 +285,17 @@ def rank_contexts_by_relevance(results, query, top_k=3):
         # Sort by similarity score (descending)
         ranked_results = sorted(valid_results, key=lambda x: x.get('similarity_score', 0), reverse=True)
         
-        # Take top K
+        # Take top K (MMR picks K diverse results out of all candidates)
         top_results = ranked_results[:top_k]
+        if mmr_lambda is not None and mmr_lambda < 1.0 and len(ranked_results) > top_k > 1:
+            vectors = load_result_vectors(ranked_results)
+            if vectors is None:
+                log_message("⚠️  Stored embeddings unavailable, skipping MMR", "WARNING")
+            else:
+                relevance = [r.get('similarity_score', 0) for r in ranked_results]
+                order = mmr_select(relevance, vectors, top_k, mmr_lambda)
+                top_results = [ranked_results[i] for i in order]
+                log_message(f"✅ MMR selected {len(order)}/{len(ranked_results)} candidates (lambda={mmr_lambda})")
         
         log_message(f"✅ Context ranking completed")
         log_message(f"   Valid results: {len(valid_results)}")
@@ -360,6 +435,8 @@ def main():
     parser.add_argument('--top-k', type=int, default=3, help='Number of top results to retrieve')
     parser.add_argument('--max-tokens', type=int, default=2000, help='Maximum tokens for context')
     parser.add_argument('--results-file', help='Query results file (if available)')
+    parser.add_argument('--mmr-lambda', type=float, default=DEFAULT_MMR_LAMBDA,
+                        help='MMR relevance/diversity trade-off (1.0 = relevance only)')
     
     args = parser.parse_args()
     
@@ -398,7 +475,7 @@ def main():
         sys.exit(1)
     
     # Step 2: Rank contexts by relevance
-    ranked_contexts = rank_contexts_by_relevance(results, query, args.top_k)
+    ranked_contexts = rank_contexts_by_relevance(results, query, args.top_k, args.mmr_lambda)
     if not ranked_contexts:
         log_message("❌ No ranked contexts available", "ERROR")
         sys.exit(1)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Testing: Deterministic stub Ollama client
+Drop-in replacement for ollama.Client (list/generate/chat) that needs no model.
+The same prompt always produces the same answer and the same simulated latency, so
+benchmarks measure our own overhead plus a known, configurable LLM cost.
+
+Latency model:
+    prompt eval = prompt_tokens * prompt_token_ms
+    generation  = eval_tokens * token_ms   (eval_tokens = min(num_predict, response_tokens))
+    plus optional seeded jitter; at most `parallel` generations run at once (like OLLAMA_NUM_PARALLEL)
+"""
+
+import time
+import zlib
+import random
+import threading
+from datetime import datetime, timezone
+
+DEFAULT_MODELS = ("mistral:7b",)
+DEFAULT_PROMPT_TOKEN_MS = 1.0
+DEFAULT_TOKEN_MS = 25.0
+DEFAULT_RESPONSE_TOKENS = 60
+
+FILLER_WORDS = ("the", "and", "of", "to", "is", "for", "with", "theo", "của", "và", "là", "cho")
+
+class StubOllamaError(Exception):
+    """Injected failure (mirrors ollama.ResponseError)"""
+
+    def __init__(self, error, status_code=500):
+        super().__init__(error)
+        self.error = error
+        self.status_code = status_code
+
+def estimate_tokens(text):
+    """Simple token estimation (1 token ≈ 4 characters for Vietnamese/English)"""
+    return max(1, len(text) // 4)
+
+class LatencyModel:
+    """Simulated LLM cost: prompt evaluation proportional to prompt length, fixed cost per generated token"""
+
+    def __init__(self, prompt_token_ms=DEFAULT_PROMPT_TOKEN_MS, token_ms=DEFAULT_TOKEN_MS,
+                 load_ms=0.0, jitter=0.0):
+        self.prompt_token_ms = prompt_token_ms
+        self.token_ms = token_ms
+        self.load_ms = load_ms
+        self.jitter = jitter
+
+    def _scale(self, rng):
+        return 1.0 + rng.uniform(-self.jitter, self.jitter) if self.jitter else 1.0
+
+    def prompt_seconds(self, prompt_tokens, rng):
+        return (self.load_ms + prompt_tokens * self.prompt_token_ms) * self._scale(rng) / 1000.0
+
+    def token_seconds(self, rng):
+        return self.token_ms * self._scale(rng) / 1000.0
+
+    def to_dict(self):
+        return {
+            'prompt_token_ms': self.prompt_token_ms,
+            'token_ms': self.token_ms,
+            'load_ms': self.load_ms,
+            'jitter': self.jitter
+        }
+
+def prompt_seed(seed, text):
+    """Per-prompt seed: same prompt -> same answer and latency"""
+    return seed ^ zlib.crc32(text.encode('utf-8'))
+
+def stub_answer_tokens(prompt, count, rng):
+    """Deterministic answer tokens built from words of the prompt"""
+    words = [w for w in prompt.split() if w.isalpha()] or list(FILLER_WORDS)
+    return [(" " if i else "") + (rng.choice(words) if i % 3 else rng.choice(FILLER_WORDS))
+            for i in range(count)]
+
+def messages_to_prompt(messages):
+    """Flatten /api/chat messages into one prompt string"""
+    return "\n".join(f"{m.get('role', 'user')}: {m.get('content', '')}" for m in messages)
+
+def _chunk_text(chunk):
+    """Text of one generate or chat response chunk"""
+    if 'response' in chunk:
+        return chunk['response']
+    return chunk.get('message', {}).get('content', '')
+
+def _timestamp():
+    return datetime.now(timezone.utc).isoformat()
+
+class StubStream:
+    """
+    Streaming response (iterator of chunks)
+    close() may be called from any thread, like dropping the HTTP connection: a generation
+    blocked in prompt evaluation or between tokens stops right away and frees its slot.
+    """
+
+    def __init__(self, chunks, closed):
+        self._chunks = chunks
+        self._closed = closed
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._closed.set()
+        try:
+            self._chunks.close()
+        except ValueError:
+            pass  # Running in another thread; it returns at its next wait
+
+class StubOllamaClient:
+    """
+    In-process stand-in for ollama.Client
+    failure_rate: fraction of generate/chat calls that raise StubOllamaError (seeded, reproducible)
+    """
+
+    def __init__(self, models=DEFAULT_MODELS, latency=None, response_tokens=DEFAULT_RESPONSE_TOKENS,
+                 parallel=1, failure_rate=0.0, seed=0):
+        self.models = list(models)
+        self.latency = latency or LatencyModel()
+        self.response_tokens = response_tokens
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self._failure_rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def list(self):
+        return {
+            'models': [
+                {'name': name, 'model': name, 'modified_at': _timestamp(), 'size': 0, 'digest': f"stub-{name}"}
+                for name in self.models
+            ]
+        }
+
+    def _check_model(self, model):
+        if not any(model in name for name in self.models):
+            raise StubOllamaError(f"model '{model}' not found, try pulling it first", 404)
+
+    def _should_fail(self):
+        with self._lock:
+            self.calls += 1
+            failed = self.failure_rate and self._failure_rng.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+            return failed
+
+    def _run(self, model, prompt, options, closed):
+        """Yield (token, final_stats) pairs; token is None on the last item. Stops early once `closed` is set"""
+        self._check_model(model)
+        if self._should_fail():
+            raise StubOllamaError("stub: injected failure", 500)
+
+        options = options or {}
+        rng = random.Random(prompt_seed(self.seed, prompt))
+        prompt_tokens = estimate_tokens(prompt)
+        num_predict = options.get('num_predict')
+        eval_tokens = self.response_tokens if num_predict is None else max(0, min(int(num_predict), self.response_tokens))
+
+        if self._slots:
+            while not self._slots.acquire(timeout=0.05):
+                if closed.is_set():
+                    return
+        try:
+            start = time.time()
+            if closed.wait(self.latency.prompt_seconds(prompt_tokens, rng)):
+                return
+            prompt_done = time.time()
+            for token in stub_answer_tokens(prompt, eval_tokens, rng):
+                if closed.wait(self.latency.token_seconds(rng)):
+                    return  # Caller hung up: free the slot like Ollama does on disconnect
+                yield token, None
+            end = time.time()
+        finally:
+            if self._slots:
+                self._slots.release()
+
+        yield None, {
+            'model': model,
+            'created_at': _timestamp(),
+            'done': True,
+            'done_reason': 'length' if num_predict is not None and eval_tokens >= int(num_predict) else 'stop',
+            'total_duration': int((end - start) * 1e9),
+            'load_duration': 0,
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int((prompt_done - start) * 1e9),
+            'eval_count': eval_tokens,
+            'eval_duration': int((end - prompt_done) * 1e9)
+        }
+
+    def _respond(self, model, prompt, options, stream, wrap):
+        closed = threading.Event()
+
+        def chunks():
+            for token, final in self._run(model, prompt, options, closed):
+                if final is None:
+                    yield dict(wrap(token), model=model, created_at=_timestamp(), done=False)
+                else:
+                    yield dict(final, **wrap(''))
+
+        if stream:
+            return StubStream(chunks(), closed)
+
+        text = []
+        for chunk in chunks():
+            if chunk['done']:
+                chunk.update(wrap(''.join(text)))
+                return chunk
+            text.append(_chunk_text(chunk))
+
+    def generate(self, model='', prompt='', options=None, stream=False, **kwargs):
+        """Same response shape as ollama.Client.generate (dict, or iterator of dicts when streaming)"""
+        return self._respond(model, prompt, options, stream, lambda text: {'response': text})
+
+    def chat(self, model='', messages=None, options=None, stream=False, **kwargs):
+        """Same response shape as ollama.Client.chat"""
+        prompt = messages_to_prompt(messages or [])
+        return self._respond(model, prompt, options, stream,
+                             lambda text: {'message': {'role': 'assistant', 'content': text}})
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'failures': self.failures}
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3.8
+"""
+Script benchmark tokenizer Markdown một lượt (md_parser) so với regex cascade cũ
+Đo tốc độ trên file lớn và kiểm tra chất lượng clean text:
+- snake_case có bị phá không
+- nội dung code block có lọt vào clean text không
+- dòng "# comment" trong code block có bị nhận nhầm là heading không
+
+Sử dụng:
+    python3.8 benchmark_md_parser.py                       # tài liệu tổng hợp ~5MB
+    python3.8 benchmark_md_parser.py docs/*.md --runs 5    # file thật
+    python3.8 benchmark_md_parser.py --size-mb 20
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
+
+from md_parser import parse_markdown
+
+def legacy_clean_markdown_content(content):
+    """clean_markdown_content() trước khi có md_parser (giữ lại để so sánh)"""
+    clean = content
+    clean = re.sub(r'^#{1,6}\s+', '', clean, flags=re.MULTILINE)
+    clean = re.sub(r'\*\*([^*]+)\*\*', r'\1', clean)
+    clean = re.sub(r'\*([^*]+)\*', r'\1', clean)
+    clean = re.sub(r'__([^_]+)__', r'\1', clean)
+    clean = re.sub(r'_([^_]+)_', r'\1', clean)
+    clean = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', clean)
+    clean = re.sub(r'```[^`]*```', '', clean, flags=re.DOTALL)
+    clean = re.sub(r'`([^`]+)`', r'\1', clean)
+    clean = re.sub(r'\n\s*\n', '\n\n', clean)
+    clean = re.sub(r' +', ' ', clean)
+    return clean.strip()
+
+def legacy_extract_headings(content):
+    """Phần regex của extract_metadata_from_md() cũ (không tính lần đọc file lại)"""
+    title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+    title = title_match.group(1).strip() if title_match else None
+    headings = re.findall(r'^(#{1,6})\s+(.+)$', content, re.MULTILINE)
+    return title, [(len(h[0]), h[1].strip()) for h in headings]
+
+def legacy_process(content):
+    return legacy_clean_markdown_content(content), legacy_extract_headings(content)
+
+SENTENCES = [
+    "Hệ thống RAG Copilot hỗ trợ tra cứu tài liệu nội bộ bằng tiếng Việt và tiếng Anh.",
+    "Cấu hình biến max_retry_count và connection_timeout_ms trong file settings.",
+    "The **vector database** is rebuilt *incrementally* when documents change.",
+    "Xem [hướng dẫn cài đặt](https://example.com/install_guide) để biết thêm chi tiết.",
+    "Hàm `load_vector_database()` trả về index, metadata và chunks.",
+    "Use __init__ style names like user_id or api_key_name without breaking them.",
+    "Đây là đoạn văn _nhấn mạnh_ và __in đậm__ theo cú pháp gạch dưới.",
+]
+
+CODE_BLOCKS = [
+    "```bash\n# cài đặt dependencies\npip3.8 install faiss-cpu sentence-transformers\nexport RAG_BATCH_SIZE=64\n```",
+    "```python\n# load model\nmodel = get_embedder()\nresult_list = [x_value * 2 for x_value in items]\n```",
+    "```\n## không phải heading\nSELECT user_id, created_at FROM audit_log;\n```",
+]
+
+def generate_document(size_mb, seed=42):
+    """Tài liệu Markdown tổng hợp: headings, đoạn văn, code block, links, snake_case"""
+    rng = random.Random(seed)
+    parts = ["# Tài liệu benchmark\n"]
+    size = 0
+    section = 0
+    target = int(size_mb * 1024 * 1024)
+    while size < target:
+        section += 1
+        block = [f"\n## Phần {section}: cấu hình hệ thống\n"]
+        for _ in range(rng.randint(2, 5)):
+            block.append(' '.join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 8))) + "\n")
+            if rng.random() < 0.4:
+                block.append(rng.choice(CODE_BLOCKS) + "\n")
+            if rng.random() < 0.3:
+                block.append(f"\n### Mục {section}.{rng.randint(1, 9)}\n")
+        text = '\n'.join(block)
+        parts.append(text)
+        size += len(text.encode('utf-8'))
+    return ''.join(parts)
+
+def time_function(func, content, runs):
+    """Thời gian chạy (giây) của từng lần"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(content)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def quality_report(content, legacy_clean, legacy_headings, parsed):
+    """So sánh chất lượng: snake_case, code block bị lọt, heading giả"""
+    identifiers = set(re.findall(r'\b[a-z]+(?:_[a-z]+)+\b', re.sub(r'```.*?```', '', content, flags=re.DOTALL)))
+    code_lines = set()
+    for block in re.findall(r'```[^\n]*\n(.*?)```', content, flags=re.DOTALL):
+        code_lines.update(line.strip() for line in block.split('\n') if len(line.strip()) > 10)
+
+    def snake_kept(clean):
+        words = set(re.findall(r'\b\w+\b', clean))
+        return sum(1 for ident in identifiers if ident in words)
+
+    def code_leaked(clean):
+        return sum(1 for line in code_lines if line in clean)
+
+    new_headings = [(h['level'], h['text']) for h in parsed['headings']]
+    real_headings = len(re.findall(r'^#{1,6}\s', re.sub(r'```.*?```', '', content, flags=re.DOTALL), re.MULTILINE))
+
+    return {
+        'snake_case_total': len(identifiers),
+        'snake_case_kept': (snake_kept(legacy_clean), snake_kept(parsed['clean_text'])),
+        'code_lines_total': len(code_lines),
+        'code_lines_leaked': (code_leaked(legacy_clean), code_leaked(parsed['clean_text'])),
+        'headings_expected': real_headings,
+        'headings_found': (len(legacy_headings), len(new_headings))
+    }
+
+def benchmark(name, content, runs):
+    """Benchmark một tài liệu và in kết quả"""
+    size_mb = len(content.encode('utf-8')) / (1024 * 1024)
+    print(f"\n📄 {name}: {size_mb:.2f} MB, {content.count(chr(10)) + 1} dòng")
+
+    legacy_times = time_function(legacy_process, content, runs)
+    new_times = time_function(parse_markdown, content, runs)
+
+    legacy_median = statistics.median(legacy_times)
+    new_median = statistics.median(new_times)
+    print(f"   Regex cascade cũ : {legacy_median * 1000:9.1f} ms  ({size_mb / legacy_median:6.1f} MB/s)")
+    print(f"   md_parser        : {new_median * 1000:9.1f} ms  ({size_mb / new_median:6.1f} MB/s)")
+    print(f"   Tăng tốc         : {legacy_median / new_median:.2f}x (median {runs} lần)")
+
+    legacy_clean, (_, legacy_headings) = legacy_process(content)
+    parsed = parse_markdown(content)
+    quality = quality_report(content, legacy_clean, legacy_headings, parsed)
+    print("   Chất lượng (cũ / mới):")
+    print(f"   - snake_case giữ nguyên : {quality['snake_case_kept'][0]} / {quality['snake_case_kept'][1]} "
+          f"(tổng {quality['snake_case_total']})")
+    print(f"   - dòng code bị lọt      : {quality['code_lines_leaked'][0]} / {quality['code_lines_leaked'][1]} "
+          f"(tổng {quality['code_lines_total']})")
+    print(f"   - headings              : {quality['headings_found'][0]} / {quality['headings_found'][1]} "
+          f"(thực tế {quality['headings_expected']})")
+    print(f"   - code blocks / links   : {len(parsed['code_blocks'])} / {len(parsed['links'])}")
+
+    return legacy_median, new_median
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark md_parser so với regex cascade cũ")
+    parser.add_argument("files", nargs='*', help="File .md để benchmark (mặc định: tài liệu tổng hợp)")
+    parser.add_argument("--size-mb", type=float, default=5.0, help="Kích thước tài liệu tổng hợp (MB)")
+    parser.add_argument("--runs", type=int, default=3, help="Số lần chạy mỗi hàm")
+    args = parser.parse_args()
+
+    print("=== BENCHMARK MARKDOWN PARSER ===")
+
+    documents = []
+    for file_path in args.files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            documents.append((file_path, f.read()))
+    if not documents:
+        documents.append((f"synthetic_{args.size_mb:g}MB.md", generate_document(args.size_mb)))
+
+    total_legacy = total_new = 0.0
+    for name, content in documents:
+        legacy_time, new_time = benchmark(name, content, args.runs)
+        total_legacy += legacy_time
+        total_new += new_time
+
+    if len(documents) > 1:
+        print(f"\n📊 Tổng: cũ {total_legacy * 1000:.1f} ms, mới {total_new * 1000:.1f} ms "
+              f"({total_legacy / total_new:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3.8
+"""
+Script benchmark tách câu / tách từ (text_segmenter) so với regex cũ
+- Tốc độ (MB/s) tách câu và tách từ
+- Độ chính xác ranh giới câu trên tài liệu tổng hợp có nhãn (viết tắt, số thập phân, URL, danh sách)
+- Số chunk bị cắt giữa câu khi chia bằng cửa sổ trượt
+- Kích thước từ vựng keyword (số keyword khác nhau -> kích thước keyword index)
+
+Sử dụng:
+    python3.8 benchmark_segmenter.py                      # tài liệu tổng hợp ~2MB
+    python3.8 benchmark_segmenter.py --size-mb 10 --runs 5
+    python3.8 benchmark_segmenter.py --file /opt/rag-copilot/output/doc_processed.jsonl
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
+
+from text_segmenter import sentence_spans, tokenize, keyword_terms
+from sliding_window import estimate_token_counts, window_boundaries
+from stage_io import read_stage
+
+LEGACY_STOP_WORDS = {
+    'và', 'hoặc', 'nhưng', 'vì', 'nên', 'để', 'từ', 'trong', 'trên', 'dưới', 'với', 'của', 'cho', 'về',
+    'the', 'and', 'or', 'but', 'for', 'with', 'from', 'to', 'in', 'on', 'at', 'by', 'as', 'is', 'are',
+    'this', 'that', 'these', 'those', 'a', 'an'
+}
+LEGACY_SPLIT_PATTERN = re.compile(r'[.!?]+\s+')
+
+def legacy_sentence_spans(text):
+    """Tách câu cũ của chunk_by_sentences: re.split(r'[.!?]+\\s+')"""
+    spans = []
+    start = 0
+    for match in LEGACY_SPLIT_PATTERN.finditer(text):
+        spans.append((start, match.end()))
+        start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+def legacy_tokenize(text):
+    """Tách từ cũ của extract_keywords: mỗi âm tiết là một từ"""
+    return re.findall(r'\w+', text.lower())
+
+def legacy_keyword_terms(text):
+    return [word for word in legacy_tokenize(text) if len(word) >= 3 and word not in LEGACY_STOP_WORDS]
+
+SENTENCES = [
+    "Công ty có trụ sở tại TP. Hồ Chí Minh và văn phòng tại Hà Nội.",
+    "Liên hệ ThS. Nguyễn Văn An để được hỗ trợ cài đặt hệ thống.",
+    "Phiên bản 3.5 của mô hình cải thiện tốc độ truy vấn khoảng 2.5 lần.",
+    "Xem hướng dẫn tại https://docs.example.com/rag/setup.html trước khi triển khai.",
+    "The index supports many formats, e.g. FAISS, Annoy and HNSW.",
+    "Dr. Smith reviewed the security policy on Jan. 15 with the U.S. team.",
+    "Người dùng cần đổi mật khẩu tài khoản sau 90 ngày làm việc.",
+    "Cơ sở dữ liệu được sao lưu tự động mỗi đêm lúc 2 giờ sáng.",
+    "Các tài liệu nội bộ, quy trình, biểu mẫu v.v. được lưu trong thư mục chung.",
+    "Does the vector database rebuild incrementally?",
+    "Chính sách nghỉ phép áp dụng cho toàn bộ nhân viên chính thức!",
+    "Set max_retry_count to 5 and connection_timeout_ms to 1500 in settings.yaml.",
+]
+
+LIST_ITEMS = [
+    "1. Cài đặt dependencies và cấu hình biến môi trường",
+    "2. Khởi tạo cơ sở dữ liệu vector",
+    "3. Chạy kiểm tra hệ thống",
+]
+
+def generate_document(size_mb, seed=42):
+    """Tài liệu tổng hợp và vị trí các ranh giới câu thật (offset bắt đầu câu)"""
+    rng = random.Random(seed)
+    parts = []
+    boundaries = set()
+    length = 0
+    target = int(size_mb * 1024 * 1024)
+    while length < target:
+        if rng.random() < 0.1:
+            items = '\n'.join(LIST_ITEMS)
+            offset = length
+            for item in LIST_ITEMS:
+                boundaries.add(offset)
+                offset += len(item) + 1
+            piece = items + '\n'
+        else:
+            sentences = [rng.choice(SENTENCES) for _ in range(rng.randint(3, 8))]
+            offset = length
+            for sentence in sentences:
+                boundaries.add(offset)
+                offset += len(sentence) + 1
+            piece = ' '.join(sentences) + '\n'
+        parts.append(piece)
+        length += len(piece)
+    boundaries.discard(0)
+    return ''.join(parts), boundaries
+
+def boundary_quality(spans, truth):
+    """Precision/recall của ranh giới câu (offset bắt đầu câu, trừ câu đầu)"""
+    found = {start for start, _ in spans[1:]}
+    correct = len(found & truth)
+    return {
+        'precision': correct / len(found) if found else 0.0,
+        'recall': correct / len(truth) if truth else 0.0,
+        'false_splits': len(found - truth),
+        'missed': len(truth - found)
+    }
+
+def chunk_quality(text, spans, truth, window_tokens, overlap_tokens):
+    """Số chunk và số chunk bị cắt giữa câu khi chia theo cửa sổ trượt trên các span"""
+    counts = estimate_token_counts([text[s:e] for s, e in spans])
+    windows = window_boundaries(counts, window_tokens, overlap_tokens)
+    sentence_starts = truth | {0}
+    broken = 0
+    for first, last in windows:
+        end = spans[last - 1][1]
+        if spans[first][0] not in sentence_starts or (end < len(text) and end not in sentence_starts):
+            broken += 1
+    return len(windows), broken
+
+def time_function(func, text, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text_segmenter so với regex cũ")
+    parser.add_argument("--size-mb", type=float, default=2.0, help="Kích thước tài liệu tổng hợp (MB)")
+    parser.add_argument("--runs", type=int, default=3, help="Số lần chạy mỗi hàm")
+    parser.add_argument("--file", help="File *_processed.jsonl thật (chỉ đo tốc độ và từ vựng)")
+    parser.add_argument("--window-tokens", type=int, default=800)
+    parser.add_argument("--overlap-tokens", type=int, default=100)
+    args = parser.parse_args()
+
+    print("=== BENCHMARK TEXT SEGMENTER ===")
+
+    truth = None
+    if args.file:
+        text = read_stage(args.file)['clean_content']
+        name = args.file
+    else:
+        text, truth = generate_document(args.size_mb)
+        name = f"synthetic_{args.size_mb:g}MB"
+
+    size_mb = len(text.encode('utf-8')) / (1024 * 1024)
+    print(f"\n📄 {name}: {size_mb:.2f} MB")
+
+    print("\n⏱️  Tốc độ (median):")
+    for label, legacy, new in (('Tách câu', legacy_sentence_spans, sentence_spans),
+                               ('Tách từ ', legacy_tokenize, tokenize)):
+        legacy_time = time_function(legacy, text, args.runs)
+        new_time = time_function(new, text, args.runs)
+        print(f"   {label}: cũ {size_mb / legacy_time:7.1f} MB/s | mới {size_mb / new_time:7.1f} MB/s "
+              f"({new_time / legacy_time:.2f}x thời gian)")
+
+    legacy_spans = legacy_sentence_spans(text)
+    new_spans = sentence_spans(text)
+    print(f"\n✂️  Số câu: cũ {len(legacy_spans)} | mới {len(new_spans)}")
+
+    if truth is not None:
+        print(f"   Ranh giới thật: {len(truth)}")
+        for label, spans in (('cũ ', legacy_spans), ('mới', new_spans)):
+            quality = boundary_quality(spans, truth)
+            chunks, broken = chunk_quality(text, spans, truth, args.window_tokens, args.overlap_tokens)
+            print(f"   {label}: precision {quality['precision']:.3f}, recall {quality['recall']:.3f}, "
+                  f"tách sai {quality['false_splits']}, bỏ sót {quality['missed']} | "
+                  f"{chunks} chunks, {broken} bị cắt giữa câu")
+
+    legacy_vocabulary = set(legacy_keyword_terms(text))
+    new_terms = keyword_terms(text)
+    new_vocabulary = set(new_terms)
+    compounds = sum(1 for term in new_vocabulary if '_' in term and not term.isascii())
+    print(f"\n🔤 Từ vựng keyword: cũ {len(legacy_vocabulary)} | mới {len(new_vocabulary)} "
+          f"({compounds} từ ghép tiếng Việt)")
+    print(f"   Keyword/token trung bình: cũ {len(legacy_keyword_terms(text)) / max(len(legacy_tokenize(text)), 1):.2f} | "
+          f"mới {len(new_terms) / max(len(tokenize(text)), 1):.2f}")
+
+if __name__ == "__main__":
+    main()
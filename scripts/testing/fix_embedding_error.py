@@ -35,7 +35,7 @@ def main():
     print("=" * 60)
     
     # Định nghĩa các file paths
-    metadata_file = "/opt/rag-copilot/output/AI-Starter-Kit_with_metadata.json"
+    metadata_file = "/opt/rag-copilot/output/AI-Starter-Kit_with_metadata.jsonl"
     
     print(f"📁 Working with metadata file: {metadata_file}")
     
@@ -82,10 +82,10 @@ def main():
         
         print(f"\n📁 Output files location: {output_dir}")
         print("📄 Key files:")
-        print("   - embedding_ready.json (for US-003)")
-        print("   - complete.json (full backup)")
-        print("   - chunks_summary.csv (human-readable)")
+        print("   - complete.jsonl (chunk store)")
+        print("   - embedding_ready.json (for US-003, created by the prepare step)")
         print("   - processing_report.json (summary)")
+        print("   - chunks_summary.csv: save_processed_data.py <output_dir> --views csv")
         
     else:
         print("\n❌ EMBEDDING PREPARATION STILL HAS ISSUES")
@@ -11,6 +11,10 @@ import pickle
 from pathlib import Path
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
+
+from dedup_chunks import DEFAULT_THRESHOLD, deduplicate_embedding_data
+
 def validate_embedding_ready_format(file_path):
     """Validate format của embedding_ready.json"""
     print(f"🔍 Validating embedding_ready format: {file_path}")
@@ -84,6 +88,12 @@ def validate_embedding_ready_format(file_path):
                     print(f"❌ Metadata {i} missing required field: {field}")
                     return False
         
+        # Kiểm tra tham số chunking: mọi chunk phải được chia với cùng window/overlap
+        chunking_settings = {json.dumps(meta.get('chunking'), sort_keys=True) for meta in metadata}
+        if len(chunking_settings) > 1:
+            print(f"❌ Chunks were created with {len(chunking_settings)} different chunking settings")
+            return False
+        
         print(f"✅ Embedding ready format is valid")
         print(f"   - Documents: {len(documents)}")
         print(f"   - Metadata: {len(metadata)}")
@@ -186,8 +196,30 @@ def analyze_text_content(embedding_ready_file):
         print(f"❌ Error analyzing text content: {str(e)}")
         return None
 
-def create_embedding_config(output_dir):
-    """Tạo config file cho embedding phase"""
+def get_chunking_params(embedding_ready_file):
+    """Tham số chunking ghi trong metadata của chunks (None với dữ liệu cũ không overlap)"""
+    with open(embedding_ready_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    for meta in data['metadata']:
+        if meta.get('chunking'):
+            return meta['chunking']
+    return None
+
+def analyze_duplicates(embedding_ready_file):
+    """Tỉ lệ chunk trùng / gần trùng (MinHash + LSH) sẽ bị bỏ khi embedding với remove_duplicates"""
+    print(f"🔎 Analyzing near-duplicate chunks...")
+    
+    with open(embedding_ready_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    stats = deduplicate_embedding_data(data)['dedup']
+    print(f"   - Duplicates: {stats['duplicates_removed']}/{stats['total_chunks']} chunks "
+          f"({stats['dedup_ratio']:.1%}, threshold {stats['threshold']})")
+    return stats
+
+def create_embedding_config(output_dir, chunking=None):
+    """Tạo config file cho embedding phase (chunk size/overlap lấy từ tham số chunking thực tế)"""
     print(f"⚙️ Creating embedding configuration...")
     
     config = {
@@ -203,9 +235,12 @@ def create_embedding_config(output_dir):
             "persist_directory": "/opt/rag-copilot/vector_store"
         },
         "processing_config": {
-            "chunk_overlap": 0,
+            "chunk_size": chunking['window_tokens'] if chunking else None,
+            "chunk_overlap": chunking['overlap_tokens'] if chunking else 0,
+            "chunking": chunking,
             "normalize_embeddings": True,
-            "remove_duplicates": True
+            "remove_duplicates": True,
+            "dedup_threshold": DEFAULT_THRESHOLD
         },
         "created_at": datetime.now().isoformat(),
         "ready_for_us003": True
@@ -234,11 +269,12 @@ def main():
     print("=" * 60)
     print(f"Final output directory: {final_output_dir}")
     
-    # Test files
-    embedding_ready_file = Path(final_output_dir) / "embedding_ready.json"
-    
-    if not embedding_ready_file.exists():
-        print(f"❌ embedding_ready.json not found: {embedding_ready_file}")
+    # Test files: embedding_ready.json là view của chunk store, tạo khi chưa có hoặc đã cũ
+    from save_processed_data import ensure_view
+    try:
+        embedding_ready_file = ensure_view(final_output_dir, 'embedding')
+    except Exception as e:
+        print(f"❌ embedding_ready.json not available: {e}")
         sys.exit(1)
     
     # Validation steps
@@ -254,9 +290,18 @@ def main():
     analysis = analyze_text_content(embedding_ready_file)
     results['content_analysis'] = analysis is not None
     
-    # Step 4: Create config
+    # Step 4: Near-duplicates (thông tin, không làm fail)
+    duplicates = analyze_duplicates(embedding_ready_file) if results['format_valid'] else None
+    
+    # Step 5: Create config
     if all(results.values()):
-        config_file = create_embedding_config(final_output_dir)
+        chunking = get_chunking_params(embedding_ready_file)
+        if chunking:
+            print(f"🪟 Chunking: {chunking['window_tokens']} tokens, overlap {chunking['overlap_tokens']} tokens "
+                  f"({chunking['tokenizer']})")
+        else:
+            print("⚠️ Chunks have no chunking params (legacy, non-overlapping)")
+        config_file = create_embedding_config(final_output_dir, chunking)
         results['config_created'] = config_file.exists()
     else:
         results['config_created'] = False
@@ -286,6 +331,7 @@ def main():
             "final_output_dir": final_output_dir,
             "validation_results": results,
             "content_analysis": analysis,
+            "duplicate_analysis": duplicates,
             "ready_for_us003": overall_success
         }
         
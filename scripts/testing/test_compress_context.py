@@ -0,0 +1,69 @@
+#!/usr/bin/env python3.8
+"""
+Test nén context (compress_context.compress_contexts) với encoder giả
+- câu dài hơn ngân sách token được giữ lại (cắt ngắn), không bị bỏ
+- không bao giờ trả về ít context hơn đầu vào
+- tổng token sau nén không vượt quá max_tokens (cộng phần "..." khi cắt)
+
+Sử dụng:
+    python3.8 -m pytest test_compress_context.py
+    python3.8 test_compress_context.py
+"""
+
+import os
+import sys
+import zlib
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rag'))
+
+from compress_context import compress_contexts, estimate_tokens
+
+DIMENSION = 16
+
+class FakeEncoder:
+    """Vector cố định theo nội dung câu (không cần sentence-transformers)"""
+
+    def encode(self, sentences):
+        rows = [np.random.RandomState(zlib.crc32(s.encode('utf-8'))).rand(DIMENSION) for s in sentences]
+        return np.asarray(rows, dtype=np.float32)
+
+def make_context(content):
+    return {'content': content, 'source': 'doc.md', 'metadata': {'title': 'Doc'}}
+
+def compress(contexts, max_tokens=600):
+    query = FakeEncoder().encode(["nghỉ phép"])[0]
+    return compress_contexts(contexts, query, FakeEncoder(), max_tokens=max_tokens)
+
+def test_oversize_sentence_is_truncated():
+    run = "x" * 3200  # 800 tokens, không có dấu câu
+    compressed, stats = compress([make_context(run)])
+    assert len(compressed) == 1
+    assert compressed[0]['content'].startswith("x" * 100)
+    assert compressed[0]['metadata']['truncated']
+    assert 0 < stats['compressed_tokens'] <= 601
+
+def test_short_item_does_not_hide_long_run():
+    content = "- item one\n" + "y" * 3200
+    compressed, _ = compress([make_context(content)])
+    assert len(compressed) == 1
+    assert "y" * 100 in compressed[0]['content']
+
+def test_every_context_kept():
+    contexts = [make_context("z" * 3200), make_context("Câu ngắn. Câu khác."), make_context("w" * 2000),
+                make_context("")]
+    compressed, stats = compress(contexts, max_tokens=300)
+    assert len(compressed) == len(contexts)
+    assert all(ctx['content'] for ctx in compressed[:3])
+    assert sum(estimate_tokens(ctx['content']) for ctx in compressed) <= 300 + len(contexts)
+
+def main():
+    test_oversize_sentence_is_truncated()
+    test_short_item_does_not_hide_long_run()
+    test_every_context_kept()
+    print("✅ Nén context: câu quá dài được cắt ngắn, không mất context nào")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,10 @@ import time
 from datetime import datetime
 from pathlib import Path
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
+
+from stage_io import read_stage, default_extension
+
 def log_message(message, log_file):
     """Ghi log message với timestamp"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -79,6 +83,24 @@ def validate_json_file(file_path, log_file, expected_structure=None):
         log_message(f"❌ JSON INVALID: {file_path} - {str(e)}", log_file)
         return False, None
 
+def validate_stage_file(file_path, log_file, expected_structure=None):
+    """Validate file trung gian (JSON Lines / msgpack) giữa các bước"""
+    try:
+        data = read_stage(file_path)
+        
+        if expected_structure:
+            for key in expected_structure:
+                if key not in data:
+                    log_message(f"❌ STAGE VALIDATION: Missing key '{key}' in {file_path}", log_file)
+                    return False, None
+        
+        log_message(f"✅ STAGE VALID: {file_path}", log_file)
+        return True, data
+        
+    except Exception as e:
+        log_message(f"❌ STAGE INVALID: {file_path} - {str(e)}", log_file)
+        return False, None
+
 def test_full_pipeline(input_md_file, base_dir="/opt/rag-copilot"):
     """Test toàn bộ pipeline từ MD file đến final output"""
     
@@ -116,14 +138,15 @@ def test_full_pipeline(input_md_file, base_dir="/opt/rag-copilot"):
         
         # Check processed file
         file_name = Path(input_md_file).stem
-        processed_file = f"{base_dir}/output/{file_name}_processed.json"
+        extension = default_extension()
+        processed_file = f"{base_dir}/output/{file_name}_processed{extension}"
         if not check_file_exists(processed_file, log_file, "Processed MD file"):
             test_results['errors'].append("Processed file not created")
             return test_results
         test_results['files_created'].append(processed_file)
         
-        # Validate processed JSON
-        valid, processed_data = validate_json_file(processed_file, log_file, 
+        # Validate processed file
+        valid, processed_data = validate_stage_file(processed_file, log_file, 
                                                  ['metadata', 'clean_content', 'stats'])
         if not valid:
             test_results['errors'].append("Invalid processed JSON")
@@ -140,14 +163,14 @@ def test_full_pipeline(input_md_file, base_dir="/opt/rag-copilot"):
             return test_results
         
         # Check chunked file
-        chunked_file = f"{base_dir}/output/{file_name}_simple_chunked.json"
+        chunked_file = f"{base_dir}/output/{file_name}_simple_chunked{extension}"
         if not check_file_exists(chunked_file, log_file, "Chunked file"):
             test_results['errors'].append("Chunked file not created")
             return test_results
         test_results['files_created'].append(chunked_file)
         
-        # Validate chunked JSON
-        valid, chunked_data = validate_json_file(chunked_file, log_file, 
+        # Validate chunked file
+        valid, chunked_data = validate_stage_file(chunked_file, log_file, 
                                                 ['chunks', 'stats', 'original_metadata'])
         if not valid:
             test_results['errors'].append("Invalid chunked JSON")
@@ -164,14 +187,14 @@ def test_full_pipeline(input_md_file, base_dir="/opt/rag-copilot"):
             return test_results
         
         # Check metadata file
-        metadata_file = f"{base_dir}/output/{file_name}_with_metadata.json"
+        metadata_file = f"{base_dir}/output/{file_name}_with_metadata{extension}"
         if not check_file_exists(metadata_file, log_file, "Metadata file"):
             test_results['errors'].append("Metadata file not created")
             return test_results
         test_results['files_created'].append(metadata_file)
         
-        # Validate metadata JSON
-        valid, metadata_data = validate_json_file(metadata_file, log_file, 
+        # Validate metadata file
+        valid, metadata_data = validate_stage_file(metadata_file, log_file, 
                                                  ['enhanced_chunks', 'metadata_stats'])
         if not valid:
             test_results['errors'].append("Invalid metadata JSON")
@@ -193,13 +216,9 @@ def test_full_pipeline(input_md_file, base_dir="/opt/rag-copilot"):
             test_results['errors'].append("Final output directory not created")
             return test_results
         
-        # Check all expected files in final output
+        # Check all expected files in final output (chunk store + report; views are created on demand)
         expected_files = [
-            f"{file_name}_complete.json",
-            "chunks_summary.csv",
-            "embedding_ready.json",
-            "search_index.json",
-            "processed_data.pkl",
+            f"{file_name}_complete{extension}",
             "processing_report.json"
         ]
         
@@ -258,15 +277,14 @@ def test_full_pipeline(input_md_file, base_dir="/opt/rag-copilot"):
                 test_results['errors'].append("Quality check failed: Not ready for US-003")
                 return test_results
         
-        # Test CSV loading
-        csv_file = Path(final_dir) / "chunks_summary.csv"
-        cmd_csv = f"python3.8 -c \"import pandas as pd; df = pd.read_csv('{csv_file}'); print(f'CSV loaded: {{len(df)}} rows')\""
-        success_csv, output_csv = run_command(cmd_csv, log_file, "CSV validation")
-        
-        # Test pickle loading
-        pickle_file = Path(final_dir) / "processed_data.pkl"
-        cmd_pickle = f"python3.8 -c \"import pickle; data = pickle.load(open('{pickle_file}', 'rb')); print(f'Pickle loaded: {{len(data[\\\"enhanced_chunks\\\"])}} chunks')\""
-        success_pickle, output_pickle = run_command(cmd_pickle, log_file, "Pickle validation")
+        # Test on-demand views (CSV, search index, pickle) derived from the chunk store
+        cmd_views = f"python3.8 {base_dir}/scripts/processing/save_processed_data.py {final_dir} --views csv,search,pickle"
+        success_views, output_views = run_command(cmd_views, log_file, "View export and loading")
+        if success_views:
+            for view_file in ("chunks_summary.csv", "search_index.json", "processed_data.pkl"):
+                test_results['files_created'].append(str(Path(final_dir) / view_file))
+        else:
+            test_results['errors'].append("View export failed")
         
         # Final statistics
         log_message("\n📊 PIPELINE STATISTICS", log_file)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3.8
+"""
+Test ranh giới cửa sổ trượt (sliding_window.window_boundaries)
+- end của các cửa sổ tăng dần (không có cửa sổ là tập con của cửa sổ trước)
+- phần lặp lại giữa hai cửa sổ liên tiếp <= overlap_tokens (kể cả cửa sổ cuối bị kéo lùi)
+- các cửa sổ phủ toàn bộ dãy đơn vị
+
+Sử dụng:
+    python3.8 -m pytest test_sliding_window.py
+    python3.8 test_sliding_window.py --cases 5000
+"""
+
+import os
+import sys
+import random
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
+
+from sliding_window import window_boundaries, sliding_window_chunks
+
+def check_windows(token_counts, window_tokens, overlap_tokens, min_tokens):
+    """Kiểm tra các tính chất của window_boundaries, trả về danh sách lỗi"""
+    windows = window_boundaries(token_counts, window_tokens, overlap_tokens, min_tokens)
+    cumulative = np.concatenate(([0.0], np.cumsum(token_counts, dtype=np.float64)))
+    errors = []
+    if not windows:
+        return ["no windows"] if len(token_counts) else []
+    if windows[0][0] != 0 or windows[-1][1] != len(token_counts):
+        errors.append(f"windows do not cover all units: {windows}")
+    for (prev_start, prev_end), (start, end) in zip(windows, windows[1:]):
+        if end <= prev_end:
+            errors.append(f"end not increasing: {(prev_start, prev_end)} -> {(start, end)}")
+        if start <= prev_start or start > prev_end:
+            errors.append(f"start out of range: {(prev_start, prev_end)} -> {(start, end)}")
+        overlap = cumulative[prev_end] - cumulative[start] if start < prev_end else 0.0
+        if overlap > overlap_tokens + 1e-9:
+            errors.append(f"overlap {overlap:.1f} > {overlap_tokens}: {(prev_start, prev_end)} -> {(start, end)}")
+    return errors
+
+def random_case(rng):
+    window_tokens = rng.choice([50, 100, 200, 800])
+    overlap_tokens = rng.randint(0, window_tokens // 2)
+    min_tokens = rng.randint(0, window_tokens // 2)
+    counts = [rng.choice([rng.uniform(1, 30), rng.uniform(1, window_tokens * 1.5)]) for _ in range(rng.randint(1, 60))]
+    return counts, window_tokens, overlap_tokens, min_tokens
+
+def test_large_unit_after_window():
+    text = 'Câu một ngắn. ' * 30 + 'x' * 3000 + '. Tiếp theo.'
+    chunks = sliding_window_chunks(text)
+    ends = [chunk['end'] for chunk in chunks]
+    assert ends == sorted(set(ends))
+    assert all(chunk['overlap_tokens'] <= 100 for chunk in chunks)
+
+def test_tail_pull_back_respects_overlap():
+    counts = [10.0] * 10 + [700.0] + [10.0]
+    assert not check_windows(counts, 800, 100, 200)
+
+def test_random_windows(cases=2000, seed=0):
+    rng = random.Random(seed)
+    for _ in range(cases):
+        counts, window_tokens, overlap_tokens, min_tokens = random_case(rng)
+        errors = check_windows(counts, window_tokens, overlap_tokens, min_tokens)
+        assert not errors, (counts, window_tokens, overlap_tokens, min_tokens, errors[:3])
+
+def main():
+    parser = argparse.ArgumentParser(description="Test ranh giới cửa sổ trượt")
+    parser.add_argument("--cases", type=int, default=5000, help="Số trường hợp ngẫu nhiên")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    test_large_unit_after_window()
+    test_tail_pull_back_respects_overlap()
+    test_random_windows(args.cases, args.seed)
+    print(f"✅ {args.cases} trường hợp ngẫu nhiên: end tăng dần, overlap <= overlap_tokens")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
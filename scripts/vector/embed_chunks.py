@@ -1,7 +1,7 @@
 #!/usr/bin/env python3.8
 """
 US-003 Step 3: Generate embeddings for document chunks
-Process embedding_ready.json from US-002 and create vector embeddings
+Process the US-002 chunk store (or embedding_ready.json) and create vector embeddings
 """
 
 import json
@@ -9,8 +9,15 @@ import numpy as np
 import pickle
 import os
 import sys
+import time
+import argparse
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
+from embedder_factory import get_embedder
+from embedding_backend import MODEL_NAME
+from embedding_checkpoint import EmbeddingCheckpoint, fingerprint_run, remove_checkpoint
+
+# The chunk store and its views are defined in scripts/processing
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
 
 def log_message(message, level="INFO"):
     """Log messages with timestamp"""
@@ -18,15 +25,18 @@ def log_message(message, level="INFO"):
     print(f"[{timestamp}] [{level}] {message}")
 
 def load_embedding_ready_data(file_path):
-    """Load the embedding_ready.json file from US-002"""
+    """
+    Load embedding-ready data from US-002: a *_final_output directory, its
+    *_complete.jsonl chunk store or an embedding_ready.json file
+    """
     log_message(f"Loading embedding data from: {file_path}")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        from save_processed_data import load_embedding_ready
+        data = load_embedding_ready(file_path)
         
         log_message(f"✅ Data loaded successfully")
-        log_message(f"   - Total chunks: {len(data.get('chunks', []))}")
+        log_message(f"   - Total chunks: {len(data.get('chunks') or data.get('documents', []))}")
         log_message(f"   - Source file: {data.get('source_file', 'Unknown')}")
         
         return data
@@ -34,12 +44,52 @@ def load_embedding_ready_data(file_path):
         log_message(f"❌ Failed to load data: {str(e)}", "ERROR")
         return None
 
+def load_dedup_settings(input_path):
+    """remove_duplicates / dedup_threshold from the embedding_config.json written by prepare_embedding"""
+    from dedup_chunks import DEFAULT_THRESHOLD
+    
+    settings = {'remove_duplicates': True, 'dedup_threshold': DEFAULT_THRESHOLD}
+    config_dir = input_path if os.path.isdir(input_path) else os.path.dirname(os.path.abspath(input_path))
+    config_file = os.path.join(config_dir, "embedding_config.json")
+    if os.path.exists(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            processing_config = json.load(f).get('processing_config', {})
+        settings.update((key, processing_config[key]) for key in settings if key in processing_config)
+    return settings
+
+def remove_duplicate_chunks(data, threshold):
+    """Drop near-duplicate documents before embedding; dropped chunks become aliases of the kept one"""
+    from dedup_chunks import deduplicate_embedding_data
+    
+    log_message(f"Removing near-duplicate chunks (threshold {threshold})...")
+    data = deduplicate_embedding_data(data, threshold)
+    stats = data['dedup']
+    log_message(f"✅ Dedup: {stats['unique_chunks']}/{stats['total_chunks']} chunks kept, "
+                f"{stats['duplicates_removed']} removed ({stats['dedup_ratio']:.1%})")
+    return data
+
+def build_chunk_records(data):
+    """
+    Chunk dicts (id, content, source, metadata) from embedding-ready data, so sources and
+    aliases reach retrieval; plain document strings when there is no metadata
+    """
+    documents = data.get('documents', [])
+    metadata = data.get('metadata')
+    ids = data.get('ids')
+    if not metadata or not ids:
+        return documents
+    
+    return [
+        {'id': chunk_id, 'content': document, 'source': meta.get('source_file'), 'metadata': meta}
+        for chunk_id, document, meta in zip(ids, documents, metadata)
+    ]
+
 def initialize_embedding_model():
     """Initialize the sentence transformer model"""
     log_message("Initializing embedding model...")
     
     try:
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        model = get_embedder()
         log_message("✅ Model loaded successfully")
         log_message(f"   - Model: all-MiniLM-L6-v2")
         log_message(f"   - Embedding dimension: {model.get_sentence_embedding_dimension()}")
@@ -49,42 +99,168 @@ def initialize_embedding_model():
         log_message(f"❌ Failed to load model: {str(e)}", "ERROR")
         return None
 
-def generate_embeddings(model, chunks):
-    """Generate embeddings for all chunks"""
+def extract_texts(chunks):
+    """Extract text content from chunks"""
+    texts = []
+    for i, chunk in enumerate(chunks):
+        # Handle both dict (chunks) and string (documents) formats
+        if isinstance(chunk, dict):
+            text = chunk.get('content', chunk.get('text', ''))
+        else:
+            text = str(chunk)
+        
+        if not text:
+            log_message(f"⚠️  Chunk {i} has no content", "WARNING")
+            text = ""
+        texts.append(text)
+    return texts
+
+def length_bucketed_batches(texts, batch_size):
+    """
+    Group texts of similar length into batches to minimize padding
+    Returns: list of index arrays (stable order, so runs are deterministic)
+    """
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    order = np.argsort(lengths, kind='stable')
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+def set_thread_count(num_threads):
+    """Limit intra-op threads for the torch backend"""
+    if not num_threads:
+        return
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+        log_message(f"   - Torch threads: {num_threads}")
+    except ImportError:
+        pass
+
+def _init_worker(num_threads):
+    """Pool initializer: each worker process loads its own embedder"""
+    set_thread_count(num_threads)
+    get_embedder()
+
+def _encode_worker_batch(batch_texts):
+    """Pool task: encode one length-bucketed batch"""
+    return get_embedder().encode(batch_texts, batch_size=len(batch_texts))
+
+def log_batch_progress(done, total, processed, start_time, every=10):
+    """Log progress and throughput every few batches"""
+    if done % every and done != total:
+        return
+    elapsed = time.time() - start_time
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    log_message(f"   - Batch {done}/{total}: {processed} chunks ({rate:.1f} chunks/sec)")
+
+def _open_output(output_file, shape):
+    """Embedding matrix backed by an .npy memmap (or in memory without output_file)"""
+    if output_file:
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        return np.lib.format.open_memmap(output_file, mode='w+', dtype=np.float32, shape=shape)
+    return np.zeros(shape, dtype=np.float32)
+
+def generate_embeddings(model, chunks, batch_size=64, num_threads=None, workers=1, output_file=None,
+                        checkpoint_dir=None):
+    """
+    Generate embeddings for all chunks
+    
+    Args:
+        model: Embedding model (ignored when workers > 1; each worker loads its own)
+        chunks: Chunk dicts or strings
+        batch_size: Texts per encode call (batches are bucketed by length)
+        num_threads: Intra-op threads per process (None = library default)
+        workers: Worker processes; > 1 uses a multiprocessing pool for large corpora
+        output_file: .npy path written incrementally through a memmap
+        checkpoint_dir: Persist each batch here and resume from the last completed batch
+    """
     log_message(f"Generating embeddings for {len(chunks)} chunks...")
     
     try:
-        # Extract text content from chunks
-        texts = []
-        for i, chunk in enumerate(chunks):
-            # Handle both dict (chunks) and string (documents) formats
-            if isinstance(chunk, dict):
-                text = chunk.get('content', chunk.get('text', ''))
-            else:
-                text = str(chunk)
-            
-            if not text:
-                log_message(f"⚠️  Chunk {i} has no content", "WARNING")
-                text = ""
-            texts.append(text)
+        texts = extract_texts(chunks)
+        batches = length_bucketed_batches(texts, batch_size)
         
         log_message(f"   - Processing {len(texts)} text chunks")
+        log_message(f"   - Batches: {len(batches)} x {batch_size} (length-bucketed)")
+        log_message(f"   - Workers: {workers}")
+        
+        checkpoint = None
+        completed = 0
+        if checkpoint_dir:
+            backend = getattr(model, 'name', None) or os.environ.get('RAG_EMBEDDING_BACKEND', 'torch')
+            fingerprint = fingerprint_run(texts, batch_size, MODEL_NAME, backend)
+            checkpoint = EmbeddingCheckpoint(checkpoint_dir, fingerprint, len(batches), batch_size)
+            completed = checkpoint.load()
+            if completed:
+                log_message(f"   - Resuming from checkpoint: {completed}/{len(batches)} batches done")
+        
+        start_time = time.time()
+        embeddings = None
+        processed = 0
+        
+        def store(batch_indices, batch_embeddings):
+            # Scatter back to original chunk order; memmap keeps memory bounded
+            nonlocal embeddings, processed
+            if embeddings is None:
+                embeddings = _open_output(output_file, (len(texts), batch_embeddings.shape[1]))
+            embeddings[batch_indices] = batch_embeddings
+            processed += len(batch_indices)
+        
+        if completed:
+            # Checkpoint rows are the completed batches in order
+            done_rows = checkpoint.completed_embeddings()
+            store(np.concatenate(batches[:completed]), done_rows)
+            del done_rows
+        remaining = batches[completed:]
+        resumed_rows = processed
+        
+        if workers > 1:
+            import multiprocessing
+            # spawn: torch is not fork-safe once its thread pools exist
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(workers, initializer=_init_worker, initargs=(num_threads,)) as pool:
+                batch_texts = ([texts[i] for i in batch] for batch in remaining)
+                results = pool.imap(_encode_worker_batch, batch_texts)
+                for n, (batch, batch_embeddings) in enumerate(zip(remaining, results), completed + 1):
+                    store(batch, batch_embeddings)
+                    if checkpoint:
+                        checkpoint.append(batch_embeddings)
+                    log_batch_progress(n, len(batches), processed - resumed_rows, start_time)
+        else:
+            set_thread_count(num_threads)
+            for n, batch in enumerate(remaining, completed + 1):
+                batch_embeddings = model.encode([texts[i] for i in batch], batch_size=len(batch))
+                store(batch, batch_embeddings)
+                if checkpoint:
+                    checkpoint.append(batch_embeddings)
+                log_batch_progress(n, len(batches), processed - resumed_rows, start_time)
         
-        # Generate embeddings
-        embeddings = model.encode(texts, show_progress_bar=True)
+        if checkpoint:
+            checkpoint.close()
+        
+        if embeddings is None:
+            embeddings = _open_output(output_file, (0, (model or get_embedder()).get_sentence_embedding_dimension()))
+        if isinstance(embeddings, np.memmap):
+            embeddings.flush()
+        
+        elapsed = time.time() - start_time
+        encoded = len(texts) - resumed_rows
+        rate = encoded / elapsed if elapsed > 0 else float('inf')
         
         log_message(f"✅ Embeddings generated successfully")
         log_message(f"   - Shape: {embeddings.shape}")
         log_message(f"   - Dimension: {embeddings.shape[1]}")
         log_message(f"   - Data type: {embeddings.dtype}")
+        log_message(f"   - Time: {elapsed:.2f}s ({rate:.1f} chunks/sec)")
+        if resumed_rows:
+            log_message(f"   - Reused from checkpoint: {resumed_rows} chunks")
         
         return embeddings
     except Exception as e:
         log_message(f"❌ Failed to generate embeddings: {str(e)}", "ERROR")
         return None
 
-def save_embeddings(embeddings, chunks, output_dir, source_file):
-    """Save embeddings in multiple formats"""
+def save_embeddings(embeddings, chunks, output_dir, source_file, dedup=None):
+    """Save embeddings in multiple formats (dedup: near-duplicate removal stats)"""
     log_message(f"Saving embeddings to: {output_dir}")
     
     # Create output directory
@@ -93,17 +269,22 @@ def save_embeddings(embeddings, chunks, output_dir, source_file):
     try:
         # 1. Save raw embeddings as numpy array
         embeddings_file = os.path.join(output_dir, "embeddings.npy")
-        np.save(embeddings_file, embeddings)
+        if isinstance(embeddings, np.memmap) and os.path.abspath(embeddings.filename) == os.path.abspath(embeddings_file):
+            # Already written incrementally by generate_embeddings
+            embeddings.flush()
+        else:
+            np.save(embeddings_file, embeddings)
         log_message(f"✅ Raw embeddings saved: {embeddings_file}")
         
-        # 2. Save embeddings with metadata as pickle
+        # 2. Save metadata as pickle; the matrix stays in embeddings.npy (may be larger than RAM)
         embeddings_with_metadata = {
-            'embeddings': embeddings,
+            'embeddings_file': os.path.basename(embeddings_file),
             'chunks': chunks,
             'source_file': source_file,
             'model': 'all-MiniLM-L6-v2',
             'embedding_dimension': embeddings.shape[1],
             'total_chunks': len(chunks),
+            'dedup': dedup,
             'created_at': datetime.now().isoformat()
         }
         
@@ -118,6 +299,7 @@ def save_embeddings(embeddings, chunks, output_dir, source_file):
             'total_chunks': len(chunks),
             'embedding_dimension': int(embeddings.shape[1]),
             'model_name': 'all-MiniLM-L6-v2',
+            'dedup': dedup,
             'files_created': {
                 'raw_embeddings': embeddings_file,
                 'embeddings_with_metadata': pickle_file
@@ -145,21 +327,34 @@ def main():
     """Main embedding generation process"""
     log_message("=== US-003 STEP 3: GENERATE EMBEDDINGS ===")
     
-    # Check command line arguments
-    if len(sys.argv) != 2:
-        log_message("Usage: python3.8 embed_chunks.py <embedding_ready.json>", "ERROR")
-        log_message("Example: python3.8 embed_chunks.py /opt/rag-copilot/output/AI-Starter-Kit_final_output/embedding_ready.json", "ERROR")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Generate embeddings for document chunks",
+        epilog="Example: python3.8 embed_chunks.py /opt/rag-copilot/output/AI-Starter-Kit_final_output"
+    )
+    parser.add_argument("input_file", help="US-002 final output directory, chunk store or embedding_ready.json")
+    parser.add_argument("--output-dir", default="/opt/rag-copilot/output/embeddings", help="Output directory")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per encode call (default: 64)")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads per process")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for large corpora (default: 1)")
+    parser.add_argument("--checkpoint-dir", default=None, help="Checkpoint directory (default: <output-dir>/checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint and start over")
+    parser.add_argument("--keep-checkpoint", action="store_true", help="Keep checkpoint files after a successful run")
+    parser.add_argument("--dedup-threshold", type=float, default=None,
+                        help="Near-duplicate similarity threshold (default: embedding_config.json or 0.8)")
+    parser.add_argument("--keep-duplicates", action="store_true", help="Embed near-duplicate chunks too")
+    args = parser.parse_args()
     
-    input_file = sys.argv[1]
+    input_file = args.input_file
     
     # Validate input file
     if not os.path.exists(input_file):
         log_message(f"❌ Input file not found: {input_file}", "ERROR")
         sys.exit(1)
     
-    # Create output directory
-    output_dir = "/opt/rag-copilot/output/embeddings"
+    output_dir = args.output_dir
+    checkpoint_dir = args.checkpoint_dir or os.path.join(output_dir, "checkpoint")
+    if args.restart:
+        remove_checkpoint(checkpoint_dir)
     
     # Step 1: Load data
     data = load_embedding_ready_data(input_file)
@@ -167,42 +362,66 @@ def main():
         log_message("❌ Failed to load input data", "ERROR")
         sys.exit(1)
     
+    # Near-duplicate removal (remove_duplicates in embedding_config.json)
+    settings = load_dedup_settings(input_file)
+    if args.dedup_threshold is not None:
+        settings['dedup_threshold'] = args.dedup_threshold
+    if args.keep_duplicates:
+        settings['remove_duplicates'] = False
+    if data.get('documents') and settings['remove_duplicates']:
+        data = remove_duplicate_chunks(data, settings['dedup_threshold'])
+    
     # Try both 'chunks' and 'documents' keys for compatibility
     chunks = data.get('chunks', [])
     if not chunks:
-        chunks = data.get('documents', [])
+        chunks = build_chunk_records(data)
     
     if not chunks:
         log_message("❌ No chunks/documents found in input data", "ERROR")
         log_message("Available keys: " + str(list(data.keys())), "ERROR")
         sys.exit(1)
     
-    # Step 2: Initialize model
-    model = initialize_embedding_model()
-    if not model:
-        log_message("❌ Failed to initialize model", "ERROR")
-        sys.exit(1)
+    # Step 2: Initialize model (worker processes load their own)
+    model = None
+    if args.workers <= 1:
+        model = initialize_embedding_model()
+        if not model:
+            log_message("❌ Failed to initialize model", "ERROR")
+            sys.exit(1)
     
     # Step 3: Generate embeddings
-    embeddings = generate_embeddings(model, chunks)
+    embeddings = generate_embeddings(
+        model, chunks,
+        batch_size=args.batch_size,
+        num_threads=args.threads,
+        workers=args.workers,
+        output_file=os.path.join(output_dir, "embeddings.npy"),
+        checkpoint_dir=checkpoint_dir
+    )
     if embeddings is None:
         log_message("❌ Failed to generate embeddings", "ERROR")
         sys.exit(1)
     
     # Step 4: Save embeddings
-    success = save_embeddings(embeddings, chunks, output_dir, data.get('source_file', input_file))
+    success = save_embeddings(embeddings, chunks, output_dir, data.get('source_file', input_file), data.get('dedup'))
     if not success:
         log_message("❌ Failed to save embeddings", "ERROR")
         sys.exit(1)
     
+    if not args.keep_checkpoint:
+        remove_checkpoint(checkpoint_dir)
+    
     # Success summary
     log_message("=== STEP 3 COMPLETED SUCCESSFULLY ===")
     log_message(f"✅ Generated embeddings for {len(chunks)} chunks")
+    if data.get('dedup'):
+        log_message(f"✅ Near-duplicates removed: {data['dedup']['duplicates_removed']} "
+                    f"({data['dedup']['dedup_ratio']:.1%})")
     log_message(f"✅ Embedding dimension: {embeddings.shape[1]}")
     log_message(f"✅ Output directory: {output_dir}")
     log_message(f"✅ Files created:")
     log_message(f"   - embeddings.npy (raw embeddings)")
-    log_message(f"   - embeddings_with_metadata.pkl (embeddings + metadata)")
+    log_message(f"   - embeddings_with_metadata.pkl (chunks + metadata, vectors in embeddings.npy)")
     log_message(f"   - embedding_summary.json (summary)")
     log_message("")
     log_message("🚀 Ready for Step 4: Initialize vector database")
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3.8
+"""
+US-003/US-004 Shared Embedder & Index Factory
+Lazily imports heavy dependencies (torch, sentence-transformers, faiss, ollama) on first use,
+caches loaded models/indexes per process, and can preload them in a background thread.
+
+All import and load times are recorded for the --profile-startup report.
+"""
+
+import os
+import sys
+import time
+import pickle
+import importlib
+import importlib.util
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from embedding_backend import MODEL_NAME, load_embedding_model
+from micro_batcher import MicroBatchEncoder, DEFAULT_WINDOW_MS, DEFAULT_MAX_BATCH_SIZE
+from index_snapshots import resolve_db_files, INDEX_FILE, EMBEDDINGS_FILE, CHUNKS_FILE
+
+_PROCESS_START = time.time()
+
+_timings = OrderedDict()
+_timings_lock = threading.Lock()
+
+_instances = {}
+_instance_locks = {}
+_instances_lock = threading.Lock()
+
+# Modules imported ahead of each backend so their cost shows up separately in the profile
+BACKEND_IMPORTS = {
+    'torch': ['torch', 'sentence_transformers'],
+    'onnx': ['onnxruntime', 'tokenizers']
+}
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def _record(name, seconds):
+    with _timings_lock:
+        if name not in _timings:
+            _timings[name] = seconds
+
+def lazy_import(module_name):
+    """Import a module on first use, recording how long the import took"""
+    already_loaded = module_name in sys.modules
+    start = time.time()
+    module = importlib.import_module(module_name)
+    if not already_loaded:
+        _record(f"import {module_name}", time.time() - start)
+    return module
+
+def is_available(module_name):
+    """Check whether a module is installed without importing it"""
+    return importlib.util.find_spec(module_name) is not None
+
+def _get_or_create(key, factory, replaces_family=False):
+    """
+    Return cached instance for key, creating it once even under concurrent callers
+    With replaces_family, older instances sharing key[:2] (same kind and path) are dropped
+    """
+    with _instances_lock:
+        if key in _instances:
+            return _instances[key]
+        lock = _instance_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        with _instances_lock:
+            if key in _instances:
+                return _instances[key]
+        instance = factory()
+        with _instances_lock:
+            if replaces_family:
+                for stale in [k for k in _instances if k[:2] == key[:2]]:
+                    del _instances[stale]
+                    _instance_locks.pop(stale, None)
+            _instances[key] = instance
+        return instance
+
+def get_embedder(backend=None, model_name=MODEL_NAME, onnx_path=None):
+    """Shared embedding model for this process"""
+    backend = (backend or os.environ.get('RAG_EMBEDDING_BACKEND', 'torch')).lower()
+
+    def create():
+        for module_name in BACKEND_IMPORTS.get(backend, []):
+            try:
+                lazy_import(module_name)
+            except ImportError:
+                pass
+        start = time.time()
+        model = load_embedding_model(backend=backend, model_name=model_name, onnx_path=onnx_path)
+        _record(f"load embedder ({backend})", time.time() - start)
+        return model
+
+    return _get_or_create(('embedder', backend, model_name, onnx_path), create)
+
+def get_batched_embedder(window_ms=DEFAULT_WINDOW_MS, max_batch_size=DEFAULT_MAX_BATCH_SIZE, backend=None):
+    """Shared embedder behind a micro-batching queue (for concurrent callers)"""
+    model = get_embedder(backend=backend)
+    return _get_or_create(('batched-embedder', id(model), window_ms, max_batch_size),
+                          lambda: MicroBatchEncoder(model, window_ms=window_ms, max_batch_size=max_batch_size))
+
+def get_vector_index(index_path):
+    """Shared FAISS index for this process, reloaded if the file changes"""
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"Vector database not found: {index_path}")
+
+    mtime = os.path.getmtime(index_path)
+
+    def create():
+        faiss = lazy_import('faiss')
+        start = time.time()
+        index = faiss.read_index(index_path)
+        _record("load vector index", time.time() - start)
+        return index
+
+    return _get_or_create(('index', index_path, mtime), create, replaces_family=True)
+
+def get_chunk_store(chunks_path):
+    """Shared document chunks (pickle) for this process, reloaded if the file changes"""
+    if not os.path.exists(chunks_path):
+        return []
+
+    mtime = os.path.getmtime(chunks_path)
+
+    def create():
+        start = time.time()
+        with open(chunks_path, 'rb') as f:
+            chunks = pickle.load(f)
+        _record("load chunk store", time.time() - start)
+        return chunks
+
+    return _get_or_create(('chunks', chunks_path, mtime), create, replaces_family=True)
+
+def get_embedding_store(embeddings_path):
+    """Shared stored embeddings (memory-mapped .npy) for this process, reloaded if the file changes; None if missing"""
+    if not embeddings_path or not os.path.exists(embeddings_path):
+        return None
+
+    mtime = os.path.getmtime(embeddings_path)
+
+    def create():
+        np = lazy_import('numpy')
+        start = time.time()
+        embeddings = np.load(embeddings_path, mmap_mode='r')
+        _record("load embedding store", time.time() - start)
+        return embeddings
+
+    return _get_or_create(('embeddings', embeddings_path, mtime), create, replaces_family=True)
+
+class VectorStore:
+    """
+    FAISS index and document chunks from the same database build
+    Readers hold one VectorStore for a whole query, so a concurrent rebuild can never pair
+    a new index with old chunks. search() and ntotal delegate to the index.
+    """
+
+    def __init__(self, key, index, chunks, snapshot_dir=None, embeddings_path=None):
+        self.key = key
+        self.index = index
+        self.chunks = chunks
+        self.snapshot_dir = snapshot_dir
+        self.embeddings_path = embeddings_path
+        self.version = os.path.basename(snapshot_dir) if snapshot_dir else 'legacy'
+        self.loaded_at = time.time()
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    def search(self, query_embedding, k):
+        return self.index.search(query_embedding, k)
+
+    def vectors(self, positions):
+        """
+        Stored embeddings for index positions (e.g. for MMR re-ranking)
+        Falls back to reconstructing them from the index; None if neither is possible.
+        """
+        np = lazy_import('numpy')
+        embeddings = get_embedding_store(self.embeddings_path)
+        if embeddings is not None and len(embeddings) == self.ntotal:
+            return np.asarray(embeddings[np.asarray(positions, dtype=np.int64)], dtype=np.float32)
+        try:
+            return np.vstack([self.index.reconstruct(int(i)) for i in positions]).astype(np.float32)
+        except Exception:
+            return None
+
+def vector_store_key(db_dir):
+    """
+    Cheap identity of the current database build (no file contents read)
+    Snapshot directory when snapshots are used, else legacy file mtimes.
+    """
+    files = resolve_db_files(db_dir)
+    if files['snapshot_dir']:
+        return files['snapshot_dir']
+    index_path, chunks_path = files[INDEX_FILE], files[CHUNKS_FILE]
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"Vector database not found: {index_path}")
+    chunks_mtime = os.path.getmtime(chunks_path) if os.path.exists(chunks_path) else None
+    return (index_path, os.path.getmtime(index_path), chunks_mtime)
+
+def get_vector_store(db_dir):
+    """Shared index + chunks for the current database build, reloaded when it changes"""
+    key = vector_store_key(db_dir)
+
+    def create():
+        files = resolve_db_files(db_dir)
+        faiss = lazy_import('faiss')
+        start = time.time()
+        index = faiss.read_index(files[INDEX_FILE])
+        chunks = []
+        if os.path.exists(files[CHUNKS_FILE]):
+            with open(files[CHUNKS_FILE], 'rb') as f:
+                chunks = pickle.load(f)
+        _record("load vector store", time.time() - start)
+        return VectorStore(key, index, chunks, files['snapshot_dir'], files[EMBEDDINGS_FILE])
+
+    return _get_or_create(('store', os.path.abspath(db_dir), key), create, replaces_family=True)
+
+def preload_async(index_path=None, chunks_path=None, backend=None, db_dir=None):
+    """Load embedder (and optionally index/chunks or a whole vector store) in a background daemon thread"""
+    def worker():
+        start = time.time()
+        try:
+            get_embedder(backend=backend)
+            if db_dir:
+                get_vector_store(db_dir)
+            if index_path:
+                get_vector_index(index_path)
+            if chunks_path:
+                get_chunk_store(chunks_path)
+            _record("background preload", time.time() - start)
+        except Exception as e:
+            log_message(f"⚠️  Background preload failed: {str(e)}", "WARNING")
+
+    thread = threading.Thread(target=worker, name="rag-preload", daemon=True)
+    thread.start()
+    return thread
+
+def startup_profile():
+    """Recorded import/load timings plus time since process start"""
+    with _timings_lock:
+        profile = OrderedDict(_timings)
+    profile['elapsed since start'] = time.time() - _PROCESS_START
+    return profile
+
+def format_startup_profile():
+    """Human-readable startup profile report"""
+    profile = startup_profile()
+    width = max(len(name) for name in profile)
+    lines = ["⏱️  STARTUP PROFILE:"]
+    for name, seconds in profile.items():
+        lines.append(f"  - {name.ljust(width)} {seconds:8.3f}s")
+    return "\n".join(lines)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3.8
+"""
+US-003 Embedding Backends
+Pluggable CPU backends for the all-MiniLM-L6-v2 embedding model:
+- torch: SentenceTransformer (default)
+- onnx: exported ONNX model (fp32 or int8-quantized) via ONNX Runtime, no torch import
+
+Both backends expose the SentenceTransformer subset used by the pipeline:
+encode(texts, ...) and get_sentence_embedding_dimension().
+
+Usage:
+    python3.8 embedding_backend.py export --output-dir /opt/rag-copilot/models/all-MiniLM-L6-v2-onnx --quantize
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from datetime import datetime
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+MAX_SEQ_LENGTH = 256
+DEFAULT_ONNX_DIR = "/opt/rag-copilot/models/all-MiniLM-L6-v2-onnx"
+BACKEND_CONFIG_FILE = "embedding_backend.json"
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+class EmbeddingBackend:
+    """Common interface for embedding backends (mirrors SentenceTransformer.encode)"""
+
+    name = 'base'
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, normalize_embeddings=False, **kwargs):
+        """Encode sentences into a float32 array (1-D for a single string)"""
+        raise NotImplementedError
+
+    def get_sentence_embedding_dimension(self):
+        """Embedding dimension"""
+        raise NotImplementedError
+
+    @property
+    def namespace(self):
+        """Identifies the vectors this backend produces (e.g. for persisted caches)"""
+        return f"{self.name}:{self.model_name}"
+
+class TorchEmbeddingBackend(EmbeddingBackend):
+    """SentenceTransformer running through PyTorch"""
+
+    name = 'torch'
+
+    def __init__(self, model_name=MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, normalize_embeddings=False, **kwargs):
+        embeddings = self.model.encode(
+            sentences,
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar,
+            normalize_embeddings=normalize_embeddings,
+            convert_to_numpy=True
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """Exported transformer running through ONNX Runtime with SentenceTransformer pooling"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = os.path.dirname(os.path.abspath(model_path))
+        config_file = os.path.join(model_dir, BACKEND_CONFIG_FILE)
+        with open(config_file, 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+
+        self.model_name = self.config.get('model_name', MODEL_NAME)
+        self.model_path = model_path
+        self.normalize = self.config.get('normalize', True)
+
+        # Same truncation as SentenceTransformer (max_seq_length)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.config.get('max_seq_length', MAX_SEQ_LENGTH))
+        self.tokenizer.enable_padding(pad_id=self.config.get('pad_token_id', 0),
+                                      pad_token=self.config.get('pad_token', '[PAD]'))
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, batch):
+        encodings = self.tokenizer.encode_batch(batch)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over non-padding tokens (SentenceTransformer Pooling module)
+        mask = attention_mask[..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return summed / counts
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        batches = [self._encode_batch(list(sentences[i:i + batch_size]))
+                   for i in range(0, len(sentences), batch_size)]
+        dimension = self.get_sentence_embedding_dimension()
+        embeddings = np.vstack(batches) if batches else np.zeros((0, dimension), dtype=np.float32)
+
+        if self.normalize or normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dimension']
+
+    @property
+    def namespace(self):
+        # fp32 and int8 exports of the same model give different vectors
+        return f"{self.name}:{self.model_name}:{os.path.abspath(self.model_path)}"
+
+def default_onnx_path(quantized=True):
+    """Default location of the exported ONNX model"""
+    return os.path.join(DEFAULT_ONNX_DIR, "model_int8.onnx" if quantized else "model.onnx")
+
+def load_embedding_model(backend=None, model_name=MODEL_NAME, onnx_path=None, num_threads=None):
+    """
+    Create the embedding model for the configured backend
+
+    Backend selection: argument, else RAG_EMBEDDING_BACKEND ('torch' or 'onnx'), else torch.
+    ONNX model path: argument, else RAG_EMBEDDING_ONNX_PATH, else the default int8 export.
+    Falls back to torch if the ONNX backend cannot be loaded.
+    """
+    backend = (backend or os.environ.get('RAG_EMBEDDING_BACKEND', 'torch')).lower()
+
+    if backend == 'onnx':
+        onnx_path = onnx_path or os.environ.get('RAG_EMBEDDING_ONNX_PATH') or default_onnx_path()
+        try:
+            model = OnnxEmbeddingBackend(onnx_path, num_threads=num_threads)
+            log_message(f"✅ Embedding backend: onnx ({onnx_path})")
+            return model
+        except Exception as e:
+            log_message(f"⚠️  ONNX backend unavailable ({str(e)}), falling back to torch", "WARNING")
+
+    model = TorchEmbeddingBackend(model_name)
+    log_message(f"✅ Embedding backend: torch ({model_name})")
+    return model
+
+def export_onnx_model(output_dir=DEFAULT_ONNX_DIR, model_name=MODEL_NAME, quantize=False, opset=14):
+    """Export the SentenceTransformer transformer to ONNX (optionally int8-quantized)"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize
+
+    log_message(f"Exporting {model_name} to ONNX: {output_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device='cpu')
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(output_dir)
+
+    class TokenEmbeddings(torch.nn.Module):
+        """Expose only last_hidden_state for export"""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids)[0]
+
+    dummy = tokenizer(["Xuất mô hình ONNX", "Export ONNX model"], padding=True, return_tensors='pt')
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            (dummy['input_ids'], dummy['attention_mask'], dummy['token_type_ids']),
+            fp32_path,
+            input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+            output_names=['token_embeddings'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'token_type_ids': {0: 'batch', 1: 'sequence'},
+                'token_embeddings': {0: 'batch', 1: 'sequence'}
+            },
+            opset_version=opset
+        )
+    log_message(f"✅ ONNX model saved: {fp32_path}")
+
+    files = {'fp32': fp32_path}
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        int8_path = os.path.join(output_dir, "model_int8.onnx")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        files['int8'] = int8_path
+        log_message(f"✅ Quantized model saved: {int8_path}")
+
+    config = {
+        'model_name': model_name,
+        'dimension': st_model.get_sentence_embedding_dimension(),
+        'max_seq_length': st_model.max_seq_length,
+        'pooling': 'mean',
+        'normalize': any(isinstance(module, Normalize) for module in st_model),
+        'pad_token': tokenizer.pad_token,
+        'pad_token_id': tokenizer.pad_token_id,
+        'files': files,
+        'created_at': datetime.now().isoformat()
+    }
+    with open(os.path.join(output_dir, BACKEND_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+
+    return files
+
+def main():
+    """Command line interface for ONNX export"""
+    parser = argparse.ArgumentParser(description="Embedding backend utilities")
+    subparsers = parser.add_subparsers(dest='command')
+
+    export_parser = subparsers.add_parser('export', help='Export embedding model to ONNX')
+    export_parser.add_argument('--output-dir', default=DEFAULT_ONNX_DIR, help='Output directory')
+    export_parser.add_argument('--model', default=MODEL_NAME, help='SentenceTransformer model name')
+    export_parser.add_argument('--quantize', action='store_true', help='Also write an int8-quantized model')
+
+    args = parser.parse_args()
+
+    if args.command != 'export':
+        parser.print_help()
+        return 1
+
+    try:
+        files = export_onnx_model(args.output_dir, args.model, quantize=args.quantize)
+    except ImportError as e:
+        log_message(f"❌ Missing dependency: {e}", "ERROR")
+        log_message("Install with: pip3.8 install onnx onnxruntime tokenizers", "ERROR")
+        return 1
+
+    log_message("=== ONNX EXPORT COMPLETED ===")
+    for name, path in files.items():
+        log_message(f"   - {name}: {path}")
+    log_message("Enable with: export RAG_EMBEDDING_BACKEND=onnx")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3.8
+"""
+US-003 Embedding Checkpoints
+Per-batch checkpointing for embed_chunks.py so an interrupted run can resume.
+
+Layout of a checkpoint directory:
+- batches.f32    append-only float32 rows, one length-bucketed batch after another
+- manifest.json  run fingerprint and number of completed batches/rows
+
+The manifest is replaced atomically after each batch has been flushed to batches.f32,
+so it never claims rows that are not on disk. Any trailing partial batch is truncated
+on resume. Batches are deterministic (stable length sort), so resumed runs produce the
+same rows as a clean run.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+from datetime import datetime
+
+CHECKPOINT_VERSION = 1
+DATA_FILE = "batches.f32"
+MANIFEST_FILE = "manifest.json"
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def fingerprint_run(texts, batch_size, model_name, backend):
+    """Hash of everything that determines the batch contents and their embeddings"""
+    digest = hashlib.sha256()
+    digest.update(f"{model_name}|{backend}|{batch_size}|{len(texts)}".encode('utf-8'))
+    for text in texts:
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+class EmbeddingCheckpoint:
+    """Append-only batch store plus manifest for one embedding run"""
+
+    def __init__(self, checkpoint_dir, fingerprint, total_batches, batch_size):
+        self.checkpoint_dir = checkpoint_dir
+        self.fingerprint = fingerprint
+        self.total_batches = total_batches
+        self.batch_size = batch_size
+
+        self.data_file = os.path.join(checkpoint_dir, DATA_FILE)
+        self.manifest_file = os.path.join(checkpoint_dir, MANIFEST_FILE)
+
+        self.dimension = None
+        self.completed_batches = 0
+        self.completed_rows = 0
+        self._handle = None
+
+    def load(self):
+        """
+        Resume from an existing checkpoint if it belongs to this run
+        Returns: number of completed batches (0 for a fresh start)
+        """
+        if not os.path.exists(self.manifest_file):
+            # Data written before the first manifest update is unusable
+            self.reset()
+            return 0
+
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            log_message(f"⚠️  Unreadable checkpoint manifest, starting over: {str(e)}", "WARNING")
+            self.reset()
+            return 0
+
+        if (manifest.get('version') != CHECKPOINT_VERSION
+                or manifest.get('fingerprint') != self.fingerprint
+                or manifest.get('total_batches') != self.total_batches):
+            log_message("⚠️  Checkpoint belongs to a different input/model/batch size, starting over", "WARNING")
+            self.reset()
+            return 0
+
+        dimension = manifest.get('dimension')
+        rows = manifest.get('completed_rows', 0)
+        expected_bytes = rows * (dimension or 0) * 4
+        actual_bytes = os.path.getsize(self.data_file) if os.path.exists(self.data_file) else 0
+
+        if actual_bytes < expected_bytes:
+            log_message("⚠️  Checkpoint data is shorter than its manifest, starting over", "WARNING")
+            self.reset()
+            return 0
+
+        if actual_bytes > expected_bytes:
+            # Batch written but manifest not yet updated when the run died
+            with open(self.data_file, 'r+b') as f:
+                f.truncate(expected_bytes)
+            log_message(f"   - Dropped {actual_bytes - expected_bytes} bytes of an unfinished batch")
+
+        self.dimension = dimension
+        self.completed_batches = manifest.get('completed_batches', 0)
+        self.completed_rows = rows
+        return self.completed_batches
+
+    def completed_embeddings(self):
+        """Rows written so far, in batch order (read-only memmap)"""
+        if not self.completed_rows:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        return np.memmap(self.data_file, dtype=np.float32, mode='r',
+                         shape=(self.completed_rows, self.dimension))
+
+    def append(self, batch_embeddings):
+        """Durably append one batch, then record it in the manifest"""
+        batch_embeddings = np.ascontiguousarray(batch_embeddings, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = int(batch_embeddings.shape[1])
+
+        if self._handle is None:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            self._handle = open(self.data_file, 'ab')
+
+        self._handle.write(batch_embeddings.tobytes())
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+
+        self.completed_batches += 1
+        self.completed_rows += len(batch_embeddings)
+        self._write_manifest()
+
+    def _write_manifest(self):
+        manifest = {
+            'version': CHECKPOINT_VERSION,
+            'fingerprint': self.fingerprint,
+            'batch_size': self.batch_size,
+            'total_batches': self.total_batches,
+            'dimension': self.dimension,
+            'completed_batches': self.completed_batches,
+            'completed_rows': self.completed_rows,
+            'data_file': DATA_FILE,
+            'updated_at': datetime.now().isoformat()
+        }
+        tmp_path = f"{self.manifest_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_file)
+
+    def close(self):
+        """Close the data file handle"""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def reset(self):
+        """Discard checkpoint files"""
+        self.close()
+        for path in (self.data_file, self.manifest_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.dimension = None
+        self.completed_batches = 0
+        self.completed_rows = 0
+
+def remove_checkpoint(checkpoint_dir):
+    """Delete a checkpoint directory after a successful run"""
+    for name in (DATA_FILE, MANIFEST_FILE, f"{MANIFEST_FILE}.tmp"):
+        path = os.path.join(checkpoint_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+    try:
+        os.rmdir(checkpoint_dir)
+    except OSError:
+        pass
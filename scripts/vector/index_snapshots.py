@@ -0,0 +1,370 @@
+#!/usr/bin/env python3.8
+"""
+US-003 Versioned Index Snapshots
+Every database build is written to its own directory and published by atomically
+repointing a symlink, so readers always see an index and chunk store from the same build.
+
+Layout under the database directory (/opt/rag-copilot/db):
+- snapshots/<version>/      vector_db.index, embeddings_backup.npy, chunks_backup.pkl,
+                            vector_db_metadata.json, [ingestion_manifest.json], snapshot_manifest.json
+- current -> snapshots/<version>
+- vector_db.index, chunks_backup.pkl, ... -> current/<file>  (legacy paths for older scripts)
+
+Databases built before snapshots (plain files in the database directory) are still read. The first
+promotion moves them into their own snapshot (versioned by the build time), so they stay available
+for rollback instead of being replaced by the legacy-path symlinks.
+
+Usage:
+    python3.8 index_snapshots.py list
+    python3.8 index_snapshots.py verify [version]
+    python3.8 index_snapshots.py rollback [version]
+    python3.8 index_snapshots.py prune --keep 5
+"""
+
+import os
+import sys
+import json
+import shutil
+import pickle
+import hashlib
+import argparse
+import numpy as np
+from datetime import datetime
+
+from ingestion_manifest import MANIFEST_FILE as INGESTION_MANIFEST_FILE
+
+DB_DIR = "/opt/rag-copilot/db"
+SNAPSHOTS_DIR = "snapshots"
+CURRENT_LINK = "current"
+SNAPSHOT_MANIFEST = "snapshot_manifest.json"
+
+INDEX_FILE = "vector_db.index"
+EMBEDDINGS_FILE = "embeddings_backup.npy"
+CHUNKS_FILE = "chunks_backup.pkl"
+METADATA_FILE = "vector_db_metadata.json"
+
+LEGACY_FILES = (INDEX_FILE, EMBEDDINGS_FILE, CHUNKS_FILE, METADATA_FILE, INGESTION_MANIFEST_FILE)
+DEFAULT_KEEP = 5
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def file_checksum(path, block_size=1 << 20):
+    """SHA-256 of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _fsync_file(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+def _write_manifest(snapshot_dir, manifest):
+    """Checksum every file of the snapshot directory and write snapshot_manifest.json last"""
+    files = {}
+    for name in sorted(os.listdir(snapshot_dir)):
+        path = os.path.join(snapshot_dir, name)
+        _fsync_file(path)
+        files[name] = {'sha256': file_checksum(path), 'size': os.path.getsize(path)}
+    manifest['files'] = files
+
+    manifest_path = os.path.join(snapshot_dir, SNAPSHOT_MANIFEST)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    _fsync_dir(snapshot_dir)
+
+def snapshots_root(db_dir):
+    return os.path.join(db_dir, SNAPSHOTS_DIR)
+
+def current_snapshot_dir(db_dir):
+    """Directory of the promoted snapshot, or None for a pre-snapshot database"""
+    link = os.path.join(db_dir, CURRENT_LINK)
+    if not os.path.islink(link):
+        return None
+    target = os.path.realpath(link)
+    return target if os.path.isdir(target) else None
+
+def current_version(db_dir):
+    snapshot_dir = current_snapshot_dir(db_dir)
+    return os.path.basename(snapshot_dir) if snapshot_dir else None
+
+def resolve_db_files(db_dir):
+    """
+    Paths of the database files to read
+    From the current snapshot when there is one, else the legacy files in db_dir.
+    """
+    base = current_snapshot_dir(db_dir) or db_dir
+    files = {name: os.path.join(base, name) for name in LEGACY_FILES}
+    files['snapshot_dir'] = base if base != db_dir else None
+    return files
+
+def list_snapshots(db_dir):
+    """Complete snapshot versions, oldest first"""
+    root = snapshots_root(db_dir)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if not name.startswith('.') and os.path.exists(os.path.join(root, name, SNAPSHOT_MANIFEST)))
+
+def new_version():
+    """Sortable snapshot version id"""
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+def write_snapshot(db_dir, index, embeddings, chunks, metadata=None, extra_json=None):
+    """
+    Write a complete snapshot into snapshots/<version> (not yet promoted)
+    Files are written to a hidden temp directory, fsynced, checksummed and renamed into place.
+    """
+    import faiss
+
+    version = new_version()
+    root = snapshots_root(db_dir)
+    tmp_dir = os.path.join(root, f".tmp-{version}")
+    final_dir = os.path.join(root, version)
+    os.makedirs(tmp_dir)
+
+    try:
+        faiss.write_index(index, os.path.join(tmp_dir, INDEX_FILE))
+        np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), embeddings)
+        if chunks is not None:
+            with open(os.path.join(tmp_dir, CHUNKS_FILE), 'wb') as f:
+                pickle.dump(chunks, f)
+
+        metadata = dict(metadata or {})
+        metadata['snapshot_version'] = version
+        metadata['files'] = {
+            'index': os.path.join(final_dir, INDEX_FILE),
+            'embeddings': os.path.join(final_dir, EMBEDDINGS_FILE),
+            'chunks': os.path.join(final_dir, CHUNKS_FILE) if chunks is not None else None
+        }
+        with open(os.path.join(tmp_dir, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+        for name, data in (extra_json or {}).items():
+            with open(os.path.join(tmp_dir, name), 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+
+        _write_manifest(tmp_dir, {
+            'version': version,
+            'created_at': datetime.now().isoformat(),
+            'total_vectors': int(index.ntotal),
+            'total_chunks': len(chunks) if chunks is not None else None,
+            'dimension': int(embeddings.shape[1]) if embeddings.ndim == 2 else None
+        })
+
+        os.rename(tmp_dir, final_dir)
+        _fsync_dir(root)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return final_dir
+
+def verify_snapshot(snapshot_dir):
+    """Check every file against the snapshot manifest; returns list of problems"""
+    manifest_path = os.path.join(snapshot_dir, SNAPSHOT_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return [f"missing {SNAPSHOT_MANIFEST}"]
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    problems = []
+    for name, expected in manifest.get('files', {}).items():
+        path = os.path.join(snapshot_dir, name)
+        if not os.path.exists(path):
+            problems.append(f"missing {name}")
+        elif os.path.getsize(path) != expected['size']:
+            problems.append(f"size mismatch: {name}")
+        elif file_checksum(path) != expected['sha256']:
+            problems.append(f"checksum mismatch: {name}")
+    return problems
+
+def _replace_symlink(link_path, target):
+    """Atomically point link_path at target (rename over the old link or file)"""
+    tmp_link = f"{link_path}.tmp-{os.getpid()}"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(target, tmp_link)
+    os.replace(tmp_link, link_path)
+
+def snapshot_legacy_database(db_dir):
+    """
+    Move a pre-snapshot database (plain files in db_dir) into snapshots/<version>
+    The files are hard-linked (copied across filesystems) into the snapshot, so the legacy
+    paths keep working until promote_snapshot replaces them with symlinks.
+    Returns the snapshot directory, or None when there are no legacy files.
+    """
+    names = [name for name in LEGACY_FILES
+             if os.path.isfile(os.path.join(db_dir, name)) and not os.path.islink(os.path.join(db_dir, name))]
+    if not names:
+        return None
+
+    # Versioned by build time, so it sorts before every snapshot built after it
+    built_at = datetime.fromtimestamp(max(os.path.getmtime(os.path.join(db_dir, name)) for name in names))
+    version = built_at.strftime("%Y%m%d-%H%M%S-%f")
+    root = snapshots_root(db_dir)
+    tmp_dir = os.path.join(root, f".tmp-{version}")
+    final_dir = os.path.join(root, version)
+    if os.path.exists(final_dir):
+        return final_dir
+    os.makedirs(tmp_dir)
+
+    try:
+        for name in names:
+            source = os.path.join(db_dir, name)
+            try:
+                os.link(source, os.path.join(tmp_dir, name))
+            except OSError:
+                shutil.copy2(source, os.path.join(tmp_dir, name))
+
+        total_vectors = None
+        metadata_path = os.path.join(tmp_dir, METADATA_FILE)
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                total_vectors = json.load(f).get('total_vectors')
+        _write_manifest(tmp_dir, {
+            'version': version,
+            'created_at': built_at.isoformat(),
+            'total_vectors': total_vectors,
+            'legacy': True
+        })
+
+        os.rename(tmp_dir, final_dir)
+        _fsync_dir(root)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    log_message(f"📦 Pre-snapshot database kept as snapshot {version}")
+    return final_dir
+
+def promote_snapshot(db_dir, snapshot_dir):
+    """Publish a snapshot: verify it, then atomically repoint current -> snapshots/<version>"""
+    problems = verify_snapshot(snapshot_dir)
+    if problems:
+        raise ValueError(f"Refusing to promote {snapshot_dir}: {', '.join(problems)}")
+
+    # Keep a pre-snapshot database before its files are replaced by symlinks
+    snapshot_legacy_database(db_dir)
+
+    version = os.path.basename(snapshot_dir.rstrip(os.sep))
+    _replace_symlink(os.path.join(db_dir, CURRENT_LINK), os.path.join(SNAPSHOTS_DIR, version))
+
+    # Legacy paths follow current, so older scripts keep working
+    for name in LEGACY_FILES:
+        if os.path.exists(os.path.join(snapshot_dir, name)):
+            _replace_symlink(os.path.join(db_dir, name), os.path.join(CURRENT_LINK, name))
+        elif os.path.lexists(os.path.join(db_dir, name)):
+            # Not part of this build (legacy files were kept in their own snapshot above)
+            os.remove(os.path.join(db_dir, name))
+    _fsync_dir(db_dir)
+
+    log_message(f"✅ Snapshot promoted: {version}")
+    return version
+
+def prune_snapshots(db_dir, keep=DEFAULT_KEEP):
+    """Delete old snapshots beyond the newest `keep` (never the current one)"""
+    current = current_version(db_dir)
+    versions = list_snapshots(db_dir)
+    removed = []
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version == current:
+            continue
+        shutil.rmtree(os.path.join(snapshots_root(db_dir), version), ignore_errors=True)
+        removed.append(version)
+    if removed:
+        log_message(f"🧹 Pruned {len(removed)} old snapshot(s)")
+    return removed
+
+def publish_snapshot(db_dir, index, embeddings, chunks, metadata=None, extra_json=None, keep=DEFAULT_KEEP):
+    """Write, verify and promote a new snapshot, then prune old ones"""
+    snapshot_dir = write_snapshot(db_dir, index, embeddings, chunks, metadata=metadata, extra_json=extra_json)
+    log_message(f"✅ Snapshot written: {snapshot_dir}")
+    version = promote_snapshot(db_dir, snapshot_dir)
+    prune_snapshots(db_dir, keep=keep)
+    return version
+
+def rollback(db_dir, version=None):
+    """Promote an older snapshot (default: the one before current)"""
+    versions = list_snapshots(db_dir)
+    current = current_version(db_dir)
+
+    if version is None:
+        older = [v for v in versions if current is None or v < current]
+        if not older:
+            raise ValueError("No older snapshot to roll back to")
+        version = older[-1]
+    elif version not in versions:
+        raise ValueError(f"Snapshot not found: {version}")
+
+    return promote_snapshot(db_dir, os.path.join(snapshots_root(db_dir), version))
+
+def main():
+    """Command line interface for snapshot management"""
+    parser = argparse.ArgumentParser(description="Manage versioned vector database snapshots")
+    parser.add_argument("--db-dir", default=DB_DIR, help=f"Vector database directory (default: {DB_DIR})")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('list', help='List snapshots')
+    verify_parser = subparsers.add_parser('verify', help='Verify snapshot checksums')
+    verify_parser.add_argument('version', nargs='?', help='Snapshot version (default: current)')
+    rollback_parser = subparsers.add_parser('rollback', help='Promote an older snapshot')
+    rollback_parser.add_argument('version', nargs='?', help='Snapshot version (default: previous)')
+    prune_parser = subparsers.add_parser('prune', help='Delete old snapshots')
+    prune_parser.add_argument('--keep', type=int, default=DEFAULT_KEEP, help='Snapshots to keep')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'list':
+            current = current_version(args.db_dir)
+            versions = list_snapshots(args.db_dir)
+            if not versions:
+                log_message("No snapshots found (legacy database layout)")
+            for version in versions:
+                with open(os.path.join(snapshots_root(args.db_dir), version, SNAPSHOT_MANIFEST), 'r') as f:
+                    manifest = json.load(f)
+                marker = "*" if version == current else " "
+                print(f"{marker} {version}  {manifest.get('total_vectors')} vectors  {manifest.get('created_at')}")
+        elif args.command == 'verify':
+            version = args.version or current_version(args.db_dir)
+            if not version:
+                log_message("❌ No current snapshot", "ERROR")
+                return 1
+            problems = verify_snapshot(os.path.join(snapshots_root(args.db_dir), version))
+            if problems:
+                for problem in problems:
+                    log_message(f"❌ {problem}", "ERROR")
+                return 1
+            log_message(f"✅ Snapshot {version} verified")
+        elif args.command == 'rollback':
+            rollback(args.db_dir, args.version)
+        elif args.command == 'prune':
+            prune_snapshots(args.db_dir, keep=args.keep)
+        else:
+            parser.print_help()
+            return 1
+    except Exception as e:
+        log_message(f"❌ {str(e)}", "ERROR")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3.8
+"""
+US-003 Ingestion Manifest
+Tracks every ingested source document by path and content hash, together with the
+chunk ids it produced, so a sync run only processes what changed since the last run.
+
+Manifest format (ingestion_manifest.json):
+{
+  "version": 1,
+  "model_name": "all-MiniLM-L6-v2",
+  "documents": {
+    "/abs/path/doc.md": {
+      "content_hash": "<sha256>",
+      "file_size": 1234,
+      "mtime": 1700000000.0,
+      "chunk_ids": ["doc.md_<hash12>_1", ...],
+      "ingested_at": "..."
+    }
+  }
+}
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = "ingestion_manifest.json"
+SOURCE_EXTENSIONS = ('.md',)
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def hash_file(file_path, block_size=1 << 20):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_chunk_id(file_name, content_hash, chunk_number):
+    """Stable chunk id: same content always yields the same ids"""
+    return f"{file_name}_{content_hash[:12]}_{chunk_number}"
+
+def scan_sources(roots, extensions=SOURCE_EXTENSIONS):
+    """Find source documents under roots (files or directories), skipping hidden dirs"""
+    found = {}
+    for root in roots:
+        root = os.path.abspath(root)
+        if os.path.isfile(root):
+            if root.lower().endswith(extensions):
+                found[root] = os.stat(root)
+            continue
+
+        for dirpath, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                if name.lower().endswith(extensions):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        found[path] = os.stat(path)
+                    except OSError:
+                        continue
+    return found
+
+def _under_roots(path, roots):
+    for root in roots:
+        root = os.path.abspath(root)
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+            return True
+    return False
+
+class IngestionDelta:
+    """Documents to add, re-ingest and remove in one sync run"""
+
+    def __init__(self):
+        self.added = []
+        self.modified = []
+        self.deleted = []
+        self.unchanged = []
+        self.hashes = {}
+
+    @property
+    def changed(self):
+        """Documents that need chunking and embedding"""
+        return self.added + self.modified
+
+    def is_empty(self):
+        return not (self.added or self.modified or self.deleted)
+
+    def summary(self):
+        return {
+            'added': len(self.added),
+            'modified': len(self.modified),
+            'deleted': len(self.deleted),
+            'unchanged': len(self.unchanged)
+        }
+
+class IngestionManifest:
+    """Per-document content hashes and chunk ids of the current index"""
+
+    def __init__(self, manifest_path, model_name='all-MiniLM-L6-v2'):
+        self.manifest_path = manifest_path
+        self.model_name = model_name
+        self.documents = {}
+        self.compatible = True   # False: written for another version/model, the index must be rebuilt
+
+    @classmethod
+    def load(cls, manifest_path, model_name='all-MiniLM-L6-v2'):
+        """Load manifest from disk (empty manifest if missing or for another model)"""
+        manifest = cls(manifest_path, model_name)
+        if not os.path.exists(manifest_path):
+            return manifest
+
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            log_message(f"⚠️  Unreadable ingestion manifest, treating corpus as new: {str(e)}", "WARNING")
+            return manifest
+
+        if data.get('version') != MANIFEST_VERSION or data.get('model_name') != model_name:
+            log_message("⚠️  Ingestion manifest is for another version/model, treating corpus as new", "WARNING")
+            manifest.compatible = False
+            return manifest
+
+        manifest.documents = data.get('documents', {})
+        return manifest
+
+    def is_empty(self):
+        return not self.documents
+
+    def all_chunk_ids(self):
+        """Every chunk id the manifest believes is indexed"""
+        return {chunk_id for entry in self.documents.values() for chunk_id in entry.get('chunk_ids', [])}
+
+    def compute_delta(self, roots, full=False):
+        """
+        Compare the files under roots with the manifest
+        Size and mtime are checked first; only files that differ are hashed.
+        Deletions are limited to documents under the scanned roots.
+        full=True: every known document under roots counts as modified (re-ingested, old chunks replaced)
+        """
+        delta = IngestionDelta()
+        current = scan_sources(roots)
+
+        for path in sorted(current):
+            stat = current[path]
+            entry = self.documents.get(path)
+
+            if full and entry is not None:
+                delta.modified.append(path)
+                continue
+            if entry and entry.get('file_size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+                delta.unchanged.append(path)
+                continue
+
+            content_hash = hash_file(path)
+            delta.hashes[path] = content_hash
+
+            if entry is None:
+                delta.added.append(path)
+            elif entry.get('content_hash') == content_hash:
+                # Touched but identical: refresh stat info only
+                entry['file_size'] = stat.st_size
+                entry['mtime'] = stat.st_mtime
+                delta.unchanged.append(path)
+            else:
+                delta.modified.append(path)
+
+        for path in sorted(self.documents):
+            if path not in current and _under_roots(path, roots):
+                delta.deleted.append(path)
+
+        return delta
+
+    def record(self, path, content_hash, chunk_ids):
+        """Record a freshly ingested document"""
+        stat = os.stat(path)
+        self.documents[path] = {
+            'content_hash': content_hash,
+            'file_size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'chunk_ids': list(chunk_ids),
+            'ingested_at': datetime.now().isoformat()
+        }
+
+    def forget(self, path):
+        """Drop a deleted document"""
+        return self.documents.pop(path, None)
+
+    def reset(self, roots):
+        """
+        The index was lost: forget documents under roots (re-ingested by this sync) and mark
+        the others as not indexed, so the next sync of their roots re-ingests them
+        """
+        for path in list(self.documents):
+            if _under_roots(path, roots):
+                del self.documents[path]
+            else:
+                self.documents[path].update(content_hash=None, file_size=None, mtime=None, chunk_ids=[])
+
+    def untracked_chunk_ids(self, chunks, roots):
+        """Indexed chunks of documents under roots that the manifest does not list (manifest lost or unreadable)"""
+        known = self.all_chunk_ids()
+        return {chunk['id'] for chunk in chunks
+                if chunk['id'] not in known and _under_roots(chunk.get('metadata', {}).get('source_path', ''), roots)}
+
+    def to_dict(self):
+        """
+        Serializable manifest
+        Saved inside each index snapshot, so it always matches the index it describes.
+        """
+        return {
+            'version': MANIFEST_VERSION,
+            'model_name': self.model_name,
+            'updated_at': datetime.now().isoformat(),
+            'total_documents': len(self.documents),
+            'total_chunks': sum(len(entry.get('chunk_ids', [])) for entry in self.documents.values()),
+            'documents': self.documents
+        }
@@ -11,6 +11,8 @@ import json
 import os
 import sys
 from datetime import datetime
+from index_snapshots import (publish_snapshot, resolve_db_files, INDEX_FILE, METADATA_FILE,
+                             EMBEDDINGS_FILE, CHUNKS_FILE)
 
 def log_message(message, level="INFO"):
     """Log messages with timestamp"""
@@ -28,7 +30,11 @@ def load_embeddings(embeddings_dir):
             with open(metadata_file, 'rb') as f:
                 data = pickle.load(f)
             
-            embeddings = data['embeddings']
+            if 'embeddings' in data:
+                # Older Step 3 output pickled the whole matrix
+                embeddings = data['embeddings']
+            else:
+                embeddings = np.load(os.path.join(embeddings_dir, data['embeddings_file']), mmap_mode='r')
             chunks = data['chunks']
             log_message(f"✅ Embeddings with metadata loaded")
         else:
@@ -117,50 +123,34 @@ def test_index_search(index, embeddings, k=3):
         log_message(f"❌ Search test failed: {str(e)}", "ERROR")
         return False
 
-def save_vector_database(index, embeddings, chunks, output_dir):
-    """Save FAISS index and related data"""
+def save_vector_database(index, embeddings, chunks, output_dir, extra_json=None):
+    """
+    Save FAISS index and related data as a new versioned snapshot
+    The snapshot is promoted atomically, so readers never see a new index with old chunks.
+    """
     log_message(f"Saving vector database to: {output_dir}")
     
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     
     try:
-        # 1. Save FAISS index
-        index_file = os.path.join(output_dir, "vector_db.index")
-        faiss.write_index(index, index_file)
-        log_message(f"✅ FAISS index saved: {index_file}")
-        
-        # 2. Save database metadata
         metadata = {
             'index_type': type(index).__name__,
             'total_vectors': int(index.ntotal),
             'dimension': int(embeddings.shape[1]),
             'is_trained': bool(index.is_trained),
             'created_at': datetime.now().isoformat(),
-            'model_name': 'all-MiniLM-L6-v2',
-            'files': {
-                'index': index_file,
-                'embeddings': os.path.join(output_dir, "embeddings_backup.npy"),
-                'chunks': os.path.join(output_dir, "chunks_backup.pkl") if chunks else None
-            }
+            'model_name': 'all-MiniLM-L6-v2'
         }
         
-        metadata_file = os.path.join(output_dir, "vector_db_metadata.json")
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
-        log_message(f"✅ Database metadata saved: {metadata_file}")
-        
-        # 3. Save backup of embeddings
-        embeddings_backup = os.path.join(output_dir, "embeddings_backup.npy")
-        np.save(embeddings_backup, embeddings)
-        log_message(f"✅ Embeddings backup saved: {embeddings_backup}")
-        
-        # 4. Save chunks backup if available
-        if chunks:
-            chunks_backup = os.path.join(output_dir, "chunks_backup.pkl")
-            with open(chunks_backup, 'wb') as f:
-                pickle.dump(chunks, f)
-            log_message(f"✅ Chunks backup saved: {chunks_backup}")
+        version = publish_snapshot(output_dir, index, embeddings, chunks, metadata=metadata, extra_json=extra_json)
+        files = resolve_db_files(output_dir)
+        log_message(f"✅ FAISS index saved: {files[INDEX_FILE]}")
+        log_message(f"✅ Database metadata saved: {files[METADATA_FILE]}")
+        log_message(f"✅ Embeddings backup saved: {files[EMBEDDINGS_FILE]}")
+        if chunks is not None:
+            log_message(f"✅ Chunks backup saved: {files[CHUNKS_FILE]}")
+        log_message(f"✅ Snapshot version: {version}")
         
         return True
     except Exception as e:
@@ -172,12 +162,14 @@ def test_database_loading(output_dir):
     log_message("Testing database loading...")
     
     try:
+        files = resolve_db_files(output_dir)
+        
         # Load index
-        index_file = os.path.join(output_dir, "vector_db.index")
+        index_file = files[INDEX_FILE]
         index = faiss.read_index(index_file)
         
         # Load metadata
-        metadata_file = os.path.join(output_dir, "vector_db_metadata.json")
+        metadata_file = files[METADATA_FILE]
         with open(metadata_file, 'r', encoding='utf-8') as f:
             metadata = json.load(f)
         
@@ -247,7 +239,7 @@ def main():
     log_message(f"✅ Total vectors: {index.ntotal}")
     log_message(f"✅ Dimension: {embeddings.shape[1]}")
     log_message(f"✅ Database location: {output_dir}")
-    log_message(f"✅ Files created:")
+    log_message(f"✅ Files created (snapshots/<version>, linked from current):")
     log_message(f"   - vector_db.index (FAISS index)")
     log_message(f"   - vector_db_metadata.json (metadata)")
     log_message(f"   - embeddings_backup.npy (embeddings backup)")
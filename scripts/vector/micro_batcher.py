@@ -0,0 +1,197 @@
+#!/usr/bin/env python3.8
+"""
+US-004 Query Embedding Micro-Batching
+Collects concurrent single-query encode calls for a short window (or until N items)
+and encodes them in one batch, dispatching each embedding back to its caller.
+"""
+
+import time
+import queue
+import threading
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime
+
+DEFAULT_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH_SIZE = 32
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+QUEUE_WAIT_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100]
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+class Histogram:
+    """Bucketed histogram (per-bucket counts, value <= bound) with count/mean/max"""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation"""
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def snapshot(self):
+        """Bucket counts plus summary statistics"""
+        with self._lock:
+            buckets = OrderedDict()
+            for bound, count in zip(self.buckets, self.counts):
+                buckets[f"<={bound}"] = count
+            buckets[f">{self.buckets[-1]}"] = self.counts[-1]
+            return {
+                'buckets': buckets,
+                'count': self.count,
+                'mean': round(self.total / self.count, 4) if self.count else 0.0,
+                'max': round(self.max, 4)
+            }
+
+class _PendingEncode:
+    """One caller waiting for its embedding"""
+
+    __slots__ = ('text', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, text):
+        self.text = text
+        self.enqueued_at = time.time()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatchEncoder:
+    """
+    Drop-in wrapper around an embedding model (encode / get_sentence_embedding_dimension)
+    Single-text encode calls are queued and batched; multi-text calls pass straight through.
+    """
+
+    def __init__(self, model, window_ms=DEFAULT_WINDOW_MS, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_waits_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+
+        self._queue = queue.Queue()
+        self._running = True
+        self._lock = threading.Lock()   # Orders enqueues before close()'s sentinel
+        self._worker = threading.Thread(target=self._run, name="embedding-micro-batcher", daemon=True)
+        self._worker.start()
+
+    def encode(self, sentences, **kwargs):
+        """Encode like SentenceTransformer.encode, batching concurrent single-query calls"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        # Only plain single-text requests benefit from batching
+        if len(texts) != 1 or kwargs:
+            return self.model.encode(sentences, **kwargs)
+
+        request = _PendingEncode(texts[0])
+        with self._lock:
+            queued = self._running
+            if queued:
+                self._queue.put(request)
+        if not queued:
+            return self.model.encode(sentences, **kwargs)
+        request.done.wait()
+
+        if request.error is not None:
+            raise request.error
+        return request.result if single else request.result.reshape(1, -1)
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def _collect_batch(self, first):
+        """
+        Gather requests until the window (from the first request) closes or the batch is full
+        Requests that queued up while the previous batch was encoding are taken without waiting
+        """
+        batch = [first]
+        deadline = first.enqueued_at + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # close() was called: finish this batch, then let _run see the sentinel
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._collect_batch(first)
+            self._encode_batch(batch)
+
+        # Serve anything queued before close()
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                self._encode_batch([request])
+
+    def _encode_batch(self, batch):
+        """Encode one batch and wake its callers"""
+        dispatch_time = time.time()
+        for request in batch:
+            self.queue_waits_ms.observe((dispatch_time - request.enqueued_at) * 1000.0)
+        self.batch_sizes.observe(len(batch))
+
+        try:
+            embeddings = np.asarray(self.model.encode([r.text for r in batch]), dtype=np.float32)
+            for request, embedding in zip(batch, embeddings):
+                request.result = embedding
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        finally:
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        """Batch-size and queue-wait histograms"""
+        return {
+            'window_ms': self.window * 1000.0,
+            'max_batch_size': self.max_batch_size,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_waits_ms.snapshot()
+        }
+
+    def close(self, timeout=None):
+        """Stop the worker after it served everything queued so far; later calls encode directly"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._queue.put(None)
+        if threading.current_thread() is not self._worker:
+            self._worker.join(timeout)
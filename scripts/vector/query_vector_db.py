@@ -12,7 +12,8 @@ import os
 import sys
 import time
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
+from embedder_factory import get_embedder
+from index_snapshots import resolve_db_files, INDEX_FILE, METADATA_FILE, CHUNKS_FILE
 
 def log_message(message, level="INFO"):
     """Log messages with timestamp"""
@@ -24,8 +25,11 @@ def load_vector_database(db_dir):
     log_message(f"Loading vector database from: {db_dir}")
     
     try:
+        # Resolve the current snapshot once so all files come from the same build
+        files = resolve_db_files(db_dir)
+        
         # Load FAISS index
-        index_file = os.path.join(db_dir, "vector_db.index")
+        index_file = files[INDEX_FILE]
         if not os.path.exists(index_file):
             log_message(f"❌ Index file not found: {index_file}", "ERROR")
             return None, None, None
@@ -34,7 +38,7 @@ def load_vector_database(db_dir):
         log_message(f"✅ FAISS index loaded")
         
         # Load metadata
-        metadata_file = os.path.join(db_dir, "vector_db_metadata.json")
+        metadata_file = files[METADATA_FILE]
         if os.path.exists(metadata_file):
             with open(metadata_file, 'r', encoding='utf-8') as f:
                 metadata = json.load(f)
@@ -44,7 +48,7 @@ def load_vector_database(db_dir):
             log_message(f"⚠️  No metadata file found", "WARNING")
         
         # Load chunks backup if available
-        chunks_file = os.path.join(db_dir, "chunks_backup.pkl")
+        chunks_file = files[CHUNKS_FILE]
         if os.path.exists(chunks_file):
             with open(chunks_file, 'rb') as f:
                 chunks = pickle.load(f)
@@ -67,7 +71,7 @@ def initialize_embedding_model():
     log_message("Initializing embedding model...")
     
     try:
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        model = get_embedder()
         log_message("✅ Embedding model loaded")
         log_message(f"   - Model: all-MiniLM-L6-v2")
         log_message(f"   - Embedding dimension: {model.get_sentence_embedding_dimension()}")
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3.8
+"""
+US-003 Step 6: Delta ingestion for the document corpus
+Compares source .md files against the ingestion manifest and pushes only added,
+modified and deleted documents through chunking, embedding and indexing.
+
+Usage:
+    python3.8 sync_corpus.py /opt/rag-copilot/data/docs [more paths...] [--dry-run] [--full] [--no-dedup]
+"""
+
+import os
+import sys
+import time
+import pickle
+import argparse
+import numpy as np
+from datetime import datetime
+
+# Document processing steps live in scripts/processing
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'processing'))
+
+from embedding_backend import MODEL_NAME
+from embedder_factory import get_embedder
+from ingestion_manifest import IngestionManifest, MANIFEST_FILE, hash_file, make_chunk_id
+from index_snapshots import DB_DIR, INDEX_FILE, EMBEDDINGS_FILE, CHUNKS_FILE, resolve_db_files
+from dedup_chunks import DEFAULT_THRESHOLD, DuplicateIndex, make_alias
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def build_document_chunks(file_path, content_hash):
+    """Run one document through process_md -> sliding_window chunking -> extract_metadata"""
+    from process_md import process_markdown_file
+    from sliding_window import sliding_window_chunks, chunking_params
+    from extract_metadata import extract_chunk_metadata
+    from save_processed_data import clean_text_for_embedding
+
+    result = process_markdown_file(file_path)
+    if result is None:
+        raise ValueError(f"Failed to process {file_path}")
+
+    original_metadata = result['metadata']
+    params = chunking_params()
+    windows = sliding_window_chunks(result['clean_content'])
+
+    chunks = []
+    for i, window in enumerate(windows):
+        chunk_content = window['content']
+        chunk = {
+            'chunk_id': i + 1,
+            'content': chunk_content,
+            'tokens': window['tokens'],
+            'chars': len(chunk_content),
+            'words': len(chunk_content.split()),
+            'start_offset': window['start'],
+            'end_offset': window['end'],
+            'chunking': params
+        }
+        metadata = extract_chunk_metadata(chunk, i, original_metadata, len(windows))
+
+        # Same compact metadata as embedding_ready.json, plus the chunk id
+        chunks.append({
+            'id': make_chunk_id(original_metadata['file_name'], content_hash, chunk['chunk_id']),
+            'content': clean_text_for_embedding(chunk_content),
+            'source': metadata['source_file'],
+            'metadata': {
+                'chunk_id': chunk['chunk_id'],
+                'source_file': metadata['source_file'],
+                'source_path': file_path,
+                'type': metadata['content_info']['type'],
+                'section': metadata['position_in_doc']['section'],
+                'tokens': chunk['tokens'],
+                'chunking': params,
+                'keywords': [kw['word'] for kw in metadata['content_info']['keywords'][:3]],
+                'language': metadata['content_info']['language']
+            }
+        })
+    return chunks
+
+def load_vector_state(db_dir):
+    """Load index, stored embeddings and chunks; None if there is no usable database"""
+    import faiss
+
+    files = resolve_db_files(db_dir)
+    index_path = files[INDEX_FILE]
+    embeddings_path = files[EMBEDDINGS_FILE]
+    chunks_path = files[CHUNKS_FILE]
+    if not all(os.path.exists(p) for p in (index_path, embeddings_path, chunks_path)):
+        return None
+
+    index = faiss.read_index(index_path)
+    embeddings = np.load(embeddings_path).astype(np.float32)
+    with open(chunks_path, 'rb') as f:
+        chunks = pickle.load(f)
+
+    if not all(isinstance(chunk, dict) and 'id' in chunk for chunk in chunks):
+        log_message("⚠️  Existing chunks have no ids (built by init_vector_db), rebuilding", "WARNING")
+        return None
+    if not (index.ntotal == len(embeddings) == len(chunks)):
+        log_message("⚠️  Index, embeddings and chunks are out of sync, rebuilding", "WARNING")
+        return None
+
+    return index, embeddings, chunks
+
+def orphaned_alias_documents(chunks, stale_ids, unchanged):
+    """
+    Unchanged documents whose chunks are only stored as aliases of stale chunks
+    They have to be re-ingested, otherwise their content disappears with the canonical chunk.
+    """
+    unchanged = set(unchanged)
+    orphaned = []
+    for chunk in chunks:
+        if chunk['id'] not in stale_ids:
+            continue
+        for alias in chunk.get('metadata', {}).get('aliases', []):
+            path = alias.get('source_path')
+            if path in unchanged and path not in orphaned:
+                orphaned.append(path)
+    return orphaned
+
+def deduplicate_new_chunks(chunks, new_chunks, threshold):
+    """
+    Drop new chunks that duplicate a kept chunk (existing or new) and record them as its aliases
+    Returns: (new chunks to embed, number of duplicates removed)
+    """
+    index = DuplicateIndex(threshold)
+    by_id = {}
+    for chunk in chunks:
+        index.insert(chunk['id'], chunk['content'])
+        by_id[chunk['id']] = chunk
+
+    kept = []
+    for chunk in new_chunks:
+        original, score = index.add(chunk['id'], chunk['content'])
+        if original is None:
+            kept.append(chunk)
+            by_id[chunk['id']] = chunk
+        else:
+            by_id[original]['metadata'].setdefault('aliases', []).append(
+                make_alias(chunk['id'], chunk['metadata'], score))
+    return kept, len(new_chunks) - len(kept)
+
+def apply_index_delta(index, embeddings, remove_positions, new_embeddings):
+    """
+    Remove and append vectors
+    Flat indexes are updated in place (removal keeps the remaining order, so positions
+    still line up with the chunk list); other index types are rebuilt from stored vectors.
+    """
+    import faiss
+    from init_vector_db import create_faiss_index
+
+    if isinstance(index, faiss.IndexFlat):
+        if len(remove_positions):
+            index.remove_ids(np.asarray(remove_positions, dtype=np.int64))
+        if len(new_embeddings):
+            index.add(np.ascontiguousarray(new_embeddings, dtype=np.float32))
+        return index
+
+    index_type = "IndexFlatL2" if embeddings.shape[0] < 1000 else "IndexIVFFlat"
+    return create_faiss_index(embeddings, index_type)
+
+def sync_corpus(roots, db_dir=DB_DIR, full=False, dry_run=False, batch_size=64, dedup_threshold=DEFAULT_THRESHOLD):
+    """
+    Bring the vector database in line with the documents under roots
+    dedup_threshold: near-duplicate similarity for dropping new chunks (None disables dedup)
+    Returns: report dict (delta counts, chunks embedded/removed/deduplicated, stage timings)
+    """
+    start_time = time.time()
+    timings = {}
+
+    # The manifest lives in the current snapshot, next to the index it describes
+    manifest_path = resolve_db_files(db_dir)[MANIFEST_FILE]
+    manifest = IngestionManifest.load(manifest_path, MODEL_NAME)
+
+    # Step 1: Delta (--full re-ingests the documents under roots; other roots are left as they are)
+    stage = time.time()
+    delta = manifest.compute_delta(roots, full=full)
+    timings['scan'] = time.time() - stage
+
+    report = {
+        'roots': [os.path.abspath(r) for r in roots],
+        'delta': delta.summary(),
+        'chunks_embedded': 0,
+        'chunks_removed': 0,
+        'duplicates_removed': 0,
+        'dedup_ratio': 0.0,
+        'total_vectors': None,
+        'timings': timings,
+        'dry_run': dry_run
+    }
+
+    log_message(f"📋 Delta: {delta.summary()}")
+    for label, paths in (('+', delta.added), ('~', delta.modified), ('-', delta.deleted)):
+        for path in paths:
+            log_message(f"   {label} {path}")
+
+    if dry_run:
+        report['elapsed'] = time.time() - start_time
+        return report
+
+    state = load_vector_state(db_dir) if manifest.compatible else None
+    if state is None and not manifest.is_empty():
+        # Database unusable: re-ingest everything under roots, other roots on their next sync
+        delta.modified.extend(delta.unchanged)
+        delta.unchanged = []
+        manifest.reset(roots)
+
+    # Rows of documents under roots the manifest lost track of are replaced by this sync
+    untracked_ids = manifest.untracked_chunk_ids(state[2], roots) if state is not None else set()
+    if untracked_ids:
+        log_message(f"⚠️  {len(untracked_ids)} indexed chunks under the synced roots are not in the manifest, "
+                    f"replacing them", "WARNING")
+
+    if delta.is_empty() and state is not None and not untracked_ids:
+        log_message("✅ Corpus unchanged, nothing to do")
+        report['total_vectors'] = int(state[0].ntotal)
+        report['elapsed'] = time.time() - start_time
+        return report
+
+    def stale_chunk_ids():
+        ids = set(untracked_ids)
+        for path in delta.modified + delta.deleted:
+            entry = manifest.documents.get(path)
+            if entry:
+                ids.update(entry.get('chunk_ids', []))
+        return ids
+
+    # Documents that only survive as aliases of a stale chunk are re-ingested with it
+    if dedup_threshold is not None and state is not None:
+        while True:
+            orphaned = orphaned_alias_documents(state[2], stale_chunk_ids(), delta.unchanged)
+            if not orphaned:
+                break
+            log_message(f"🔁 Re-ingesting {len(orphaned)} documents whose chunks were aliases of changed chunks")
+            delta.modified.extend(orphaned)
+            delta.unchanged = [path for path in delta.unchanged if path not in orphaned]
+
+    # Step 2: Chunk changed documents
+    stage = time.time()
+    new_chunks = []
+    new_ids_by_doc = {}
+    for path in delta.changed:
+        content_hash = delta.hashes.get(path) or hash_file(path)
+        delta.hashes[path] = content_hash
+        doc_chunks = build_document_chunks(path, content_hash)
+        new_ids_by_doc[path] = [chunk['id'] for chunk in doc_chunks]
+        new_chunks.extend(doc_chunks)
+    timings['chunk'] = time.time() - stage
+
+    # Step 3: Drop near-duplicates, embed only the remaining new chunks
+    stage = time.time()
+    if state is not None:
+        # Aliases of replaced chunks are dropped, re-ingested documents add fresh ones below
+        stale_ids = stale_chunk_ids()
+        for chunk in state[2]:
+            aliases = chunk.get('metadata', {}).get('aliases')
+            if aliases:
+                chunk['metadata']['aliases'] = [alias for alias in aliases if alias['id'] not in stale_ids]
+
+    chunk_count = len(new_chunks)
+    if dedup_threshold is not None and new_chunks:
+        # Rows replaced in step 4 (including leftovers of an interrupted sync) are not dedup targets
+        replaced = stale_chunk_ids() | {chunk['id'] for chunk in new_chunks}
+        kept_chunks = [chunk for chunk in state[2] if chunk['id'] not in replaced] if state else []
+        new_chunks, duplicates = deduplicate_new_chunks(kept_chunks, new_chunks, dedup_threshold)
+        report['duplicates_removed'] = duplicates
+        report['dedup_ratio'] = duplicates / chunk_count
+        log_message(f"🔎 Near-duplicates: {duplicates}/{chunk_count} new chunks stored as aliases")
+    timings['dedup'] = time.time() - stage
+
+    stage = time.time()
+    model = get_embedder()
+    dimension = model.get_sentence_embedding_dimension()
+    if new_chunks:
+        from embed_chunks import generate_embeddings
+        new_embeddings = generate_embeddings(model, new_chunks, batch_size=batch_size)
+        if new_embeddings is None:
+            raise RuntimeError("Embedding generation failed")
+        new_embeddings = np.asarray(new_embeddings, dtype=np.float32)
+    else:
+        new_embeddings = np.zeros((0, dimension), dtype=np.float32)
+    timings['embed'] = time.time() - stage
+
+    # Step 4: Update index
+    stage = time.time()
+    if state is None:
+        import faiss
+        index, embeddings, chunks = faiss.IndexFlatL2(dimension), np.zeros((0, dimension), dtype=np.float32), []
+    else:
+        index, embeddings, chunks = state
+
+    stale_ids = stale_chunk_ids()
+    # Ids are content-derived, so rows left behind by an interrupted sync are replaced too
+    stale_ids.update(chunk_id for chunk_ids in new_ids_by_doc.values() for chunk_id in chunk_ids)
+
+    remove_positions = [i for i, chunk in enumerate(chunks) if chunk['id'] in stale_ids]
+    keep = np.ones(len(chunks), dtype=bool)
+    keep[remove_positions] = False
+
+    embeddings = np.vstack([embeddings[keep], new_embeddings])
+    chunks = [chunk for chunk, kept in zip(chunks, keep) if kept] + new_chunks
+    index = apply_index_delta(index, embeddings, remove_positions, new_embeddings)
+    if index is None:
+        raise RuntimeError("Index update failed")
+    timings['index'] = time.time() - stage
+
+    # Step 5: Publish index, chunks and manifest together as one snapshot
+    stage = time.time()
+    for path in delta.deleted:
+        manifest.forget(path)
+    for path in delta.changed:
+        manifest.record(path, delta.hashes[path], new_ids_by_doc[path])
+
+    from init_vector_db import save_vector_database
+    if not save_vector_database(index, embeddings, chunks, db_dir, extra_json={MANIFEST_FILE: manifest.to_dict()}):
+        raise RuntimeError("Failed to save vector database")
+    timings['save'] = time.time() - stage
+
+    report.update({
+        'delta': delta.summary(),
+        'chunks_embedded': len(new_chunks),
+        'chunks_removed': len(remove_positions),
+        'total_vectors': int(index.ntotal),
+        'elapsed': time.time() - start_time
+    })
+    return report
+
+def display_report(report):
+    """Print sync summary"""
+    log_message("=== CORPUS SYNC COMPLETED ===")
+    delta = report['delta']
+    log_message(f"✅ Documents: +{delta['added']} ~{delta['modified']} -{delta['deleted']} "
+                f"(unchanged {delta['unchanged']})")
+    log_message(f"✅ Chunks embedded: {report['chunks_embedded']}, removed: {report['chunks_removed']}")
+    if report['duplicates_removed']:
+        log_message(f"✅ Near-duplicates stored as aliases: {report['duplicates_removed']} "
+                    f"({report['dedup_ratio']:.1%} of new chunks)")
+    if report['total_vectors'] is not None:
+        log_message(f"✅ Total vectors: {report['total_vectors']}")
+    for stage, seconds in report['timings'].items():
+        log_message(f"   - {stage}: {seconds:.2f}s")
+    log_message(f"   - total: {report['elapsed']:.2f}s")
+
+def main():
+    """Main delta ingestion process"""
+    log_message("=== US-003 STEP 6: SYNC CORPUS (DELTA INGESTION) ===")
+
+    parser = argparse.ArgumentParser(description="Incrementally ingest changed documents into the vector database")
+    parser.add_argument("sources", nargs='+', help="Source .md files or directories")
+    parser.add_argument("--db-dir", default=DB_DIR, help=f"Vector database directory (default: {DB_DIR})")
+    parser.add_argument("--full", action="store_true", help="Re-ingest every document under the given paths")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the delta")
+    parser.add_argument("--batch-size", type=int, default=64, help="Embedding batch size")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Near-duplicate similarity threshold (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--no-dedup", action="store_true", help="Embed near-duplicate chunks too")
+    args = parser.parse_args()
+
+    for source in args.sources:
+        if not os.path.exists(source):
+            log_message(f"❌ Source not found: {source}", "ERROR")
+            sys.exit(1)
+
+    try:
+        report = sync_corpus(args.sources, db_dir=args.db_dir, full=args.full,
+                             dry_run=args.dry_run, batch_size=args.batch_size,
+                             dedup_threshold=None if args.no_dedup else args.dedup_threshold)
+    except Exception as e:
+        log_message(f"❌ Corpus sync failed: {str(e)}", "ERROR")
+        sys.exit(1)
+
+    display_report(report)
+
+if __name__ == "__main__":
+    main()
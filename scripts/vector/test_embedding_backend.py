@@ -0,0 +1,87 @@
+#!/usr/bin/env python3.8
+"""
+Parity test for embedding backends
+Compares ONNX (fp32 and int8) embeddings against the torch SentenceTransformer output.
+
+Usage:
+    python3.8 embedding_backend.py export --quantize
+    python3.8 test_embedding_backend.py [--onnx-dir /opt/rag-copilot/models/all-MiniLM-L6-v2-onnx]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from embedding_backend import TorchEmbeddingBackend, OnnxEmbeddingBackend, DEFAULT_ONNX_DIR
+
+MIN_COSINE = 0.99
+
+SAMPLE_TEXTS = [
+    "Quy trình nghỉ phép của công ty như thế nào?",
+    "What is the expense reimbursement process?",
+    "Làm thế nào để xin tăng lương?",
+    "AI tools for developers",
+    "ChatGPT có những tính năng gì?",
+    "NotebookLM research assistant",
+    "Nhân viên cần nộp đơn xin nghỉ phép trước ít nhất 3 ngày làm việc. "
+    "Đơn xin nghỉ phép phải được quản lý trực tiếp phê duyệt.",
+    "Employees must submit expense reports within 30 days of incurring the expense. " * 20
+]
+
+def cosine_rows(a, b):
+    """Row-wise cosine similarity"""
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+def check_backend_parity(onnx_dir):
+    """Every ONNX export must match torch embeddings with cosine >= MIN_COSINE"""
+    print("🧪 Embedding backend parity test")
+    print("=" * 60)
+
+    start = time.time()
+    torch_backend = TorchEmbeddingBackend()
+    reference = torch_backend.encode(SAMPLE_TEXTS)
+    print(f"✅ torch: {reference.shape} in {time.time() - start:.3f}s (incl. load)")
+
+    candidates = [name for name in ("model.onnx", "model_int8.onnx")
+                  if os.path.exists(os.path.join(onnx_dir, name))]
+    if not candidates:
+        print(f"❌ No ONNX models found in {onnx_dir}")
+        print("Export first: python3.8 embedding_backend.py export --quantize")
+        return False
+
+    all_passed = True
+    for name in candidates:
+        start = time.time()
+        backend = OnnxEmbeddingBackend(os.path.join(onnx_dir, name))
+        embeddings = backend.encode(SAMPLE_TEXTS)
+        elapsed = time.time() - start
+
+        similarities = cosine_rows(reference, embeddings)
+        passed = embeddings.shape == reference.shape and float(similarities.min()) >= MIN_COSINE
+        all_passed = all_passed and passed
+
+        status = "✅ PASS" if passed else "❌ FAIL"
+        print(f"{status} {name}: min cosine {similarities.min():.5f}, "
+              f"mean {similarities.mean():.5f} ({elapsed:.3f}s incl. load)")
+
+        # Normalization must match too (all-MiniLM-L6-v2 ends with a Normalize module)
+        norm_gap = np.abs(np.linalg.norm(embeddings, axis=1) - np.linalg.norm(reference, axis=1)).max()
+        print(f"   Norm difference vs torch: {norm_gap:.6f}")
+
+    return all_passed
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend parity test")
+    parser.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR, help="Directory with exported ONNX models")
+    args = parser.parse_args()
+
+    success = check_backend_parity(args.onnx_dir)
+    print("\n🎯 Backend parity OK" if success else "\n❌ Backend parity check failed")
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3.8
+"""
+US-003 Step 7: Corpus watcher daemon
+Watches document roots (inotify, or stat polling where inotify is unavailable),
+debounces bursts of edits and runs incremental sync_corpus ingestion for them.
+
+Serving processes pick up the new index/chunks on their next query; a watcher running
+inside the serving process (RAGPipeline "watch_roots") swaps them immediately via on_sync.
+
+Usage:
+    python3.8 watch_corpus.py /opt/rag-copilot/data/docs [--debounce 2] [--max-delay 30] [--polling]
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime
+
+from ingestion_manifest import SOURCE_EXTENSIONS, scan_sources
+from micro_batcher import Histogram
+from sync_corpus import sync_corpus, display_report, DB_DIR
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+LATENCY_BUCKETS_S = [1, 2, 5, 10, 30, 60, 120, 300, 600]
+
+def log_message(message, level="INFO"):
+    """Log messages with timestamp"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
+
+def _is_source(path):
+    return path.lower().endswith(SOURCE_EXTENSIONS)
+
+class PollingEventSource:
+    """Detects changes by comparing stat snapshots of the document roots"""
+
+    name = 'polling'
+
+    def __init__(self, roots, interval=DEFAULT_POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        return {path: (stat.st_size, stat.st_mtime) for path, stat in scan_sources(self.roots).items()}
+
+    def wait(self, timeout):
+        """Sleep up to timeout, then return paths that changed since the last scan"""
+        time.sleep(max(0.0, min(timeout, self.interval)))
+        current = self._scan()
+        changed = [path for path, info in current.items() if self._snapshot.get(path) != info]
+        changed.extend(path for path in self._snapshot if path not in current)
+        self._snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyEventSource:
+    """Recursive inotify watches on the document roots (requires inotify_simple)"""
+
+    name = 'inotify'
+
+    def __init__(self, roots):
+        from inotify_simple import INotify, flags
+        self.flags = flags
+        self.mask = (flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.DELETE |
+                     flags.MOVED_FROM | flags.MOVED_TO | flags.DELETE_SELF)
+        self.roots = roots
+        self.inotify = INotify()
+        self.watches = {}
+        for root in roots:
+            self._watch_tree(os.path.abspath(root))
+
+    def _watch_tree(self, path):
+        """Watch a directory and its (non-hidden) subdirectories; returns source files found"""
+        found = []
+        if os.path.isfile(path):
+            path = os.path.dirname(path)
+        for dirpath, dirs, files in os.walk(path):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            try:
+                self.watches[self.inotify.add_watch(dirpath, self.mask)] = dirpath
+            except OSError as e:
+                log_message(f"⚠️  Cannot watch {dirpath}: {str(e)}", "WARNING")
+            found.extend(os.path.join(dirpath, name) for name in files if _is_source(name))
+        return found
+
+    def wait(self, timeout):
+        """Block up to timeout for events; return affected source paths"""
+        changed = []
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            if event.mask & self.flags.Q_OVERFLOW:
+                # Events were dropped: let the sync rescan everything
+                return [os.path.abspath(root) for root in self.roots]
+
+            directory = self.watches.get(event.wd)
+            if directory is None:
+                continue
+            if event.mask & (self.flags.DELETE_SELF | self.flags.IGNORED):
+                self.watches.pop(event.wd, None)
+                continue
+
+            path = os.path.join(directory, event.name)
+            if event.mask & self.flags.ISDIR:
+                if event.mask & (self.flags.CREATE | self.flags.MOVED_TO):
+                    changed.extend(self._watch_tree(path))
+                elif event.mask & self.flags.MOVED_FROM:
+                    changed.append(path)
+            elif _is_source(event.name):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+def create_event_source(roots, polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """inotify when available (Linux + inotify_simple), else stat polling"""
+    if not polling:
+        try:
+            return InotifyEventSource(roots)
+        except ImportError:
+            log_message("⚠️  inotify_simple not installed, falling back to polling "
+                        "(pip3.8 install inotify_simple)", "WARNING")
+        except OSError as e:
+            log_message(f"⚠️  inotify unavailable ({str(e)}), falling back to polling", "WARNING")
+    return PollingEventSource(roots, interval=poll_interval)
+
+class CorpusWatcher:
+    """
+    Debounced watcher that runs incremental ingestion for changed documents
+    A sync starts once no new change arrived for `debounce` seconds, or at the latest
+    `max_delay` seconds after the first pending change.
+    """
+
+    def __init__(self, roots, db_dir=DB_DIR, debounce=DEFAULT_DEBOUNCE, max_delay=DEFAULT_MAX_DELAY,
+                 poll_interval=DEFAULT_POLL_INTERVAL, polling=False, on_sync=None, batch_size=64):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.db_dir = db_dir
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.polling = polling
+        self.on_sync = on_sync
+        self.batch_size = batch_size
+
+        self.latency = Histogram(LATENCY_BUCKETS_S)
+        self.runs = 0
+        self.failures = 0
+        self.last_report = None
+
+        self._pending = {}
+        self._last_event = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._source = None
+
+    def start(self, initial_sync=True):
+        """Run the watch loop in a background daemon thread"""
+        self._thread = threading.Thread(target=self.run, kwargs={'initial_sync': initial_sync},
+                                        name="corpus-watcher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        """Stop the watch loop"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self, initial_sync=True):
+        """Watch loop (blocks until stop())"""
+        self._source = create_event_source(self.roots, polling=self.polling, poll_interval=self.poll_interval)
+        log_message(f"👀 Watching {len(self.roots)} root(s) via {self._source.name} "
+                    f"(debounce {self.debounce}s, max delay {self.max_delay}s)")
+
+        if initial_sync:
+            # Catch up on anything changed while the watcher was down
+            self._sync({root: time.time() for root in self.roots})
+
+        try:
+            while not self._stop.is_set():
+                changed = self._source.wait(self._next_timeout())
+                now = time.time()
+                for path in changed:
+                    self._pending.setdefault(path, now)
+                if changed:
+                    self._last_event = now
+
+                if self._pending and self._due(now):
+                    pending, self._pending = self._pending, {}
+                    if not self._sync(pending):
+                        # Retry after another debounce period
+                        for path, detected in pending.items():
+                            self._pending.setdefault(path, detected)
+                        self._last_event = time.time()
+        finally:
+            self._source.close()
+
+    def _next_timeout(self):
+        if not self._pending:
+            return self.poll_interval
+        return max(0.05, min(self.debounce, self._last_event + self.debounce - time.time()))
+
+    def _due(self, now):
+        first_detected = min(self._pending.values())
+        return now - self._last_event >= self.debounce or now - first_detected >= self.max_delay
+
+    def _sync(self, pending):
+        """Run one incremental ingestion for a batch of pending changes"""
+        first_detected = min(pending.values())
+        # Earliest edit among the changed files that still exist (deletions count from detection)
+        mtimes = [os.path.getmtime(path) for path in pending if os.path.isfile(path)]
+        first_edit = min(mtimes + [first_detected])
+
+        log_message(f"🔄 Syncing {len(pending)} changed path(s)...")
+        sync_started = time.time()
+        try:
+            report = sync_corpus(self.roots, db_dir=self.db_dir, batch_size=self.batch_size)
+        except Exception as e:
+            self.failures += 1
+            log_message(f"❌ Incremental sync failed: {str(e)}", "ERROR")
+            return False
+        indexed_at = time.time()
+
+        delta = report['delta']
+        if delta['added'] or delta['modified'] or delta['deleted']:
+            if self.on_sync:
+                try:
+                    self.on_sync(report)
+                except Exception as e:
+                    log_message(f"⚠️  Serving reload failed: {str(e)}", "WARNING")
+            serving_at = time.time()
+
+            report['propagation'] = {
+                'edit_to_serving': serving_at - first_edit,
+                'detection': first_detected - first_edit,
+                'debounce_wait': sync_started - first_detected,
+                'sync': indexed_at - sync_started,
+                'swap': serving_at - indexed_at
+            }
+            self.latency.observe(report['propagation']['edit_to_serving'])
+            display_report(report)
+            log_message(f"⏱️  Propagation latency: edit → serving {report['propagation']['edit_to_serving']:.2f}s "
+                        f"(detect {report['propagation']['detection']:.2f}s, "
+                        f"debounce {report['propagation']['debounce_wait']:.2f}s, "
+                        f"sync {report['propagation']['sync']:.2f}s, swap {report['propagation']['swap']:.2f}s)")
+
+        self.runs += 1
+        self.last_report = report
+        return True
+
+    def stats(self):
+        """Sync counts and edit → serving latency histogram (seconds)"""
+        return {
+            'roots': self.roots,
+            'source': self._source.name if self._source else None,
+            'runs': self.runs,
+            'failures': self.failures,
+            'pending': len(self._pending),
+            'propagation_latency_s': self.latency.snapshot()
+        }
+
+def main():
+    """Run the watcher in the foreground"""
+    log_message("=== US-003 STEP 7: CORPUS WATCHER ===")
+
+    parser = argparse.ArgumentParser(description="Watch document roots and ingest changes incrementally")
+    parser.add_argument("roots", nargs='+', help="Document roots to watch")
+    parser.add_argument("--db-dir", default=DB_DIR, help=f"Vector database directory (default: {DB_DIR})")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="Quiet period before syncing (s)")
+    parser.add_argument("--max-delay", type=float, default=DEFAULT_MAX_DELAY, help="Max wait after first change (s)")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="Polling interval (s)")
+    parser.add_argument("--polling", action="store_true", help="Force stat polling instead of inotify")
+    parser.add_argument("--no-initial-sync", action="store_true", help="Skip the catch-up sync at startup")
+    args = parser.parse_args()
+
+    for root in args.roots:
+        if not os.path.exists(root):
+            log_message(f"❌ Root not found: {root}", "ERROR")
+            sys.exit(1)
+
+    watcher = CorpusWatcher(args.roots, db_dir=args.db_dir, debounce=args.debounce, max_delay=args.max_delay,
+                            poll_interval=args.poll_interval, polling=args.polling)
+    try:
+        watcher.run(initial_sync=not args.no_initial_sync)
+    except KeyboardInterrupt:
+        log_message("🛑 Watcher stopped")
+        log_message(f"   Stats: {watcher.stats()}")
+
+if __name__ == "__main__":
+    main()